@@ -0,0 +1,103 @@
+import threading
+import time
+
+import numpy as np
+
+from scripts import config
+from scripts.zonas import filtros_detector
+
+
+class CargaDetector(threading.Thread):
+    """Descarga (si hace falta), carga y calienta los detectores en segundo plano.
+
+    Arranca antes de abrir las cámaras: la importación de MediaPipe, la carga
+    del modelo y la primera inferencia (que inicializa el grafo) corren
+    mientras el hilo principal espera al primer fotograma. Carga `cantidad`
+    detectores con los `filtros` (umbral, categorias) indicados; esperar()
+    retorna la lista de los que se pudieron crear.
+    """
+
+    def __init__(self, cantidad=1, filtros=None):
+        super().__init__(name="carga_detector", daemon=True)
+        self.cantidad = max(1, int(cantidad))
+        self.filtros = filtros
+        self.detectores = []
+        self.segundos_modelo = 0.0
+        self.segundos_calentamiento = 0.0
+
+    def run(self):
+        # Import diferido: MediaPipe es lo más pesado de importar
+        from scripts.detector import crear_detector_objetos, descargar_modelo_si_no_existe
+        from scripts.detector_proceso import crear_detector_en_proceso
+
+        inicio = time.perf_counter()
+        try:
+            umbral, categorias = self.filtros or filtros_detector()
+            if config.SERVIDOR_INFERENCIA:
+                # Nodo de captura: el modelo vive en el servidor central
+                from scripts.inferencia_remota import crear_detector_remoto
+                crear = crear_detector_remoto
+            else:
+                descargar_modelo_si_no_existe()
+                crear = crear_detector_en_proceso if config.DETECTOR_EN_PROCESO else crear_detector_objetos
+            for _ in range(self.cantidad):
+                detector = crear(umbral=umbral, categorias=categorias)
+                if detector is None:
+                    break
+                self.detectores.append(detector)
+        except Exception as e:
+            print(f"ERROR: No se pudo cargar el detector. {e}")
+        finally:
+            self.segundos_modelo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        alto = config.ANCHO_PROCESAMIENTO * 3 // 4
+        for detector in self.detectores:
+            try:
+                detector.detectar(np.zeros((alto, config.ANCHO_PROCESAMIENTO, 3), np.uint8), 0)
+            except Exception as e:
+                print(f"ADVERTENCIA: Falló la inferencia de calentamiento. {e}")
+        self.segundos_calentamiento = time.perf_counter() - inicio
+
+    def esperar(self):
+        self.join()
+        return self.detectores
+
+
+class ReporteArranque:
+    """Tiempos de arranque: importación, cámara, modelo y primera inferencia.
+
+    Los tiempos son desde `inicio` (perf_counter tomado al arrancar el
+    proceso); el del modelo corre en paralelo con la cámara, así que las
+    etapas no suman el total. También se exportan como métricas
+    (arranque_segundos{etapa=...}).
+    """
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.etapas = {}
+        self.total_primera_inferencia = None
+        self._lock = threading.Lock()  # Con varias cámaras, cualquiera puede hacer la primera inferencia
+
+    def marcar(self, etapa, segundos):
+        self.etapas[etapa] = segundos
+
+    def primera_inferencia(self, segundos):
+        """Registra la primera inferencia del bucle. Retorna True solo la primera vez."""
+        with self._lock:
+            if self.total_primera_inferencia is not None:
+                return False
+            self.marcar("primera_inferencia", segundos)
+            self.total_primera_inferencia = time.perf_counter() - self.inicio
+        self.imprimir()
+        return True
+
+    def imprimir(self):
+        detalle = ", ".join(f"{etapa} {segundos * 1000:.0f} ms" for etapa, segundos in self.etapas.items())
+        print(f"Arranque: {detalle}; primera inferencia a los {self.total_primera_inferencia * 1000:.0f} ms")
+
+    def colector(self):
+        valores = [("arranque_segundos", (("etapa", etapa),), s) for etapa, s in self.etapas.items()]
+        if self.total_primera_inferencia is not None:
+            valores.append(("arranque_segundos", (("etapa", "total"),), self.total_primera_inferencia))
+        return valores
@@ -0,0 +1,312 @@
+import os
+import random
+import shutil
+import sqlite3
+import threading
+import time
+
+from scripts import config
+from scripts import transcodificador
+from scripts.eventos import clave_de_clip
+from scripts.resumen_clip import rutas_artefactos
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS alertas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ruta_video TEXT NOT NULL,
+    ruta_thumb TEXT NOT NULL,
+    creada REAL NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entregas (
+    alerta_id INTEGER NOT NULL REFERENCES alertas(id) ON DELETE CASCADE,
+    servicio TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL,
+    ultimo_error TEXT,
+    partes_entregadas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (alerta_id, servicio)
+);
+CREATE INDEX IF NOT EXISTS idx_entregas_proximo ON entregas(proximo_intento);
+"""
+
+
+class BandejaSalida:
+    """Bandeja de salida persistente para las alertas.
+
+    Cada clip se mueve a DIRECTORIO_BANDEJA y se registra en un índice
+    SQLite con una fila por servicio pendiente. Un hilo revisa las entregas
+    vencidas y las pasa al despachador; los fallos se reintentan con
+    backoff exponencial y jitter. De un clip dividido en partes se anota
+    cada parte entregada: el reintento sigue desde la primera que falta. Los archivos se borran recién cuando
+    todos los servicios confirmaron la entrega, y lo pendiente sobrevive a
+    un reinicio del proceso.
+
+    Args:
+        despachador: DespachadorNotificaciones usado para las subidas
+        servicios: dict nombre -> función de envío(ruta_video, ruta_thumb, sesion=..., partes_entregadas=...,
+            parte_entregada=...) que retorna True si entregó
+        registro_eventos: RegistroEventos opcional donde se anota el estado de cada entrega
+    """
+
+    def __init__(self, despachador, servicios, directorio=None, registro_eventos=None):
+        self.despachador = despachador
+        self.registro_eventos = registro_eventos
+        self.servicios = dict(servicios)
+        self.directorio = directorio or config.DIRECTORIO_BANDEJA
+        os.makedirs(self.directorio, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directorio, "bandeja.db"), check_same_thread=False)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript(_ESQUEMA)
+        columnas = {fila[1] for fila in self._db.execute("PRAGMA table_info(entregas)")}
+        if "partes_entregadas" not in columnas:  # Índice creado por una versión anterior
+            self._db.execute("ALTER TABLE entregas ADD COLUMN partes_entregadas INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+
+        self._en_vuelo = set()  # (alerta_id, servicio) entregados al despachador y sin resultado aún
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="bandeja_salida", daemon=True)
+
+        self._recuperar()
+
+    # --- API ---
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        self._despertar.set()
+        self._hilo.join()
+
+    def encolar(self, ruta_video, ruta_thumb):
+        """Mueve el clip y su miniatura (con la hoja de contacto y la animación,
+        si las hay) a la bandeja y programa su envío a todos los servicios."""
+        archivos = [ruta_video, ruta_thumb] + rutas_artefactos(ruta_thumb)
+        if not self.servicios:
+            print("Bandeja de salida: no hay servicios configurados, se descarta la alerta.")
+            for ruta in archivos:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            return None
+
+        tamano = sum(os.path.getsize(r) for r in archivos if os.path.exists(r))
+        if not self._hacer_lugar(tamano):
+            print(f"Bandeja de salida llena: se descarta '{ruta_video}'.")
+            for ruta in archivos:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            return None
+
+        # Los artefactos se ubican por su nombre junto a la miniatura: se mueven con ella
+        for ruta in archivos[2:]:
+            shutil.move(ruta, os.path.join(self.directorio, os.path.basename(ruta)))
+        destino_video = shutil.move(ruta_video, os.path.join(self.directorio, os.path.basename(ruta_video)))
+        destino_thumb = shutil.move(ruta_thumb, os.path.join(self.directorio, os.path.basename(ruta_thumb)))
+
+        ahora = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO alertas (ruta_video, ruta_thumb, creada, bytes) VALUES (?, ?, ?, ?)",
+                (destino_video, destino_thumb, ahora, tamano)
+            )
+            alerta_id = cursor.lastrowid
+            self._db.executemany(
+                "INSERT INTO entregas (alerta_id, servicio, proximo_intento) VALUES (?, ?, ?)",
+                [(alerta_id, servicio, ahora) for servicio in self.servicios]
+            )
+            self._db.commit()
+
+        if self.registro_eventos is not None:
+            clave_evento = clave_de_clip(destino_video)
+            self.registro_eventos.clip_movido(clave_evento, destino_video)
+            for servicio in self.servicios:
+                self.registro_eventos.entrega_actualizada(clave_evento, servicio, "pendiente")
+
+        self._despertar.set()
+        return alerta_id
+
+    def estadisticas(self):
+        with self._lock:
+            alertas, bytes_usados = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM alertas").fetchone()
+            pendientes = self._db.execute("SELECT COUNT(*) FROM entregas").fetchone()[0]
+        return {"alertas": alertas, "entregas_pendientes": pendientes, "mb_usados": bytes_usados / (1024 * 1024)}
+
+    # --- Internos ---
+
+    def _recuperar(self):
+        """Al arrancar: descarta entregas de servicios que ya no están configurados
+        y archivos huérfanos que no figuran en el índice."""
+        with self._lock:
+            filas = self._db.execute("SELECT DISTINCT servicio FROM entregas").fetchall()
+            for (servicio,) in filas:
+                if servicio not in self.servicios:
+                    print(f"Bandeja de salida: el servicio '{servicio}' ya no está configurado, se descartan sus entregas.")
+                    self._db.execute("DELETE FROM entregas WHERE servicio = ?", (servicio,))
+            self._db.commit()
+            conocidos = set()
+            for ruta_video, ruta_thumb in self._db.execute("SELECT ruta_video, ruta_thumb FROM alertas"):
+                conocidos.update((os.path.basename(ruta_video), os.path.basename(ruta_thumb)))
+                conocidos.update(os.path.basename(r) for r in rutas_artefactos(ruta_thumb))
+
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith("bandeja.db") or nombre in conocidos:
+                continue
+            os.remove(os.path.join(self.directorio, nombre))
+
+        self._limpiar_completas()
+        pendientes = self.estadisticas()["entregas_pendientes"]
+        if pendientes:
+            print(f"Bandeja de salida: {pendientes} entrega(s) pendiente(s) de una ejecución anterior.")
+
+    def _hacer_lugar(self, bytes_nuevos):
+        """Aplica el tope de disco. Retorna False si la alerta nueva no entra."""
+        limite = config.MAX_MB_BANDEJA * 1024 * 1024
+        with self._lock:
+            usados = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM alertas").fetchone()[0]
+            if usados + bytes_nuevos <= limite:
+                return True
+            if config.POLITICA_BANDEJA_LLENA != "descartar_antiguo":
+                return False
+
+            # Desalojo del más antiguo primero. Las alertas con una subida en curso no se tocan:
+            # el despachador todavía lee (o re-codifica) sus archivos
+            en_vuelo = {alerta_id for alerta_id, _ in self._en_vuelo}
+            for alerta_id, ruta_video, ruta_thumb, tamano in self._db.execute(
+                    "SELECT id, ruta_video, ruta_thumb, bytes FROM alertas ORDER BY creada").fetchall():
+                if usados + bytes_nuevos <= limite:
+                    break
+                if alerta_id in en_vuelo:
+                    continue
+                print(f"Bandeja de salida llena: se desaloja la alerta más antigua '{ruta_video}'.")
+                self._borrar_alerta(alerta_id, ruta_video, ruta_thumb)
+                usados -= tamano
+            self._db.commit()
+            return usados + bytes_nuevos <= limite
+
+    def _borrar_alerta(self, alerta_id, ruta_video, ruta_thumb):
+        """Borra archivos y filas de una alerta. Debe llamarse con el lock tomado."""
+        transcodificador.limpiar(ruta_video)
+        if self.registro_eventos is not None:
+            # Los servicios que aún no confirmaron ya no van a recibir esta alerta
+            for (servicio,) in self._db.execute("SELECT servicio FROM entregas WHERE alerta_id = ?", (alerta_id,)):
+                self.registro_eventos.entrega_actualizada(clave_de_clip(ruta_video), servicio, "descartado")
+        for ruta in [ruta_video, ruta_thumb] + rutas_artefactos(ruta_thumb):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        self._db.execute("DELETE FROM alertas WHERE id = ?", (alerta_id,))
+
+    def _limpiar_completas(self):
+        """Elimina las alertas que ya no tienen entregas pendientes."""
+        with self._lock:
+            completas = self._db.execute(
+                "SELECT id, ruta_video, ruta_thumb FROM alertas "
+                "WHERE id NOT IN (SELECT alerta_id FROM entregas)"
+            ).fetchall()
+            for alerta_id, ruta_video, ruta_thumb in completas:
+                self._borrar_alerta(alerta_id, ruta_video, ruta_thumb)
+                print(f"Archivos de '{os.path.basename(ruta_video)}' eliminados: todos los servicios confirmaron la entrega.")
+            self._db.commit()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            espera = self._despachar_vencidas()
+            self._despertar.wait(espera)
+            self._despertar.clear()
+
+    def _despachar_vencidas(self):
+        """Pasa al despachador las entregas vencidas. Retorna cuántos segundos esperar."""
+        ahora = time.time()
+        a_enviar = []
+        with self._lock:
+            # La consulta y la marca de "en vuelo" van juntas: una entrega que termina entre medio
+            # borra su fila bajo este mismo lock, así que no puede volver a despacharse
+            filas = self._db.execute(
+                "SELECT e.alerta_id, e.servicio, a.ruta_video, a.ruta_thumb, e.partes_entregadas FROM entregas e "
+                "JOIN alertas a ON a.id = e.alerta_id WHERE e.proximo_intento <= ? ORDER BY a.creada",
+                (ahora,)
+            ).fetchall()
+            for alerta_id, servicio, ruta_video, ruta_thumb, partes_entregadas in filas:
+                clave = (alerta_id, servicio)
+                if clave not in self._en_vuelo:
+                    self._en_vuelo.add(clave)
+                    a_enviar.append((clave, servicio, ruta_video, ruta_thumb, partes_entregadas))
+            siguiente = self._db.execute(
+                "SELECT MIN(proximo_intento) FROM entregas WHERE proximo_intento > ?", (ahora,)
+            ).fetchone()[0]
+
+        for clave, servicio, ruta_video, ruta_thumb, partes_entregadas in a_enviar:
+            futuro = self.despachador.enviar(
+                servicio, self.servicios[servicio], ruta_video, ruta_thumb, partes_entregadas=partes_entregadas,
+                parte_entregada=lambda numero, clave=clave: self._registrar_parte(clave, numero)
+            )
+            futuro.add_done_callback(lambda f, clave=clave: self._registrar_resultado(clave, f))
+
+        espera = config.INTERVALO_REVISION_BANDEJA
+        if siguiente is not None:
+            espera = min(espera, max(0.0, siguiente - ahora))
+        return espera
+
+    def _registrar_parte(self, clave, numero):
+        """Anota que el servicio recibió la parte `numero` (desde 1) del clip."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE entregas SET partes_entregadas = ? WHERE alerta_id = ? AND servicio = ?", (numero,) + clave
+            )
+            self._db.commit()
+
+    def _registrar_resultado(self, clave, futuro):
+        alerta_id, servicio = clave
+        intentos = 0
+        try:
+            entregada = bool(futuro.result())
+            error = None if entregada else "el servicio rechazó el envío"
+        except Exception as e:
+            entregada, error = False, str(e)
+
+        with self._lock:
+            if entregada:
+                self._db.execute("DELETE FROM entregas WHERE alerta_id = ? AND servicio = ?", clave)
+                # El servicio volvió a responder: se drenan de una vez las entregas que estaban esperando backoff
+                drenadas = self._db.execute(
+                    "UPDATE entregas SET proximo_intento = ? WHERE servicio = ? AND intentos > 0",
+                    (time.time(), servicio)
+                ).rowcount
+                if drenadas:
+                    print(f"Bandeja de salida: '{servicio}' respondió, reintentando {drenadas} entrega(s) pendiente(s).")
+            else:
+                fila = self._db.execute(
+                    "SELECT intentos FROM entregas WHERE alerta_id = ? AND servicio = ?", clave
+                ).fetchone()
+                if fila is not None:
+                    intentos = fila[0] + 1
+                    espera = self._backoff(intentos)
+                    self._db.execute(
+                        "UPDATE entregas SET intentos = ?, proximo_intento = ?, ultimo_error = ? "
+                        "WHERE alerta_id = ? AND servicio = ?",
+                        (intentos, time.time() + espera, error, alerta_id, servicio)
+                    )
+                    print(f"Envío a {servicio} fallido (intento {intentos}): reintento en {espera:.0f} s.")
+            ruta_video = self._db.execute("SELECT ruta_video FROM alertas WHERE id = ?", (alerta_id,)).fetchone()
+            self._db.commit()
+            self._en_vuelo.discard(clave)
+
+        if self.registro_eventos is not None and ruta_video is not None:
+            self.registro_eventos.entrega_actualizada(
+                clave_de_clip(ruta_video[0]), servicio, "entregado" if entregada else "reintentando", intentos
+            )
+
+        if entregada:
+            self._limpiar_completas()
+        self._despertar.set()
+
+    @staticmethod
+    def _backoff(intentos):
+        """Backoff exponencial con tope y jitter de ±50% para no reintentar todos a la vez."""
+        base = min(config.BACKOFF_MAX_SEGUNDOS, config.BACKOFF_BASE_SEGUNDOS * (2 ** (intentos - 1)))
+        return base * random.uniform(0.5, 1.5)
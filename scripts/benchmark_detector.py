@@ -0,0 +1,184 @@
+"""Benchmark de ajustes del detector sobre clips grabados.
+
+Cada ajuste parte de la configuración actual y cambia las claves indicadas
+(modelo, precision, backend, delegado, hilos, xnnpack, ancho_entrada,
+max_resultados). El primero es la referencia contra la que se mide la
+coincidencia de las detecciones:
+
+    python -m scripts.benchmark_detector --clips bandeja_salida/ \\
+        --ajustes "" "modelo=efficientdet_lite2" "backend=tflite,hilos=2" "backend=tflite,hilos=4,xnnpack=0"
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from scripts import config
+from scripts.detector import ajustes_desde_config, crear_detector_objetos, descargar_modelo_si_no_existe
+from scripts.seguimiento import iou
+
+_EXTENSIONES_VIDEO = (".mp4", ".avi", ".mkv", ".mov")
+
+
+def parsear_ajustes(texto):
+    """'backend=tflite,hilos=2' -> AjustesDetector partiendo de la configuración actual."""
+    ajustes = ajustes_desde_config()
+    cambios = {}
+    for par in filter(None, (p.strip() for p in texto.split(","))):
+        clave, _, valor = par.partition("=")
+        if clave not in ajustes._fields:
+            raise ValueError(f"Ajuste desconocido '{clave}' (válidos: {', '.join(ajustes._fields)})")
+        if clave in ("hilos", "ancho_entrada", "max_resultados"):
+            valor = int(valor)
+        elif clave == "xnnpack":
+            valor = valor.lower() not in ("0", "false", "no")
+        cambios[clave] = valor
+    return ajustes._replace(**cambios)
+
+
+def describir(ajustes):
+    partes = [f"{ajustes.modelo} {ajustes.precision}", ajustes.backend]
+    if ajustes.backend == "tflite":
+        partes.append(f"{ajustes.hilos or 'auto'} hilos" + ("" if ajustes.xnnpack else ", sin XNNPACK"))
+    else:
+        partes.append(ajustes.delegado)
+    if ajustes.ancho_entrada:
+        partes.append(f"entrada {ajustes.ancho_entrada}px")
+    return ", ".join(partes)
+
+
+def cargar_fotogramas(rutas, ancho, max_fotogramas):
+    """Decodifica los clips una sola vez, redimensionados como en el pipeline."""
+    clips = []
+    for ruta in rutas:
+        cap = cv2.VideoCapture(ruta)
+        fps = cap.get(cv2.CAP_PROP_FPS) or config.FPS_ESPERADO
+        fotogramas = []
+        while len(fotogramas) < max_fotogramas:
+            ret, imagen = cap.read()
+            if not ret:
+                break
+            alto = int(ancho * imagen.shape[0] / imagen.shape[1])
+            fotogramas.append(cv2.resize(imagen, (ancho, alto), interpolation=cv2.INTER_AREA))
+        cap.release()
+        if fotogramas:
+            clips.append((ruta, fps, fotogramas))
+        else:
+            print(f"ADVERTENCIA: no se pudo leer '{ruta}'.")
+    return clips
+
+
+def coincidencia(referencia, detecciones, umbral_iou=0.5):
+    """(coincidentes, total_referencia, total_detecciones) emparejando por categoría e IoU."""
+    usadas = set()
+    coincidentes = 0
+    for d in detecciones:
+        mejor, mejor_iou = None, umbral_iou
+        for i, r in enumerate(referencia):
+            if i in usadas or r.categoria != d.categoria:
+                continue
+            valor = iou((r.x, r.y, r.ancho, r.alto), (d.x, d.y, d.ancho, d.alto))
+            if valor >= mejor_iou:
+                mejor, mejor_iou = i, valor
+        if mejor is not None:
+            usadas.add(mejor)
+            coincidentes += 1
+    return coincidentes, len(referencia), len(detecciones)
+
+
+def correr(ajustes, clips):
+    """Corre un ajuste sobre todos los fotogramas. Retorna (resultado, detecciones por fotograma)."""
+    descargar_modelo_si_no_existe(ajustes.modelo, ajustes.precision)
+    inicio_carga = time.perf_counter()
+    detector = crear_detector_objetos(ajustes=ajustes)
+    if detector is None:
+        raise RuntimeError(f"No se pudo crear el detector: {describir(ajustes)}")
+    carga = time.perf_counter() - inicio_carga
+
+    latencias, detecciones = [], []
+    timestamp_ms = 0
+    inicio = time.perf_counter()
+    for _, fps, fotogramas in clips:
+        for imagen in fotogramas:
+            t = time.perf_counter()
+            detecciones.append(detector.detectar(imagen, timestamp_ms))
+            latencias.append(time.perf_counter() - t)
+            timestamp_ms += max(1, int(1000 / fps))
+    total = time.perf_counter() - inicio
+    detector.cerrar()
+
+    latencias_ms = np.array(latencias) * 1000
+    return {
+        "ajustes": ajustes._asdict(),
+        "descripcion": describir(ajustes),
+        "carga_s": carga,
+        "fotogramas": len(latencias),
+        "latencia_media_ms": float(latencias_ms.mean()),
+        "latencia_p50_ms": float(np.percentile(latencias_ms, 50)),
+        "latencia_p90_ms": float(np.percentile(latencias_ms, 90)),
+        "latencia_p99_ms": float(np.percentile(latencias_ms, 99)),
+        "fps": len(latencias) / total,
+        "detecciones": sum(len(d) for d in detecciones),
+    }, detecciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara ajustes del detector sobre clips grabados.")
+    parser.add_argument("--clips", nargs="+", required=True, help="Clips o directorios con clips")
+    parser.add_argument("--ajustes", nargs="+", default=[""],
+                        help="Ajustes a comparar ('clave=valor,...'; '' = configuración actual). El primero es la referencia")
+    parser.add_argument("--ancho", type=int, default=config.ANCHO_PROCESAMIENTO, help="Ancho de procesamiento")
+    parser.add_argument("--max-fotogramas", type=int, default=300, help="Fotogramas por clip como máximo")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    rutas = []
+    for ruta in args.clips:
+        if os.path.isdir(ruta):
+            rutas += sorted(r for r in glob.glob(os.path.join(ruta, "*")) if r.lower().endswith(_EXTENSIONES_VIDEO))
+        else:
+            rutas.append(ruta)
+    clips = cargar_fotogramas(rutas, args.ancho, args.max_fotogramas)
+    if not clips:
+        print("No hay clips para evaluar.")
+        return 1
+    print(f"{sum(len(c[2]) for c in clips)} fotogramas de {len(clips)} clip(s) a {args.ancho}px de ancho.\n")
+
+    resultados, referencia = [], None
+    for texto in args.ajustes:
+        ajustes = parsear_ajustes(texto)
+        print(f"Evaluando: {describir(ajustes)}...")
+        resultado, detecciones = correr(ajustes, clips)
+        if referencia is None:
+            referencia = detecciones
+            resultado["coincidencia_f1"] = 1.0
+        else:
+            coincidentes, total_ref, total = map(sum, zip(*(coincidencia(r, d) for r, d in zip(referencia, detecciones))))
+            precision = coincidentes / total if total else 1.0
+            recall = coincidentes / total_ref if total_ref else 1.0
+            resultado["coincidencia_precision"] = precision
+            resultado["coincidencia_recall"] = recall
+            resultado["coincidencia_f1"] = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        resultados.append(resultado)
+
+    print(f"\n{'Ajuste':<50} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'fps':>6} {'det.':>6} {'F1 ref':>7}")
+    for r in resultados:
+        print(
+            f"{r['descripcion']:<50} {r['latencia_p50_ms']:>7.1f} {r['latencia_p90_ms']:>7.1f} "
+            f"{r['latencia_p99_ms']:>7.1f} {r['fps']:>6.1f} {r['detecciones']:>6} {r['coincidencia_f1']:>7.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"clips": [c[0] for c in clips], "resultados": resultados}, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""Micro-benchmarks de las operaciones calientes del pipeline.
+
+Mide cada operación por separado, sobre fotogramas sintéticos o tomados de
+un video grabado:
+
+- por fotograma: redimensión a ANCHO_PROCESAMIENTO, conversión BGR->RGB con
+  la construcción de mp.Image, la detección completa y el dibujo de cajas;
+- por alerta: abrir/escribir/cerrar un VideoWriter con cada códec de
+  CODECS_PARA_PROBAR, la elección del mejor frame con IndiceFrames y el
+  armado del multipart de Discord y de Telegram (sin enviarlo).
+
+Los resultados se guardan en JSON; con --comparar se contrastan contra una
+corrida anterior y se marcan las regresiones (p50 más lento que el umbral):
+
+    python -m scripts.benchmark_operaciones --json base.json
+    python -m scripts.benchmark_operaciones --video incidente.mp4 --comparar base.json --umbral 15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import requests
+
+from scripts import config
+from scripts import discord_notifier
+from scripts import telegram_notifier
+from scripts.codificador import CODECS_PARA_PROBAR
+from scripts.detector import crear_detector_objetos, descargar_modelo_si_no_existe
+from scripts.indice_frames import IndiceFrames
+from scripts.pipeline import Deteccion, Fotograma, dibujar_detecciones
+
+VERSION_RESULTADOS = 1
+
+
+def medir(funcion, repeticiones, calentamiento=3):
+    """Corre `funcion` y retorna las estadísticas de su duración en ms."""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos_ms = np.array(tiempos) * 1000
+    return {
+        "repeticiones": repeticiones,
+        "media_ms": float(tiempos_ms.mean()),
+        "p50_ms": float(np.percentile(tiempos_ms, 50)),
+        "p90_ms": float(np.percentile(tiempos_ms, 90)),
+        "min_ms": float(tiempos_ms.min()),
+    }
+
+
+def fotogramas_sinteticos(ancho, alto, cantidad):
+    """Ruido con rectángulos: ni trivial de comprimir ni de redimensionar."""
+    generador = np.random.default_rng(0)
+    fotogramas = []
+    for i in range(cantidad):
+        imagen = generador.integers(0, 256, (alto, ancho, 3), dtype=np.uint8)
+        cv2.rectangle(imagen, (40 + 8 * i, alto // 3), (40 + 8 * i + ancho // 6, alto // 3 + alto // 3),
+                      (255, 255, 255), -1)
+        fotogramas.append(imagen)
+    return fotogramas
+
+
+def fotogramas_de_video(ruta, cantidad):
+    cap = cv2.VideoCapture(ruta)
+    fotogramas = []
+    while len(fotogramas) < cantidad:
+        ret, imagen = cap.read()
+        if not ret:
+            break
+        fotogramas.append(imagen)
+    cap.release()
+    return fotogramas
+
+
+def detecciones_sinteticas(ancho, alto, cantidad):
+    return [
+        Deteccion(int(ancho * (0.1 + 0.15 * i) % ancho), alto // 4, ancho // 8, alto // 3, 0.5 + 0.05 * i, "person")
+        for i in range(cantidad)
+    ]
+
+
+def _ciclo(fotogramas):
+    """Función que entrega un fotograma distinto en cada llamada."""
+    estado = {"i": 0}
+
+    def siguiente():
+        estado["i"] = (estado["i"] + 1) % len(fotogramas)
+        return fotogramas[estado["i"]]
+    return siguiente
+
+
+class _SesionSinRed:
+    """Imita requests.Session: arma el pedido (multipart incluido) y no lo envía."""
+
+    class _Respuesta:
+        status_code = 200
+        text = ""
+
+        @staticmethod
+        def json():
+            return {"ok": True}
+
+    def post(self, url, files=None, data=None, **kwargs):
+        requests.Request("POST", "http://benchmark.invalid/", files=files, data=data).prepare()
+        return self._Respuesta()
+
+
+def operaciones_fotograma(capturas, args):
+    """{nombre: estadísticas} de las operaciones que se hacen en cada fotograma."""
+    resultados = {}
+    alto = int(config.ANCHO_PROCESAMIENTO * capturas[0].shape[0] / capturas[0].shape[1])
+    dimensiones = (config.ANCHO_PROCESAMIENTO, alto)
+    captura = _ciclo(capturas)
+    resultados["redimension"] = medir(
+        lambda: cv2.resize(captura(), dimensiones, interpolation=cv2.INTER_AREA), args.repeticiones
+    )
+
+    procesados = [cv2.resize(c, dimensiones, interpolation=cv2.INTER_AREA) for c in capturas]
+    procesado = _ciclo(procesados)
+    try:
+        import mediapipe as mp
+
+        def convertir():
+            imagen_rgb = cv2.cvtColor(procesado(), cv2.COLOR_BGR2RGB)
+            return mp.Image(image_format=mp.ImageFormat.SRGB, data=imagen_rgb)
+        resultados["conversion_color"] = medir(convertir, args.repeticiones)
+    except ImportError:
+        print("ADVERTENCIA: mediapipe no está instalado; se omite la conversión a mp.Image.")
+
+    if not args.sin_detector:
+        detector = None
+        try:
+            descargar_modelo_si_no_existe()
+            detector = crear_detector_objetos()
+        except Exception as e:
+            print(f"ADVERTENCIA: no se pudo preparar el modelo ({e}).")
+        if detector is None:
+            print("ADVERTENCIA: se omite la detección.")
+        else:
+            reloj = {"ms": 0}
+
+            def detectar():
+                reloj["ms"] += 1000 // config.FPS_ESPERADO
+                return detector.detectar(procesado(), reloj["ms"])
+            resultados["deteccion"] = medir(detectar, args.repeticiones)
+            detector.cerrar()
+
+    detecciones = detecciones_sinteticas(*dimensiones, args.detecciones)
+
+    def dibujar():
+        # Como en el pipeline: el fotograma es compartido, se dibuja sobre una copia
+        dibujar_detecciones(procesado().copy(), detecciones)
+    resultados["dibujo"] = medir(dibujar, args.repeticiones)
+    return resultados
+
+
+def operaciones_alerta(capturas, args, directorio):
+    """{nombre: estadísticas} de las operaciones que se hacen una vez por alerta."""
+    resultados = {}
+    alto = int(config.ANCHO_PROCESAMIENTO * capturas[0].shape[0] / capturas[0].shape[1])
+    dimensiones = (config.ANCHO_PROCESAMIENTO, alto)
+    procesados = [cv2.resize(c, dimensiones, interpolation=cv2.INTER_AREA) for c in capturas]
+    frames_clip = config.TAMAÑO_BUFFER + config.FRAMES_A_GRABAR_POST
+    repeticiones = max(1, args.repeticiones // 20)
+
+    ruta_clip = None
+    for codec_str, extension, _ in CODECS_PARA_PROBAR:
+        ruta = os.path.join(directorio, f"clip_{codec_str}{extension}")
+        prueba = cv2.VideoWriter(ruta, cv2.VideoWriter.fourcc(*codec_str), config.FPS_ESPERADO, dimensiones)
+        disponible = prueba.isOpened()
+        prueba.release()
+        if not disponible:
+            print(f"ADVERTENCIA: el códec {codec_str} no está disponible; se omite.")
+            continue
+
+        def grabar_clip():
+            video_out = cv2.VideoWriter(ruta, cv2.VideoWriter.fourcc(*codec_str), config.FPS_ESPERADO, dimensiones)
+            for i in range(frames_clip):
+                video_out.write(procesados[i % len(procesados)])
+            video_out.release()
+        resultados[f"videowriter_{codec_str}"] = medir(grabar_clip, repeticiones, calentamiento=1)
+        resultados[f"videowriter_{codec_str}"]["fotogramas"] = frames_clip
+        ruta_clip = ruta_clip or ruta
+
+    # Un fotograma inferido cada tres, con detecciones, como durante un evento
+    detecciones = detecciones_sinteticas(*dimensiones, args.detecciones)
+    inferidos = [
+        (Fotograma(i, float(i), procesados[i % len(procesados)]), detecciones)
+        for i in range(0, frames_clip, 3)
+    ]
+
+    def mejor_frame():
+        indice = IndiceFrames(0)
+        for fotograma, detecciones_fotograma in inferidos:
+            indice.registrar(fotograma, detecciones_fotograma)
+        return indice.mejor_imagen()
+    resultados["mejor_frame"] = medir(mejor_frame, args.repeticiones)
+
+    if ruta_clip is None:
+        print("ADVERTENCIA: ningún códec disponible; se omite el armado de los envíos.")
+        return resultados
+    sesion = _SesionSinRed()
+    salida = io.StringIO()  # Los notificadores informan cada envío: no interesa durante la medición
+
+    def payload_discord():
+        with contextlib.redirect_stdout(salida):
+            discord_notifier.enviar_video(ruta_clip, "Benchmark", sesion=sesion)
+
+    def payload_telegram():
+        with contextlib.redirect_stdout(salida):
+            telegram_notifier.enviar_video(ruta_clip, "Benchmark", sesion=sesion)
+    resultados["payload_discord"] = medir(payload_discord, args.repeticiones)
+    resultados["payload_telegram"] = medir(payload_telegram, args.repeticiones)
+    for nombre in ("payload_discord", "payload_telegram"):
+        resultados[nombre]["bytes_clip"] = os.path.getsize(ruta_clip)
+    return resultados
+
+
+def comparar(base, actual, umbral):
+    """Filas (operación, p50 base, p50 actual, variación %, estado) por operación en común."""
+    filas = []
+    for nombre, resultado in actual["operaciones"].items():
+        anterior = base["operaciones"].get(nombre)
+        if anterior is None:
+            filas.append((nombre, None, resultado["p50_ms"], None, "nueva"))
+            continue
+        variacion = (resultado["p50_ms"] / anterior["p50_ms"] - 1) * 100 if anterior["p50_ms"] else 0.0
+        if variacion > umbral:
+            estado = "REGRESIÓN"
+        elif variacion < -umbral:
+            estado = "mejora"
+        else:
+            estado = "igual"
+        filas.append((nombre, anterior["p50_ms"], resultado["p50_ms"], variacion, estado))
+    for nombre, anterior in base["operaciones"].items():
+        if nombre not in actual["operaciones"]:
+            filas.append((nombre, anterior["p50_ms"], None, None, "no medida"))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de las operaciones por fotograma y por alerta.")
+    parser.add_argument("--video", help="Video del que tomar los fotogramas (por defecto, sintéticos)")
+    parser.add_argument("--resolucion", default="1280x720", help="Resolución de los fotogramas sintéticos")
+    parser.add_argument("--fotogramas", type=int, default=30, help="Fotogramas distintos sobre los que se mide")
+    parser.add_argument("--repeticiones", type=int, default=200, help="Repeticiones por operación")
+    parser.add_argument("--detecciones", type=int, default=3, help="Detecciones por fotograma (dibujo y mejor frame)")
+    parser.add_argument("--sin-detector", action="store_true", help="No medir la detección (no carga el modelo)")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    parser.add_argument("--comparar", help="Resultados anteriores (JSON) contra los que comparar")
+    parser.add_argument("--umbral", type=float, default=10.0, help="Variación del p50 (%%) que cuenta como regresión")
+    args = parser.parse_args()
+
+    if args.video:
+        capturas = fotogramas_de_video(args.video, args.fotogramas)
+        if not capturas:
+            print(f"No se pudo leer '{args.video}'.")
+            return 1
+    else:
+        ancho, alto = (int(v) for v in args.resolucion.lower().split("x"))
+        capturas = fotogramas_sinteticos(ancho, alto, args.fotogramas)
+    alto, ancho = capturas[0].shape[:2]
+    print(f"{len(capturas)} fotogramas de {ancho}x{alto} ({args.video or 'sintéticos'}).\n")
+
+    print("Midiendo operaciones por fotograma...")
+    operaciones = {f"fotograma.{n}": r for n, r in operaciones_fotograma(capturas, args).items()}
+    print("Midiendo operaciones por alerta...")
+    directorio = tempfile.mkdtemp(prefix="cctv_benchmark_")
+    try:
+        operaciones.update({f"alerta.{n}": r for n, r in operaciones_alerta(capturas, args, directorio).items()})
+    finally:
+        for nombre in os.listdir(directorio):
+            os.remove(os.path.join(directorio, nombre))
+        os.rmdir(directorio)
+
+    resultados = {
+        "version": VERSION_RESULTADOS,
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "entorno": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "plataforma": platform.platform(),
+            "procesador": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "entrada": {"video": args.video, "ancho": ancho, "alto": alto, "ancho_procesamiento": config.ANCHO_PROCESAMIENTO},
+        "operaciones": operaciones,
+    }
+
+    print(f"\n{'Operación':<32} {'media ms':>9} {'p50 ms':>8} {'p90 ms':>8} {'min ms':>8}")
+    for nombre, r in operaciones.items():
+        print(f"{nombre:<32} {r['media_ms']:>9.3f} {r['p50_ms']:>8.3f} {r['p90_ms']:>8.3f} {r['min_ms']:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("entrada") != resultados["entrada"]:
+            print("\nADVERTENCIA: la corrida anterior usó otra entrada; la comparación puede no ser válida.")
+        filas = comparar(base, resultados, args.umbral)
+        print(f"\nComparación con {args.comparar} (umbral ±{args.umbral:.0f}% sobre el p50):")
+        print(f"{'Operación':<32} {'base ms':>9} {'actual ms':>10} {'var.':>8}  estado")
+        for nombre, anterior, actual, variacion, estado in filas:
+            base_txt = f"{anterior:.3f}" if anterior is not None else "-"
+            actual_txt = f"{actual:.3f}" if actual is not None else "-"
+            var_txt = f"{variacion:+.1f}%" if variacion is not None else "-"
+            print(f"{nombre:<32} {base_txt:>9} {actual_txt:>10} {var_txt:>8}  {estado}")
+        regresiones = [f[0] for f in filas if f[4] == "REGRESIÓN"]
+        if regresiones:
+            print(f"\n{len(regresiones)} regresión(es): {', '.join(regresiones)}")
+            return 2
+        print("\nSin regresiones.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Benchmark de la re-codificación por tamaño: tiempo de codificación vs. tamaño final.
+
+Usa un clip de referencia propio o genera uno sintético (objetos en
+movimiento sobre ruido, el peor caso para el códec):
+
+    python -m scripts.benchmark_transcodificacion --limites-mb 1 2 5 10
+    python -m scripts.benchmark_transcodificacion --clip alerta_123.mp4 --json resultados.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from scripts import config
+from scripts.codificador import detectar_codec
+from scripts.transcodificador import leer_propiedades, transcodificar
+
+
+def generar_clip_referencia(directorio, segundos, dimensiones, fps):
+    """Escribe un clip sintético y retorna su ruta."""
+    codec = detectar_codec(dimensiones, fps)
+    if codec is None:
+        raise RuntimeError("No hay ningún códec disponible para generar el clip de referencia.")
+    ruta = os.path.join(directorio, "referencia" + codec[1])
+    ancho, alto = dimensiones
+    video_out = cv2.VideoWriter(ruta, cv2.VideoWriter.fourcc(*codec[0]), fps, dimensiones)
+    generador = np.random.default_rng(0)
+    for i in range(int(segundos * fps)):
+        fotograma = generador.integers(0, 60, (alto, ancho, 3), dtype=np.uint8)
+        x = int((i * 7) % max(1, ancho - 80))
+        y = int(alto / 2 + alto / 4 * np.sin(i / 10))
+        cv2.rectangle(fotograma, (x, y - 40), (x + 80, y + 40), (40, 200, 40), -1)
+        cv2.circle(fotograma, (ancho - x, alto // 3), 30, (200, 60, 60), -1)
+        video_out.write(fotograma)
+    video_out.release()
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de re-codificación vs. tamaño de salida.")
+    parser.add_argument("--clip", help="Clip de referencia (por defecto se genera uno sintético)")
+    parser.add_argument("--segundos", type=float, default=60, help="Duración del clip sintético")
+    parser.add_argument("--ancho", type=int, default=640, help="Ancho del clip sintético")
+    parser.add_argument("--alto", type=int, default=480, help="Alto del clip sintético")
+    parser.add_argument("--limites-mb", type=float, nargs="+", default=[1, 2, 5, 10], help="Límites a probar")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="cctv_bench_")
+    try:
+        if args.clip:
+            ruta_clip = shutil.copy(args.clip, directorio)
+        else:
+            print("Generando clip de referencia...")
+            ruta_clip = generar_clip_referencia(directorio, args.segundos, (args.ancho, args.alto), config.FPS_ESPERADO)
+
+        ancho, alto, fps, fotogramas = leer_propiedades(ruta_clip)
+        tamano_original = os.path.getsize(ruta_clip)
+        print(
+            f"Clip: {ancho}x{alto} @ {fps:.1f} fps, {fotogramas / fps:.1f} s, "
+            f"{tamano_original / (1024 * 1024):.2f}MB | herramienta: {'ffmpeg' if shutil.which('ffmpeg') else 'OpenCV'}\n"
+        )
+        print(f"{'Límite MB':>10} {'Salida MB':>10} {'Tiempo s':>9} {'Entra':>6}")
+
+        resultados = []
+        for limite_mb in args.limites_mb:
+            limite_bytes = int(limite_mb * 1024 * 1024)
+            inicio = time.perf_counter()
+            ruta_salida = transcodificar(ruta_clip, limite_bytes)
+            duracion = time.perf_counter() - inicio
+            tamano = os.path.getsize(ruta_salida) if ruta_salida else None
+            resultados.append({
+                "limite_mb": limite_mb,
+                "salida_mb": tamano / (1024 * 1024) if tamano else None,
+                "segundos": duracion,
+                "entra": ruta_salida is not None,
+            })
+            salida_mb = f"{tamano / (1024 * 1024):.2f}" if tamano else "-"
+            print(f"{limite_mb:>10.1f} {salida_mb:>10} {duracion:>9.2f} {'sí' if ruta_salida else 'no':>6}")
+            if ruta_salida:
+                os.remove(ruta_salida)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({
+                    "clip": {"ancho": ancho, "alto": alto, "fps": fps, "fotogramas": fotogramas,
+                             "mb": tamano_original / (1024 * 1024)},
+                    "resultados": resultados,
+                }, f, indent=2)
+            print(f"\nResultados guardados en {args.json}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+
+class BufferPreroll:
+    """Búfer circular de pre-roll respaldado por memoria preasignada.
+
+    En modo normal todos los fotogramas viven en un único arreglo NumPy de
+    forma (N, alto, ancho, 3) y cada fotograma nuevo se copia (o se
+    redimensiona) dentro de su ranura, sin asignar memoria por fotograma.
+    En modo comprimido cada ranura guarda el JPEG del fotograma, lo que
+    permite mantener decenas de segundos de pre-roll con poca RAM.
+    """
+
+    def __init__(self, capacidad, dimensiones, comprimido=False, calidad_jpeg=80):
+        self.capacidad = max(1, int(capacidad))
+        self.ancho, self.alto = dimensiones
+        self.comprimido = comprimido
+        self._parametros_jpeg = [int(cv2.IMWRITE_JPEG_QUALITY), int(calidad_jpeg)]
+
+        if comprimido:
+            self._ranuras = [None] * self.capacidad
+        else:
+            self._datos = np.zeros((self.capacidad, self.alto, self.ancho, 3), dtype=np.uint8)
+
+        self._inicio = 0    # Índice de la ranura más antigua
+        self._cantidad = 0
+
+    def __len__(self):
+        return self._cantidad
+
+    def agregar(self, imagen_bgr):
+        """Guarda un fotograma, pisando el más antiguo si el búfer está lleno."""
+        indice = (self._inicio + self._cantidad) % self.capacidad
+        if self._cantidad == self.capacidad:
+            self._inicio = (self._inicio + 1) % self.capacidad
+        else:
+            self._cantidad += 1
+
+        if self.comprimido:
+            ok, jpeg = cv2.imencode(".jpg", imagen_bgr, self._parametros_jpeg)
+            self._ranuras[indice] = jpeg if ok else None
+        elif imagen_bgr.shape[:2] == (self.alto, self.ancho):
+            np.copyto(self._datos[indice], imagen_bgr)
+        else:
+            cv2.resize(imagen_bgr, (self.ancho, self.alto), dst=self._datos[indice], interpolation=cv2.INTER_AREA)
+
+    def iterar(self):
+        """Recorre los fotogramas del más antiguo al más reciente.
+
+        En modo normal entrega vistas del arreglo interno (sin copias): son
+        válidas solo hasta el próximo agregar() o limpiar().
+        """
+        for i in range(self._cantidad):
+            indice = (self._inicio + i) % self.capacidad
+            if self.comprimido:
+                jpeg = self._ranuras[indice]
+                if jpeg is not None:
+                    yield cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            else:
+                yield self._datos[indice]
+
+    def __iter__(self):
+        return self.iterar()
+
+    def primero(self):
+        """Fotograma más antiguo (copia), o None si el búfer está vacío."""
+        for fotograma in self.iterar():
+            return fotograma.copy() if not self.comprimido else fotograma
+        return None
+
+    def limpiar(self):
+        self._inicio = 0
+        self._cantidad = 0
+        if self.comprimido:
+            self._ranuras = [None] * self.capacidad
+
+    def bytes_en_uso(self):
+        """Memoria ocupada por los fotogramas guardados (aproximada en modo comprimido)."""
+        if self.comprimido:
+            return sum(len(jpeg) for jpeg in self._ranuras if jpeg is not None)
+        return self._datos.nbytes
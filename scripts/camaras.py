@@ -0,0 +1,715 @@
+"""Varias cámaras con un pool de detectores compartido.
+
+Cada cámara tiene su PipelineCamara (captura, colas, planificador, filtro de
+movimiento, seguimiento y etapa de grabación con su propio pre-roll, estado
+y cooldown); las inferencias de todas pasan por un único PoolDetectores, que
+reparte los detectores entre las cámaras que esperan.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from scripts import config
+from scripts import metricas
+from scripts.codificador import CodificadorClips, detectar_codec
+from scripts.dvr import GrabadorSegmentos
+from scripts.grabacion import EtapaGrabacion
+from scripts.movimiento import FiltroMovimiento
+from scripts.pipeline import ColaFotogramas, HiloCaptura, POLITICA_BLOQUEAR, dibujar_detecciones
+from scripts.planificador import PlanificadorInferencia
+from scripts.seguimiento import SeguidorObjetos
+from scripts.vista_previa import ServidorVistaPrevia
+from scripts.zonas import ZonasInteres, ancho_relativo_zonas, filtros_detector
+
+POLITICAS_POOL = ("round_robin", "movimiento")
+SEGUNDOS_VENTANA_TASAS = 10.0  # Ventana sobre la que se calculan las inferencias por segundo de cada cámara
+_ESPERA_MAXIMA_POOL = 1.0      # Con la política "movimiento", un pedido que espera más que esto pasa adelante
+_EXTENSIONES_VIDEO = (".mp4", ".avi", ".mkv", ".mov")
+# Modos que ofrecen casi todas las cámaras UVC; el driver ajusta al soportado más cercano
+_MODOS_CAPTURA = ((320, 240), (424, 240), (640, 360), (640, 480), (800, 600), (1280, 720), (1920, 1080))
+_FOTOGRAMAS_MEDICION_CAPTURA = 5
+
+
+def normalizar_camaras(camaras=None):
+    """Lleva cada entrada de CAMARAS a un diccionario con todas sus claves."""
+    camaras = config.CAMARAS if camaras is None else camaras
+    resultado = []
+    for i, camara in enumerate(camaras):
+        if not isinstance(camara, dict):
+            camara = {"fuente": camara}
+        if "fuente" not in camara:
+            raise ValueError(f"La cámara {i} no tiene 'fuente'.")
+        resultado.append({
+            "nombre": str(camara.get("nombre") or f"cam{i}"),
+            "fuente": camara["fuente"],
+            "zonas": camara.get("zonas", config.ZONAS),
+            "fps_inactivo": camara.get("fps_inactivo"),
+            "fps_activo": camara.get("fps_activo"),
+            "resolucion": camara.get("resolucion", config.RESOLUCION_CAPTURA),
+            "formato": camara.get("formato", config.FORMATO_CAPTURA),
+        })
+    nombres = [c["nombre"] for c in resultado]
+    if len(set(nombres)) != len(nombres):
+        raise ValueError(f"Hay cámaras con el mismo nombre: {', '.join(nombres)}")
+    if not resultado:
+        raise ValueError("CAMARAS está vacía.")
+    return resultado
+
+
+def filtros_detector_camaras(camaras):
+    """(umbral, categorias) de un detector que sirva a todas las cámaras.
+
+    El umbral es el menor y las categorías la unión; una cámara sin zonas
+    necesita todas las categorías. Cada cámara vuelve a filtrar con sus
+    propias reglas (zonas o UMBRAL_CONFIANZA_OBJETO).
+    """
+    filtros = [filtros_detector(c["zonas"]) for c in camaras]
+    umbral = min(config.UMBRAL_CONFIANZA_OBJETO if u is None else u for u, _ in filtros)
+    if any(categorias is None for _, categorias in filtros):
+        return umbral, None
+    return umbral, sorted(set().union(*(categorias for _, categorias in filtros)))
+
+
+class CapturaArchivo:
+    """VideoCapture de un archivo entregado al ritmo de sus fps, como una cámara.
+
+    Sin esto la captura leería el video tan rápido como pueda decodificarlo.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.intervalo = 1.0 / (fps if fps and fps > 0 else config.FPS_ESPERADO)
+        self._proximo = None
+
+    def _esperar(self):
+        ahora = time.monotonic()
+        if self._proximo is not None and self._proximo > ahora:
+            time.sleep(self._proximo - ahora)
+        self._proximo = max(self._proximo or ahora, time.monotonic() - self.intervalo) + self.intervalo
+
+    def read(self):
+        self._esperar()
+        return self.cap.read()
+
+    def grab(self):
+        self._esperar()
+        return self.cap.grab()
+
+    def retrieve(self):
+        return self.cap.retrieve()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, propiedad):
+        return self.cap.get(propiedad)
+
+    def release(self):
+        self.cap.release()
+
+
+def es_dispositivo(fuente):
+    """True si la fuente es un índice de dispositivo local (no una URL ni un archivo)."""
+    return isinstance(fuente, int) or (isinstance(fuente, str) and fuente.isdigit())
+
+
+def abrir_captura(fuente):
+    """VideoCapture de un índice de dispositivo, una URL o un archivo de video."""
+    if es_dispositivo(fuente):
+        fuente = int(fuente)
+    cap = cv2.VideoCapture(fuente)
+    if isinstance(fuente, str) and os.path.isfile(fuente) and fuente.lower().endswith(_EXTENSIONES_VIDEO):
+        return CapturaArchivo(cap)
+    return cap
+
+
+def _medir_captura(cap):
+    """(ms por fotograma de retrieve() más la redimensión a ANCHO_PROCESAMIENTO, (ancho, alto)).
+
+    Es lo que cuesta cada fotograma que se usa; el grab() (la espera al
+    sensor) queda fuera de la medición.
+    """
+    tiempos, dimensiones = [], None
+    for _ in range(_FOTOGRAMAS_MEDICION_CAPTURA):
+        if not cap.grab():
+            break
+        inicio = time.perf_counter()
+        ret, imagen = cap.retrieve()
+        if not ret:
+            break
+        alto = int(config.ANCHO_PROCESAMIENTO * imagen.shape[0] / imagen.shape[1])
+        cv2.resize(imagen, (config.ANCHO_PROCESAMIENTO, alto), interpolation=cv2.INTER_AREA)
+        tiempos.append(time.perf_counter() - inicio)
+        dimensiones = (imagen.shape[1], imagen.shape[0])
+    return (sum(tiempos) / len(tiempos) * 1000 if tiempos else None), dimensiones
+
+
+def _fijar_modo(cap, ancho, alto, formato):
+    """Pide un modo al driver y retorna el (ancho, alto) que quedó."""
+    if formato == "auto":
+        # A baja resolución YUYV entra en el ancho de banda USB y no hay JPEG que decodificar
+        formato = "YUYV" if ancho <= 640 else "MJPG"
+    if formato:
+        # El formato va antes que la resolución: de él dependen los modos disponibles
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc(*formato))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+    return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+
+def _formato_actual(cap):
+    codigo = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((codigo >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00") or "?"
+
+
+def configurar_captura(cap, camara):
+    """Ajusta el modo nativo de un dispositivo local según la cámara.
+
+    Deja el búfer del driver en BUFFER_CAPTURA y pide la resolución (con
+    "auto", el modo más chico del mismo aspecto que cubra el ancho de
+    procesamiento o el que necesita el recorte de las zonas) y el formato.
+    Retorna el modo anterior y el obtenido con el costo por fotograma de
+    cada uno, o None si no se pidió ningún cambio.
+    """
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, config.BUFFER_CAPTURA)
+    resolucion, formato = camara["resolucion"], camara["formato"]
+    if resolucion is None and formato is None:
+        return None
+    costo_antes, dimensiones_antes = _medir_captura(cap)
+    if dimensiones_antes is None:
+        return None
+    formato_antes = _formato_actual(cap)
+
+    ancho_antes, alto_antes = dimensiones_antes
+    if resolucion == "auto":
+        # Las zonas se recortan de la captura: el recorte debe llegar a ANCHO_INFERENCIA_ZONAS
+        ancho_relativo = ancho_relativo_zonas(camara["zonas"])
+        ancho_minimo = config.ANCHO_PROCESAMIENTO
+        if ancho_relativo is not None:
+            ancho_minimo = max(ancho_minimo, int(config.ANCHO_INFERENCIA_ZONAS / ancho_relativo))
+        aspecto = ancho_antes / alto_antes
+        candidatos = sorted(
+            (m for m in _MODOS_CAPTURA if ancho_minimo <= m[0] <= ancho_antes),
+            key=lambda m: (abs(m[0] / m[1] - aspecto) > 0.05, m[0])
+        )
+    elif resolucion is not None:
+        candidatos = [tuple(resolucion)]
+    else:
+        candidatos = [dimensiones_antes]
+
+    obtenido = dimensiones_antes
+    for ancho, alto in candidatos:
+        obtenido = _fijar_modo(cap, ancho, alto, formato)
+        if resolucion != "auto" or obtenido[0] >= ancho_minimo:
+            break
+    else:
+        if candidatos:
+            # Ningún modo cubre el ancho necesario: se vuelve al que tenía
+            obtenido = _fijar_modo(cap, ancho_antes, alto_antes, formato_antes if formato and formato_antes != "?" else None)
+
+    costo_despues, dimensiones_despues = _medir_captura(cap)
+    return {
+        "antes": {"dimensiones": dimensiones_antes, "formato": formato_antes, "ms_por_fotograma": costo_antes},
+        "despues": {
+            "dimensiones": dimensiones_despues or obtenido, "formato": _formato_actual(cap),
+            "ms_por_fotograma": costo_despues,
+        },
+    }
+
+
+def describir_modo_captura(reporte):
+    antes, despues = reporte["antes"], reporte["despues"]
+    texto = (
+        f"Captura: {antes['dimensiones'][0]}x{antes['dimensiones'][1]} {antes['formato']} -> "
+        f"{despues['dimensiones'][0]}x{despues['dimensiones'][1]} {despues['formato']}"
+    )
+    if antes["ms_por_fotograma"] is not None and despues["ms_por_fotograma"] is not None:
+        texto += (
+            f"; decodificación y redimensión {antes['ms_por_fotograma']:.1f} -> {despues['ms_por_fotograma']:.1f} ms "
+            f"por fotograma (ahorro {antes['ms_por_fotograma'] - despues['ms_por_fotograma']:.1f} ms)"
+        )
+    return texto
+
+
+def imprimir_estadisticas_captura(hilo_captura, etiqueta="", dispositivo=True):
+    """Fotogramas descartados tras grab() y lo que se ahorró al no llamar a retrieve().
+
+    El ahorro es el tiempo medido de retrieve() en los fotogramas entregados.
+    En una cámara local eso es la decodificación; en otras fuentes (backend
+    FFmpeg) grab() ya decodificó y el ahorro es solo la conversión a BGR.
+    """
+    if not hilo_captura.omitidos:
+        return
+    decodificados = max(1, hilo_captura.capturados)
+    ms_retrieve = hilo_captura.segundos_decodificacion / decodificados * 1000
+    total = hilo_captura.capturados + hilo_captura.omitidos
+    print(
+        f"{etiqueta}Captura: {hilo_captura.omitidos} de {total} fotogramas descartados "
+        + ("sin decodificar" if dispositivo else "tras grab() (ya decodificados por FFmpeg, sin convertir)")
+        + f" (ahorro medido de ~{ms_retrieve:.1f} ms cada uno, "
+        f"~{ms_retrieve * hilo_captura.omitidos / total:.1f} ms por fotograma entregado por la cámara)"
+    )
+
+
+class _Pedido:
+    """Inferencia pedida por una cámara; el hilo del detector completa el resultado."""
+
+    def __init__(self, imagen_bgr, timestamp_ms, prioridad):
+        self.imagen_bgr = imagen_bgr
+        self.timestamp_ms = timestamp_ms
+        self.prioridad = prioridad
+        self.llegada = time.monotonic()
+        self.listo = False
+        self.detecciones = []
+        self.segundos = 0.0
+
+
+class PoolDetectores:
+    """Detectores compartidos por todas las cámaras, cada uno en su hilo.
+
+    detectar() bloquea a la cámara hasta que un detector atiende su pedido.
+    Como cada cámara tiene a lo sumo un pedido pendiente, un detector libre
+    elige entre las cámaras que esperan: por turnos ("round_robin") o la de
+    mayor prioridad ("movimiento": energía de movimiento, más 1 durante un
+    evento activo), sin dejar que un pedido espere más de
+    _ESPERA_MAXIMA_POOL. La cantidad de detectores acota las inferencias
+    simultáneas, y con ellas la CPU total dedicada a inferir.
+    """
+
+    def __init__(self, detectores, politica=None):
+        self.detectores = list(detectores)
+        self.politica = politica or config.POLITICA_POOL_DETECTORES
+        if self.politica not in POLITICAS_POOL:
+            raise ValueError(f"Política del pool desconocida: {self.politica} (válidas: {', '.join(POLITICAS_POOL)})")
+        self._condicion = threading.Condition()
+        self._pendientes = {}   # cámara -> _Pedido
+        self._camaras = []      # En orden de registro, para los turnos
+        self._turno = 0
+        self._inferencias = {}  # cámara -> deque de (instante, segundos de inferencia)
+        self._registro = {}     # cámara -> instante de registro
+        self._cerrado = False
+        self._hilos = [
+            threading.Thread(target=self._atender, args=(detector,), name=f"pool_detector_{i}", daemon=True)
+            for i, detector in enumerate(self.detectores)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def registrar(self, camara):
+        with self._condicion:
+            if camara not in self._camaras:
+                self._camaras.append(camara)
+                self._inferencias[camara] = deque()
+                self._registro[camara] = time.monotonic()
+
+    def detectar(self, camara, imagen_bgr, timestamp_ms, prioridad=0.0):
+        """Retorna (detecciones, segundos de inferencia); ([], 0.0) si el pool se cerró."""
+        pedido = _Pedido(imagen_bgr, timestamp_ms, prioridad)
+        with self._condicion:
+            if self._cerrado:
+                return [], 0.0
+            self._pendientes[camara] = pedido
+            self._condicion.notify_all()
+            while not pedido.listo and not self._cerrado:
+                self._condicion.wait()
+        return pedido.detecciones, pedido.segundos
+
+    def tasas(self):
+        """Inferencias por segundo de cada cámara en los últimos SEGUNDOS_VENTANA_TASAS."""
+        ahora = time.monotonic()
+        with self._condicion:
+            self._recortar(ahora)
+            return {
+                camara: len(instantes) / max(1e-3, min(SEGUNDOS_VENTANA_TASAS, ahora - self._registro[camara]))
+                for camara, instantes in self._inferencias.items()
+            }
+
+    def ocupacion(self):
+        """Fracción del tiempo que los detectores pasaron infiriendo en la ventana."""
+        ahora = time.monotonic()
+        with self._condicion:
+            self._recortar(ahora)
+            ocupado = sum(s for instantes in self._inferencias.values() for _, s in instantes)
+        return ocupado / (SEGUNDOS_VENTANA_TASAS * len(self.detectores))
+
+    def imprimir_tasas(self):
+        detalle = ", ".join(f"{camara} {tasa:.1f}/s" for camara, tasa in self.tasas().items())
+        print(
+            f"Pool de detectores ({len(self.detectores)}, {self.politica}): inferencias {detalle}; "
+            f"ocupación {self.ocupacion():.0%}"
+        )
+
+    def colector(self):
+        valores = [("inferencias_por_segundo", (("camara", camara),), tasa) for camara, tasa in self.tasas().items()]
+        valores.append(("ocupacion_pool_detectores", (), self.ocupacion()))
+        return valores
+
+    def cerrar(self):
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+        for hilo in self._hilos:
+            hilo.join(timeout=config.ESPERA_CIERRE_POOL)
+            if hilo.is_alive():
+                print(f"ADVERTENCIA: '{hilo.name}' no terminó su inferencia en {config.ESPERA_CIERRE_POOL} s; se cierra igual.")
+        for detector in self.detectores:
+            detector.cerrar()
+
+    # --- Interno ---
+
+    def _recortar(self, ahora):
+        for instantes in self._inferencias.values():
+            while instantes and ahora - instantes[0][0] > SEGUNDOS_VENTANA_TASAS:
+                instantes.popleft()
+
+    def _elegir(self):
+        if self.politica == "movimiento":
+            ahora = time.monotonic()
+            return max(self._pendientes, key=lambda c: (
+                ahora - self._pendientes[c].llegada >= _ESPERA_MAXIMA_POOL,
+                self._pendientes[c].prioridad,
+                ahora - self._pendientes[c].llegada,
+            ))
+        for i in range(len(self._camaras)):
+            camara = self._camaras[(self._turno + i) % len(self._camaras)]
+            if camara in self._pendientes:
+                self._turno = (self._turno + i + 1) % len(self._camaras)
+                return camara
+        return next(iter(self._pendientes))  # Cámara sin registrar
+
+    def _atender(self, detector):
+        while True:
+            with self._condicion:
+                while not self._pendientes and not self._cerrado:
+                    self._condicion.wait()
+                if self._cerrado:
+                    return
+                camara = self._elegir()
+                pedido = self._pendientes.pop(camara)
+
+            inicio = time.perf_counter()
+            metricas.observar("espera_pool", time.monotonic() - pedido.llegada)
+            try:
+                detecciones = detector.detectar(pedido.imagen_bgr, pedido.timestamp_ms)
+            except Exception as e:
+                print(f"Error en la detección ({camara}): {e}")
+                detecciones = []
+            segundos = time.perf_counter() - inicio
+
+            with self._condicion:
+                pedido.detecciones, pedido.segundos, pedido.listo = detecciones, segundos, True
+                if camara in self._inferencias:
+                    self._inferencias[camara].append((time.monotonic(), segundos))
+                self._condicion.notify_all()
+
+
+def colector_colas(colas):
+    """Profundidad y descartes de las colas para el endpoint de métricas."""
+    def colectar():
+        valores = []
+        for cola in colas:
+            e = cola.estadisticas()
+            etiquetas = (("cola", e["cola"]),)
+            valores.append(("cola_profundidad", etiquetas, e["profundidad"]))
+            valores.append(("cola_descartados", etiquetas, e["descartados"]))
+        return valores
+    return colectar
+
+
+def imprimir_estadisticas_colas(colas):
+    for cola in colas:
+        e = cola.estadisticas()
+        print(
+            f"Cola '{e['cola']}' ({e['politica']}): profundidad {e['profundidad']}/{e['capacidad']} "
+            f"(máx. {e['profundidad_max']}), encolados {e['encolados']}, descartados {e['descartados']}"
+        )
+
+
+def imprimir_estadisticas_inferencia(planificador, timestamp, etiqueta=""):
+    e = planificador.estadisticas(timestamp)
+    print(
+        f"{etiqueta}Inferencia: {e['inferencias']} ejecutadas, {e['omitidos']} fotogramas omitidos, "
+        f"latencia media {e['latencia_media_ms']:.1f} ms, objetivo {e['fps_objetivo']:.1f} fps "
+        f"({'evento activo' if e['evento_activo'] else 'reposo'})"
+    )
+
+
+def imprimir_estadisticas_movimiento(filtro_movimiento, etiqueta=""):
+    e = filtro_movimiento.estadisticas()
+    print(
+        f"{etiqueta}Filtro de movimiento: tasa de apertura {e['tasa_apertura']:.1%} "
+        f"({e['aperturas_movimiento']} por movimiento, {e['aperturas_forzadas']} forzadas), "
+        f"{e['inferencias_ahorradas']} inferencias ahorradas"
+    )
+
+
+class PipelineCamara(threading.Thread):
+    """Pipeline completo de una cámara; el hilo es su bucle de detección.
+
+    abrir() abre la fuente y lee el primer fotograma (las cámaras se abren
+    en paralelo), preparar() arma las etapas una vez que hay detectores e
+    iniciar() las pone en marcha. Con `varias` cámaras los archivos, las
+    colas y los logs llevan el nombre de la cámara, y el DVR usa un
+    subdirectorio propio. La ventana la dibuja el hilo principal con lo que
+    retorna tomar_para_mostrar().
+    """
+
+    def __init__(self, camara, varias=False, escala_presupuesto=1.0, puerto_vista_previa=None, abrir_fuente=None):
+        super().__init__(name=f"{camara['nombre']}_deteccion", daemon=True)
+        self.camara = camara
+        self.abrir_fuente = abrir_fuente or abrir_captura
+        self.nombre = camara["nombre"]
+        self.varias = varias
+        self.escala_presupuesto = escala_presupuesto
+        self.puerto_vista_previa = puerto_vista_previa
+        self.prefijo = f"{self.nombre}_" if varias else ""
+        self.etiqueta = f"[{self.nombre}] " if varias else ""
+
+        self.cap = None
+        self.modo_captura = None  # Modo pedido al dispositivo y costo por fotograma antes y después
+        self.dimensiones = None
+        self.zonas = None
+        self.hilo_captura = None
+        self.colas = ()
+        self.codificador = None
+        self.dvr = None
+        self.etapa_grabacion = None
+        self.vista_previa = None
+        self.pool = None
+        self.reporte_arranque = None
+        self.seguidor = None
+        self.planificador = None
+        self.filtro_movimiento = None
+        self.latencia_fija = None  # Segundos a registrar en el planificador en lugar de la latencia medida
+        self._salida = threading.Event()
+        self._lock_mostrar = threading.Lock()
+        self._para_mostrar = None
+
+    def abrir(self):
+        """Abre la fuente y calcula las dimensiones y zonas. Retorna True si quedó abierta."""
+        fuente = self.camara["fuente"]
+        cap = self.abrir_fuente(fuente)
+        if not cap.isOpened():
+            print(f"Error: No se pudo abrir la cámara '{self.nombre}' ({fuente}).")
+            return False
+        if es_dispositivo(fuente):
+            self.modo_captura = configurar_captura(cap, self.camara)
+            if self.modo_captura is not None:
+                print(f"{self.etiqueta}{describir_modo_captura(self.modo_captura)}")
+        ret, fotograma = cap.read()
+        if not ret:
+            print(f"Error al leer el primer fotograma de la cámara '{self.nombre}'.")
+            cap.release()
+            return False
+
+        altura_orig, ancho_orig, _ = fotograma.shape
+        altura_proc = int(config.ANCHO_PROCESAMIENTO * (altura_orig / ancho_orig))
+        self.dimensiones = (config.ANCHO_PROCESAMIENTO, altura_proc)
+
+        # Zonas de interés: el detector solo ve el recorte que las encierra
+        try:
+            self.zonas = ZonasInteres.desde_config((ancho_orig, altura_orig), self.dimensiones, self.camara["zonas"])
+        except (ValueError, TypeError) as e:
+            print(f"Error en la configuración de las zonas de '{self.nombre}': {e}.")
+            cap.release()
+            return False
+        if self.zonas is not None:
+            print(f"{self.etiqueta}Zonas de interés: {self.zonas.describir()}")
+        self.cap = cap
+        return True
+
+    def preparar(self, pool, al_terminar_clip, registro_eventos=None, reporte_arranque=None):
+        """Arma las etapas del pipeline. Retorna False si no hay códec para grabar."""
+        self.pool = pool
+        self.reporte_arranque = reporte_arranque
+        # El códec se prueba una sola vez: al disparar una alerta el VideoWriter se abre directo
+        codec = detectar_codec(self.dimensiones)
+        if codec is None:
+            print(f"Error: No se pudo crear el VideoWriter con ningún códec ('{self.nombre}').")
+            return False
+        self.codificador = CodificadorClips(codec, self.dimensiones, nombre=f"{self.prefijo}codificador")
+
+        # Pipeline: captura -> (cola de detección, cola de grabación)
+        self.cola_deteccion = ColaFotogramas(
+            f"{self.prefijo}deteccion", config.CAPACIDAD_COLA_DETECCION, config.POLITICA_COLA_DETECCION
+        )
+        cola_grabacion = ColaFotogramas(
+            f"{self.prefijo}grabacion", config.CAPACIDAD_COLA_GRABACION, config.POLITICA_COLA_GRABACION
+        )
+        self.colas = (self.cola_deteccion, cola_grabacion)
+
+        # Modo continuo: una tercera cola alimenta la grabación en segmentos
+        if config.MODO_CONTINUO:
+            cola_dvr = ColaFotogramas(f"{self.prefijo}dvr", config.CAPACIDAD_COLA_DVR, POLITICA_BLOQUEAR)
+            self.colas += (cola_dvr,)
+            directorio = os.path.join(config.DIRECTORIO_SEGMENTOS, self.nombre) if self.varias else None
+            self.dvr = GrabadorSegmentos(cola_dvr, codec, self.dimensiones, directorio=directorio)
+
+        self.etapa_grabacion = EtapaGrabacion(
+            cola_grabacion, self.dimensiones, self.codificador, al_terminar_clip,
+            registro_eventos=registro_eventos, dvr=self.dvr, zonas=self.zonas, prefijo=self.prefijo
+        )
+        self.hilo_captura = HiloCaptura(
+            self.cap, self.dimensiones, self.colas, zonas=self.zonas, nombre=f"{self.prefijo}captura",
+            fps_maximo=config.FPS_ESPERADO if config.DECIMAR_CAPTURA else None
+        )
+        metricas.registrar_colector(colector_colas(self.colas + (self.codificador.cola,)))
+
+        # Con seguimiento las cajas se propagan entre inferencias, así que durante un evento se infiere menos
+        self.seguidor = SeguidorObjetos() if config.SEGUIMIENTO_HABILITADO else None
+        fps_activo = self.camara["fps_activo"]
+        if fps_activo is None and self.seguidor is not None:
+            fps_activo = config.FPS_INFERENCIA_ACTIVO_SEGUIMIENTO
+        self.planificador = PlanificadorInferencia(
+            fps_activo=fps_activo, fps_inactivo=self.camara["fps_inactivo"],
+            escala_presupuesto=self.escala_presupuesto
+        )
+        self.filtro_movimiento = FiltroMovimiento(etiquetas=(("camara", self.nombre),))
+        pool.registrar(self.nombre)
+
+        if self.puerto_vista_previa:
+            try:
+                self.vista_previa = ServidorVistaPrevia(self.puerto_vista_previa).iniciar()
+            except OSError as e:
+                print(f"No se pudo abrir la vista previa en el puerto {self.puerto_vista_previa}: {e}")
+        return True
+
+    def iniciar(self):
+        self.codificador.start()
+        if self.dvr is not None:
+            self.dvr.start()
+        self.etapa_grabacion.start()
+        self.hilo_captura.start()
+        self.start()
+        return self
+
+    def tomar_para_mostrar(self):
+        """Último fotograma anotado para la ventana, o None si no hay uno nuevo."""
+        with self._lock_mostrar:
+            imagen, self._para_mostrar = self._para_mostrar, None
+        return imagen
+
+    def run(self):
+        ultimo_reporte = time.monotonic()
+        try:
+            while not self._salida.is_set():
+                # Con timeout para atender la señal de salida aunque la cámara no entregue cuadros
+                fotograma = self.cola_deteccion.obtener(timeout=0.5)
+                if fotograma is None:
+                    if self.hilo_captura.is_alive():
+                        continue
+                    break
+                self.procesar(fotograma)
+
+                if time.monotonic() - ultimo_reporte >= config.INTERVALO_ESTADISTICAS_SEGUNDOS:
+                    imprimir_estadisticas_colas(self.colas)
+                    imprimir_estadisticas_inferencia(self.planificador, fotograma.timestamp, self.etiqueta)
+                    imprimir_estadisticas_movimiento(self.filtro_movimiento, self.etiqueta)
+                    imprimir_estadisticas_captura(
+                        self.hilo_captura, self.etiqueta, dispositivo=es_dispositivo(self.camara["fuente"])
+                    )
+                    ultimo_reporte = time.monotonic()
+        except Exception as e:
+            print(f"\nError inesperado en el bucle de la cámara '{self.nombre}': {e}")
+
+    def procesar(self, fotograma):
+        """Decide si inferir, publica las detecciones a la etapa de grabación y
+        prepara la imagen anotada para la ventana y la vista previa."""
+        zonas = self.zonas
+        seguidor = self.seguidor
+        planificador = self.planificador
+        etapa_grabacion = self.etapa_grabacion
+        fotograma_proc_bgr = fotograma.imagen
+        # Con zonas, el detector (y el filtro de movimiento) solo miran el recorte de las zonas
+        imagen_inferencia = fotograma.recorte if zonas is not None else fotograma_proc_bgr
+
+        # El planificador decide la tasa de inferencia según la latencia medida y el presupuesto de CPU,
+        # y el filtro de movimiento descarta los fotogramas de escenas estáticas
+        evento_activo = planificador.evento_activo(fotograma.timestamp)
+        inferido = planificador.debe_inferir(fotograma.timestamp) and \
+            self.filtro_movimiento.debe_inferir(imagen_inferencia, fotograma.timestamp, forzar=evento_activo)
+        if inferido:
+            inicio_inferencia = time.perf_counter()
+            # El pool atiende primero a las cámaras con más movimiento (según su política)
+            prioridad = self.filtro_movimiento.ultima_energia + (1.0 if evento_activo else 0.0)
+            detecciones, _ = self.pool.detectar(
+                self.nombre, imagen_inferencia, planificador.timestamp_ms(fotograma.timestamp), prioridad
+            )
+            if zonas is not None:
+                # Del recorte a coordenadas del fotograma procesado, aplicando las reglas de cada zona
+                detecciones = zonas.filtrar(detecciones)
+            else:
+                # El detector compartido usa el umbral más bajo de todas las cámaras
+                detecciones = [d for d in detecciones if d.score >= config.UMBRAL_CONFIANZA_OBJETO]
+            # La latencia incluye la espera en el pool: el planificador se adapta a lo que cuesta de verdad
+            latencia = time.perf_counter() - inicio_inferencia
+            planificador.registrar_inferencia(
+                fotograma.timestamp, latencia if self.latencia_fija is None else self.latencia_fija, bool(detecciones)
+            )
+            if self.reporte_arranque is not None:
+                self.reporte_arranque.primera_inferencia(latencia)
+            metricas.contar("fotogramas_inferidos", etiquetas=(("camara", self.nombre),))
+
+            # Lógica de grabación (en su propia etapa)
+            if seguidor is not None:
+                # Solo los objetos nuevos (pistas que nacen) pueden disparar una alerta
+                detecciones, nacidas = seguidor.actualizar(detecciones, fotograma.timestamp, fotograma_proc_bgr)
+                etapa_grabacion.registrar_deteccion(fotograma, detecciones, disparadoras=nacidas)
+            else:
+                etapa_grabacion.registrar_deteccion(fotograma, detecciones)
+        elif seguidor is not None:
+            seguidor.predecir(fotograma.timestamp, fotograma_proc_bgr)
+
+        if seguidor is not None:
+            detecciones = seguidor.pistas()
+            etapa_grabacion.actualizar_cajas(detecciones)
+        if (inferido or seguidor is not None) and detecciones:
+            inicio_dibujo = time.perf_counter()
+            # El fotograma es compartido con la etapa de grabación: dibujamos sobre una copia
+            fotograma_proc_bgr = fotograma_proc_bgr.copy()
+            dibujar_detecciones(fotograma_proc_bgr, detecciones)
+            metricas.observar("dibujo", time.perf_counter() - inicio_dibujo)
+
+        # Debug visual: la ventana la muestra el hilo principal
+        vista_previa = self.vista_previa
+        if zonas is not None and (not config.MODO_SIN_PANTALLA or
+                                  (vista_previa is not None and vista_previa.hay_clientes())):
+            if fotograma_proc_bgr is fotograma.imagen:
+                fotograma_proc_bgr = fotograma_proc_bgr.copy()
+            zonas.dibujar(fotograma_proc_bgr)
+        # Sin clientes conectados la vista previa no codifica nada
+        if vista_previa is not None:
+            vista_previa.publicar(fotograma_proc_bgr)
+        if not config.MODO_SIN_PANTALLA:
+            with self._lock_mostrar:
+                self._para_mostrar = fotograma_proc_bgr
+        return inferido
+
+    def detener(self):
+        """Detiene el bucle y las etapas; el clip en curso se cierra antes de volver."""
+        self._salida.set()
+        if self.is_alive():
+            self.join()
+        if self.vista_previa is not None:
+            self.vista_previa.detener()
+        if self.hilo_captura is not None and self.hilo_captura.is_alive():
+            self.hilo_captura.detener.set()
+            self.hilo_captura.join(timeout=2.0)
+        for cola in self.colas:
+            cola.cerrar()
+        if self.etapa_grabacion is not None and self.etapa_grabacion.is_alive():
+            self.etapa_grabacion.join()
+        if self.dvr is not None and self.dvr.is_alive():
+            # Cierra el segmento en curso y termina los clips que esperaban por él
+            self.dvr.detener()
+        if self.codificador is not None and self.codificador.is_alive():
+            self.codificador.detener()
+        if self.cap is not None:
+            self.cap.release()
+
+    def imprimir_estadisticas_colas(self):
+        imprimir_estadisticas_colas(self.colas + ((self.codificador.cola,) if self.codificador is not None else ()))
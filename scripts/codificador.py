@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+
+from scripts import config
+from scripts import metricas
+from scripts.pipeline import ColaFotogramas, POLITICA_BLOQUEAR
+
+# Códecs a probar en orden de preferencia: (fourcc, extensión, descripción)
+CODECS_PARA_PROBAR = [
+    ('H264', '.mp4', 'MP4 con H.264 alternativo'),
+    ('avc1', '.mp4', 'MP4 con H.264'),
+    ('mp4v', '.mp4', 'MP4 con MPEG-4'),
+    ('XVID', '.avi', 'AVI con XVID como fallback')
+]
+
+
+def detectar_codec(dimensiones, fps=None):
+    """Prueba los códecs una sola vez y retorna (fourcc, extensión) del primero que abre.
+
+    Retorna None si ningún códec está disponible.
+    """
+    fps = fps or config.FPS_ESPERADO
+    directorio = tempfile.mkdtemp(prefix="cctv_codec_")
+    try:
+        for codec_str, extension, descripcion in CODECS_PARA_PROBAR:
+            ruta_prueba = os.path.join(directorio, f"prueba{extension}")
+            video_out = cv2.VideoWriter(ruta_prueba, cv2.VideoWriter.fourcc(*codec_str), fps, dimensiones)
+            abierto = video_out.isOpened()
+            video_out.release()
+            if abierto:
+                print(f"Códec seleccionado: {codec_str} ({descripcion})")
+                return codec_str, extension
+        return None
+    finally:
+        for nombre in os.listdir(directorio):
+            os.remove(os.path.join(directorio, nombre))
+        os.rmdir(directorio)
+
+
+class CodificadorClips(threading.Thread):
+    """Hilo dedicado a escribir clips a disco.
+
+    Las demás etapas solo encolan órdenes (abrir, escribir, cerrar, guardar
+    imagen) y nunca esperan al VideoWriter. Al cerrar cada clip informa
+    cuánto tardó en finalizar y llama al callback indicado en abrir().
+    """
+
+    def __init__(self, codec, dimensiones, fps=None, nombre="codificador"):
+        super().__init__(name=nombre, daemon=True)
+        self.codec_str, self.extension = codec
+        self.dimensiones = dimensiones
+        self.fps = fps or config.FPS_ESPERADO
+        self.cola = ColaFotogramas(nombre, config.CAPACIDAD_COLA_CODIFICADOR, POLITICA_BLOQUEAR)
+
+        self._video_out = None
+        self._ruta = None
+        self._al_cerrar = None
+        self._fotogramas = 0
+        self._inicio_clip = None
+
+    # --- API para las otras etapas (no bloquean salvo que la cola esté llena) ---
+
+    def abrir(self, ruta_sin_extension, al_cerrar):
+        """Empieza un clip nuevo. Retorna la ruta final (con la extensión del códec)."""
+        ruta = ruta_sin_extension + self.extension
+        self.cola.poner(("abrir", ruta, al_cerrar))
+        return ruta
+
+    def escribir(self, imagen_bgr):
+        """Encola un fotograma. La imagen no debe modificarse después de encolarla."""
+        self.cola.poner(("escribir", imagen_bgr))
+
+    def cerrar(self):
+        self.cola.poner(("cerrar", time.perf_counter()))
+
+    def guardar_imagen(self, ruta, imagen_bgr):
+        self.cola.poner(("imagen", ruta, imagen_bgr))
+
+    def detener(self):
+        """Termina de procesar lo encolado y finaliza el hilo."""
+        self.cola.cerrar()
+        self.join()
+
+    # --- Hilo ---
+
+    def run(self):
+        try:
+            while True:
+                orden = self.cola.obtener()
+                if orden is None:
+                    break
+                try:
+                    self._ejecutar(orden)
+                except Exception as e:
+                    print(f"Error en el codificador de clips ({orden[0]}): {e}")
+        finally:
+            if self._video_out is not None:
+                self._video_out.release()
+                self._video_out = None
+                print("Grabación de video interrumpida y cerrada.")
+
+    def _ejecutar(self, orden):
+        tipo = orden[0]
+        if tipo == "abrir":
+            _, ruta, al_cerrar = orden
+            if self._video_out is not None:
+                print(f"ADVERTENCIA: Se abrió '{ruta}' sin cerrar '{self._ruta}'. Cerrando el anterior.")
+                self._cerrar(time.perf_counter())
+            self._inicio_clip = time.perf_counter()
+            self._video_out = cv2.VideoWriter(ruta, cv2.VideoWriter.fourcc(*self.codec_str), self.fps, self.dimensiones)
+            self._ruta = ruta
+            self._al_cerrar = al_cerrar
+            self._fotogramas = 0
+            if not self._video_out.isOpened():
+                print(f"ERROR: No se pudo abrir el VideoWriter para '{ruta}'.")
+        elif tipo == "escribir":
+            if self._video_out is not None:
+                inicio = time.perf_counter()
+                self._video_out.write(orden[1])
+                metricas.observar("codificacion", time.perf_counter() - inicio)
+                self._fotogramas += 1
+        elif tipo == "cerrar":
+            self._cerrar(orden[1])
+        elif tipo == "imagen":
+            cv2.imwrite(orden[1], orden[2])
+
+    def _cerrar(self, pedido_en):
+        if self._video_out is None:
+            return
+        exito = self._video_out.isOpened()
+        self._video_out.release()
+        self._video_out = None
+
+        ahora = time.perf_counter()
+        print(
+            f"Clip '{self._ruta}' finalizado: {self._fotogramas} fotogramas, "
+            f"{(ahora - pedido_en) * 1000:.0f} ms desde el pedido de cierre, "
+            f"{(ahora - self._inicio_clip):.1f} s desde la apertura."
+        )
+        if self._al_cerrar is not None:
+            self._al_cerrar(self._ruta, exito)
@@ -0,0 +1,62 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts import config
+from scripts import metricas
+
+
+class DespachadorNotificaciones:
+    """Despachador único y de larga vida para los envíos a Discord y Telegram.
+
+    Mantiene una requests.Session por servicio (las conexiones TCP+TLS se
+    reutilizan entre alertas) y un pool fijo de hilos que acota cuántas
+    subidas hay en vuelo a la vez. Las subidas que excedan ese límite
+    esperan su turno en la cola del pool.
+    """
+
+    def __init__(self, max_envios_simultaneos=None):
+        self.max_envios_simultaneos = max_envios_simultaneos or config.MAX_ENVIOS_SIMULTANEOS
+        self._pool = ThreadPoolExecutor(max_workers=self.max_envios_simultaneos, thread_name_prefix="envio")
+        self._sesiones = {}
+        self._lock = threading.Lock()
+
+    def sesion(self, servicio):
+        """Sesión HTTP compartida para el servicio indicado ("discord", "telegram", ...)."""
+        with self._lock:
+            sesion = self._sesiones.get(servicio)
+            if sesion is None:
+                sesion = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_envios_simultaneos)
+                sesion.mount("https://", adaptador)
+                sesion.mount("http://", adaptador)
+                self._sesiones[servicio] = sesion
+            return sesion
+
+    def enviar(self, servicio, funcion, *args, **kwargs):
+        """Encola funcion(*args, sesion=<sesión del servicio>, **kwargs) y retorna su Future."""
+        return self._pool.submit(self._medir, servicio, funcion, *args, sesion=self.sesion(servicio), **kwargs)
+
+    @staticmethod
+    def _medir(servicio, funcion, *args, **kwargs):
+        """Ejecuta el envío registrando su duración y si falló."""
+        inicio = time.perf_counter()
+        entregado = False
+        try:
+            entregado = funcion(*args, **kwargs)
+            return entregado
+        finally:
+            metricas.observar(f"subida_{servicio}", time.perf_counter() - inicio)
+            if not entregado:
+                metricas.contar("subidas_fallidas", etiquetas=(("servicio", servicio),))
+
+    def cerrar(self, esperar=True):
+        """Deja de aceptar envíos; con esperar=True aguarda a que terminen los pendientes."""
+        self._pool.shutdown(wait=esperar)
+        with self._lock:
+            for sesion in self._sesiones.values():
+                sesion.close()
+            self._sesiones.clear()
@@ -1,49 +1,268 @@
 import os
+import time
+import zipfile
+from collections import namedtuple
+
+import cv2
+import numpy as np
 import requests
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-
-# Importamos las configuraciones que necesitamos
-from scripts.config import MODEL_PATH, UMBRAL_CONFIANZA_OBJETO
-
-def descargar_modelo_si_no_existe():
-    """Descarga el modelo .tflite si no existe localmente."""
-    if not os.path.exists(MODEL_PATH):
-        print(f"Descargando modelo de IA ({MODEL_PATH})...")
-        url = "https://storage.googleapis.com/mediapipe-models/object_detector/efficientdet_lite0/int8/1/efficientdet_lite0.tflite"
+
+from scripts import config
+from scripts import metricas
+from scripts.pipeline import Deteccion
+
+# Modelos publicados por MediaPipe: nombre -> precisiones disponibles
+MODELOS_PUBLICADOS = {
+    "efficientdet_lite0": ("int8", "float16", "float32"),
+    "efficientdet_lite2": ("int8", "float16", "float32"),
+}
+_URL_MODELOS = "https://storage.googleapis.com/mediapipe-models/object_detector/{modelo}/{precision}/1/{modelo}.tflite"
+
+# Ajustes de un detector. `backend` es "mediapipe" (admite delegado CPU/GPU) o "tflite"
+# (tflite-runtime: admite cantidad de hilos y activar/desactivar XNNPACK).
+AjustesDetector = namedtuple(
+    "AjustesDetector",
+    ["modelo", "precision", "backend", "delegado", "hilos", "xnnpack", "ancho_entrada", "max_resultados"]
+)
+
+
+def ajustes_desde_config():
+    return AjustesDetector(
+        config.MODELO_DETECTOR, config.PRECISION_MODELO, config.BACKEND_DETECTOR, config.DELEGADO_DETECTOR,
+        config.HILOS_DETECTOR, config.XNNPACK_DETECTOR, config.ANCHO_ENTRADA_DETECTOR, config.MAX_RESULTADOS_DETECTOR
+    )
+
+
+def ruta_modelo(modelo=None, precision=None):
+    """Archivo local del modelo. El lite0 int8 conserva el nombre de siempre."""
+    modelo = modelo or config.MODELO_DETECTOR
+    precision = precision or config.PRECISION_MODELO
+    if modelo == config.MODELO_DETECTOR and precision == config.PRECISION_MODELO and config.MODEL_PATH:
+        return config.MODEL_PATH
+    sufijo = "" if precision == "int8" else f"_{precision}"
+    return os.path.join(os.path.dirname(config.MODEL_PATH), f"{modelo}{sufijo}.tflite")
+
+
+def url_modelo(modelo, precision):
+    if modelo == config.MODELO_DETECTOR and config.URL_MODELO:
+        return config.URL_MODELO
+    if precision not in MODELOS_PUBLICADOS.get(modelo, ()):
+        raise ValueError(
+            f"MediaPipe no publica '{modelo}' en {precision} "
+            f"(disponibles: {', '.join(f'{m} {p}' for m, ps in MODELOS_PUBLICADOS.items() for p in ps)}). "
+            "Indica la URL en URL_MODELO o copia el archivo a mano."
+        )
+    return _URL_MODELOS.format(modelo=modelo, precision=precision)
+
+
+def descargar_modelo_si_no_existe(modelo=None, precision=None):
+    """Descarga el modelo .tflite si no existe localmente. Retorna su ruta."""
+    modelo = modelo or config.MODELO_DETECTOR
+    precision = precision or config.PRECISION_MODELO
+    ruta = ruta_modelo(modelo, precision)
+    if not os.path.exists(ruta):
+        print(f"Descargando modelo de IA ({ruta})...")
+        url = url_modelo(modelo, precision)
         try:
             r = requests.get(url, allow_redirects=True)
             r.raise_for_status() # Lanza un error si la descarga falla
-            with open(MODEL_PATH, 'wb') as f:
+            with open(ruta, 'wb') as f:
                 f.write(r.content)
             print("Modelo descargado exitosamente.")
         except Exception as e:
             print(f"ERROR: No se pudo descargar el modelo. {e}")
             raise
+    return ruta
+
+
+class DetectorObjetos:
+    """Detector de objetos con la misma interfaz para ambos backends.
+
+    detectar() recibe el fotograma BGR, hace la conversión de color (y la
+    reducción a `ancho_entrada`, si está configurada) y retorna las
+    detecciones como Deteccion en coordenadas de la imagen recibida.
+    """
+
+    def __init__(self, backend, ajustes, umbral, categorias):
+        self._backend = backend
+        self.ajustes = ajustes
+        self.umbral = umbral
+        self.categorias = set(categorias) if categorias else None
+        self._ultimo_timestamp_ms = -1
+
+    def detectar(self, imagen_bgr, timestamp_ms):
+        inicio = time.perf_counter()
+        # MediaPipe exige timestamps crecientes, también después de la inferencia de calentamiento
+        timestamp_ms = max(timestamp_ms, self._ultimo_timestamp_ms + 1)
+        self._ultimo_timestamp_ms = timestamp_ms
+        escala = 1.0
+        ancho = imagen_bgr.shape[1]
+        if self.ajustes.ancho_entrada and ancho > self.ajustes.ancho_entrada:
+            escala = self.ajustes.ancho_entrada / ancho
+            imagen_bgr = cv2.resize(imagen_bgr, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        imagen_rgb = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2RGB)
+        inicio_detector = time.perf_counter()
+        metricas.observar("conversion_color", inicio_detector - inicio)
+
+        crudas = self._backend.detectar(imagen_rgb, timestamp_ms)
+        metricas.observar("inferencia", time.perf_counter() - inicio_detector)
+
+        detecciones = []
+        for x, y, ancho_caja, alto_caja, score, categoria in crudas:
+            if score < self.umbral or (self.categorias is not None and categoria not in self.categorias):
+                continue
+            detecciones.append(Deteccion(
+                int(x / escala), int(y / escala), int(ancho_caja / escala), int(alto_caja / escala), score, categoria
+            ))
+        if self.ajustes.max_resultados and self.ajustes.max_resultados > 0:
+            detecciones = sorted(detecciones, key=lambda d: d.score, reverse=True)[:self.ajustes.max_resultados]
+        return detecciones
+
+    def cerrar(self):
+        self._backend.cerrar()
+
+
+class _BackendMediapipe:
+    def __init__(self, ruta, ajustes, umbral, categorias):
+        # Import diferido: MediaPipe tarda cerca de medio segundo en importarse
+        import mediapipe as mp
+        from mediapipe.tasks import python
+        from mediapipe.tasks.python import vision
+
+        self._mp = mp
+        delegado = python.BaseOptions.Delegate.GPU if ajustes.delegado == "GPU" else python.BaseOptions.Delegate.CPU
+        base_options = python.BaseOptions(model_asset_path=ruta, delegate=delegado)
+        options = vision.ObjectDetectorOptions(
+            base_options=base_options,
+            running_mode=vision.RunningMode.VIDEO,
+            score_threshold=umbral,
+            max_results=ajustes.max_resultados or -1,
+            # Sin category_allowlist se detectan todos los objetos
+            category_allowlist=categorias
+        )
+        self._detector = vision.ObjectDetector.create_from_options(options)
+
+    def detectar(self, imagen_rgb, timestamp_ms):
+        mp_image = self._mp.Image(image_format=self._mp.ImageFormat.SRGB, data=imagen_rgb)
+        resultado = self._detector.detect_for_video(mp_image, timestamp_ms)
+        crudas = []
+        for detection in resultado.detections:
+            bbox = detection.bounding_box
+            categoria = detection.categories[0] if detection.categories else None
+            crudas.append((
+                bbox.origin_x, bbox.origin_y, bbox.width, bbox.height,
+                categoria.score if categoria else 0.0,
+                categoria.category_name if categoria else ""
+            ))
+        return crudas
+
+    def cerrar(self):
+        self._detector.close()
+
+
+class _BackendTflite:
+    """Intérprete de tflite-runtime sobre el mismo modelo de MediaPipe.
+
+    Permite fijar la cantidad de hilos y desactivar XNNPACK, cosa que la
+    API de tareas de MediaPipe no expone. El umbral y las categorías se
+    aplican después, en DetectorObjetos.
+    """
+
+    def __init__(self, ruta, ajustes):
+        from tflite_runtime.interpreter import Interpreter, OpResolverType  # Dependencia opcional
+
+        opciones = {"num_threads": ajustes.hilos or None}
+        if not ajustes.xnnpack:
+            opciones["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self._interprete = Interpreter(model_path=ruta, **opciones)
+        self._interprete.allocate_tensors()
+
+        entrada = self._interprete.get_input_details()[0]
+        self._indice_entrada = entrada["index"]
+        self._tipo_entrada = entrada["dtype"]
+        _, self._alto_entrada, self._ancho_entrada, _ = entrada["shape"]
+        self._salidas = self._interprete.get_output_details()
+        self._indice_clases = None
+        self._etiquetas = self._leer_etiquetas(ruta)
+
+    @staticmethod
+    def _leer_etiquetas(ruta):
+        """Los modelos de MediaPipe traen labelmap.txt en los metadatos (un zip anexado)."""
+        try:
+            with zipfile.ZipFile(ruta) as z:
+                nombre = next(n for n in z.namelist() if n.endswith(".txt"))
+                return z.read(nombre).decode("utf-8").splitlines()
+        except (zipfile.BadZipFile, StopIteration):
+            return []
+
+    def detectar(self, imagen_rgb, timestamp_ms):
+        alto, ancho = imagen_rgb.shape[:2]
+        entrada = cv2.resize(imagen_rgb, (self._ancho_entrada, self._alto_entrada), interpolation=cv2.INTER_LINEAR)
+        if self._tipo_entrada == np.uint8:
+            entrada = entrada[np.newaxis]
+        else:
+            # Normalización de los modelos flotantes de EfficientDet-Lite ([-1, 1])
+            entrada = ((entrada.astype(np.float32) - 127.5) / 127.5)[np.newaxis]
+        self._interprete.set_tensor(self._indice_entrada, entrada)
+        self._interprete.invoke()
+
+        tensores = [self._interprete.get_tensor(s["index"])[0] for s in self._salidas]
+        cajas = next(t for t in tensores if t.ndim == 2 and t.shape[-1] == 4)
+        cantidad = int(next(t for t in tensores if t.ndim == 0))
+        planos = [i for i, t in enumerate(tensores) if t.ndim == 1]
+        if not cantidad:
+            return []
+        if self._indice_clases is None:
+            # El orden de las salidas del post-procesado varía entre exportaciones: las clases son enteras
+            self._indice_clases = next(
+                (i for i in planos if np.all(np.mod(tensores[i][:cantidad], 1) == 0)), planos[0]
+            )
+        clases = tensores[self._indice_clases]
+        scores = tensores[next(i for i in planos if i != self._indice_clases)]
+
+        crudas = []
+        for i in range(cantidad):
+            ymin, xmin, ymax, xmax = cajas[i]
+            clase = int(clases[i])
+            categoria = self._etiquetas[clase] if clase < len(self._etiquetas) else str(clase)
+            crudas.append((
+                int(xmin * ancho), int(ymin * alto), int((xmax - xmin) * ancho), int((ymax - ymin) * alto),
+                float(scores[i]), categoria
+            ))
+        return crudas
+
+    def cerrar(self):
+        pass
+
+
+def crear_detector_objetos(umbral=None, categorias=None, ajustes=None):
+    """Configura y crea el detector.
+
+    `umbral` reemplaza a UMBRAL_CONFIANZA_OBJETO, `categorias` limita las
+    categorías que se reportan (None = todas) y `ajustes` (AjustesDetector)
+    reemplaza la configuración del modelo y del backend.
+    """
+    ajustes = ajustes or ajustes_desde_config()
+    umbral = config.UMBRAL_CONFIANZA_OBJETO if umbral is None else umbral
+    ruta = ruta_modelo(ajustes.modelo, ajustes.precision)
+    print(f"Cargando modelo de IA ({ajustes.modelo} {ajustes.precision}, backend {ajustes.backend})...")
 
-def crear_detector_objetos():
-    """Configura y crea el detector de MediaPipe."""
-    print("Cargando modelo de IA (MediaPipe)...")
-    
     # Verifica si el modelo existe antes de cargarlo
-    if not os.path.exists(MODEL_PATH):
-        print(f"ERROR: No se encuentra el archivo del modelo: {MODEL_PATH}")
+    if not os.path.exists(ruta):
+        print(f"ERROR: No se encuentra el archivo del modelo: {ruta}")
         print("Ejecuta la descarga primero o revisa config.py")
         return None
 
-    base_options = python.BaseOptions(model_asset_path=MODEL_PATH)
-    options = vision.ObjectDetectorOptions(
-        base_options=base_options,
-        running_mode=vision.RunningMode.VIDEO,
-        score_threshold=UMBRAL_CONFIANZA_OBJETO
-        # Sin category_allowlist para detectar todos los objetos
-    )
-    
     try:
-        detector = vision.ObjectDetector.create_from_options(options)
+        if ajustes.backend == "tflite":
+            backend = _BackendTflite(ruta, ajustes)
+        else:
+            backend = _BackendMediapipe(ruta, ajustes, umbral, categorias)
         print("Modelo cargado. Iniciando detección.")
-        return detector
+        return DetectorObjetos(backend, ajustes, umbral, categorias)
+    except ImportError:
+        print("ERROR: BACKEND_DETECTOR = 'tflite' requiere el paquete tflite-runtime.")
+        return None
     except Exception as e:
-        print(f"ERROR: No se pudo crear el detector de MediaPipe. {e}")
-        return None
\ No newline at end of file
+        print(f"ERROR: No se pudo crear el detector ({ajustes.backend}). {e}")
+        return None
@@ -0,0 +1,239 @@
+"""Detector en un proceso aparte, con los fotogramas en memoria compartida.
+
+El proceso principal copia cada imagen a un bloque de
+multiprocessing.shared_memory y manda por un Pipe solo un registro de
+pocos bytes (secuencia, alto, ancho, timestamp); el trabajador lee la
+imagen directamente del bloque (sin pickle) y responde con las detecciones
+empaquetadas con struct. Así la inferencia no compite por el GIL con la
+captura, la grabación ni el bucle de control, y si el trabajador se cae
+(incluso por un segfault de MediaPipe) se reinicia sin tirar la captura.
+"""
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from scripts import config
+from scripts import metricas
+from scripts.pipeline import Deteccion
+
+_PEDIDO = struct.Struct("<IIIq")         # secuencia, alto, ancho, timestamp_ms
+_RESPUESTA = struct.Struct("<IHf")       # secuencia, cantidad de detecciones, segundos del detector
+_DETECCION = struct.Struct("<iiiifB")    # x, y, ancho, alto, score, largo de la categoría (le sigue en UTF-8)
+_LISTO = b"listo"
+
+
+def empaquetar_detecciones(secuencia, detecciones, segundos):
+    partes = [_RESPUESTA.pack(secuencia, len(detecciones), segundos)]
+    for d in detecciones:
+        categoria = d.categoria.encode("utf-8")[:255]
+        partes.append(_DETECCION.pack(d.x, d.y, d.ancho, d.alto, d.score, len(categoria)) + categoria)
+    return b"".join(partes)
+
+
+def desempaquetar_detecciones(datos):
+    secuencia, cantidad, segundos = _RESPUESTA.unpack_from(datos)
+    posicion = _RESPUESTA.size
+    detecciones = []
+    for _ in range(cantidad):
+        x, y, ancho, alto, score, largo = _DETECCION.unpack_from(datos, posicion)
+        posicion += _DETECCION.size
+        categoria = datos[posicion:posicion + largo].decode("utf-8")
+        posicion += largo
+        detecciones.append(Deteccion(x, y, ancho, alto, score, categoria))
+    return secuencia, detecciones, segundos
+
+
+def _trabajador(conexion, nombre_memoria, ajustes, umbral, categorias):
+    """Bucle del proceso trabajador: carga el modelo y atiende pedidos hasta recibir b''."""
+    from scripts.detector import crear_detector_objetos
+
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    detector = None
+    try:
+        detector = crear_detector_objetos(umbral=umbral, categorias=categorias, ajustes=ajustes)
+        if detector is None:
+            conexion.send_bytes(b"error: no se pudo crear el detector")
+            return
+        conexion.send_bytes(_LISTO)
+        while True:
+            pedido = conexion.recv_bytes()
+            if not pedido:
+                break
+            secuencia, alto, ancho, timestamp_ms = _PEDIDO.unpack(pedido)
+            imagen = np.ndarray((alto, ancho, 3), np.uint8, memoria.buf)
+            inicio = time.perf_counter()
+            try:
+                detecciones = detector.detectar(imagen, timestamp_ms)
+            except Exception as e:
+                print(f"Error en la detección (proceso trabajador): {e}")
+                detecciones = []
+            conexion.send_bytes(empaquetar_detecciones(secuencia, detecciones, time.perf_counter() - inicio))
+            del imagen  # La vista no debe sobrevivir al cierre de la memoria
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if detector is not None:
+            detector.cerrar()
+        memoria.close()
+
+
+class DetectorEnProceso:
+    """Misma interfaz que DetectorObjetos, con la inferencia en otro proceso.
+
+    detectar() es sincrónico: escribe la imagen en la memoria compartida,
+    manda el pedido y espera la respuesta. Como nunca hay más de un pedido
+    en vuelo, alcanza con un solo bloque de memoria. Si el trabajador muere o
+    no responde en TIMEOUT_DETECTOR_PROCESO segundos se lo reinicia y, hasta
+    que vuelva a tener el modelo cargado, detectar() retorna [] sin esperar.
+    """
+
+    def __init__(self, ajustes, umbral, categorias, tamano_memoria=None):
+        self.ajustes = ajustes
+        self.umbral = umbral
+        self.categorias = categorias
+        # Alcanza para cualquier fotograma procesado más ancho que alto; si llega uno mayor, el bloque se agranda
+        self.tamano_memoria = tamano_memoria or config.ANCHO_PROCESAMIENTO * config.ANCHO_PROCESAMIENTO * 3
+        self.reinicios = 0
+
+        self._contexto = multiprocessing.get_context("spawn")  # fork no es seguro con hilos y OpenCV cargado
+        self._memoria = None
+        self._proceso = None
+        self._conexion = None
+        self._listo = False
+        self._secuencia = 0
+        self._proximo_reinicio = 0.0
+        self._iniciar()
+
+    def esperar_listo(self, timeout=None):
+        """Espera a que el trabajador cargue el modelo. Retorna False si falló."""
+        if self._listo:
+            return True
+        if not self._conexion.poll(timeout):
+            return False
+        return self._recibir_listo()
+
+    def detectar(self, imagen_bgr, timestamp_ms):
+        if not self._listo:
+            if not self._proceso.is_alive():
+                self._reiniciar("el proceso trabajador terminó durante la carga")
+                return []
+            if not self._conexion.poll(0):
+                return []
+            if not self._recibir_listo():
+                self._reiniciar("falló la carga del modelo")
+                return []
+
+        imagen_bgr = np.ascontiguousarray(imagen_bgr)
+        if imagen_bgr.nbytes > self.tamano_memoria:
+            self.tamano_memoria = imagen_bgr.nbytes
+            self._reiniciar(
+                f"imagen de {imagen_bgr.shape[1]}x{imagen_bgr.shape[0]} mayor que la memoria compartida", forzar=True
+            )
+            return []
+
+        inicio = time.perf_counter()
+        alto, ancho = imagen_bgr.shape[:2]
+        destino = np.ndarray((alto, ancho, 3), np.uint8, self._memoria.buf)
+        destino[:] = imagen_bgr
+        del destino
+        self._secuencia = (self._secuencia + 1) & 0xFFFFFFFF
+
+        try:
+            self._conexion.send_bytes(_PEDIDO.pack(self._secuencia, alto, ancho, timestamp_ms))
+            while True:
+                if not self._conexion.poll(config.TIMEOUT_DETECTOR_PROCESO):
+                    self._reiniciar(f"sin respuesta en {config.TIMEOUT_DETECTOR_PROCESO} s", forzar=True)
+                    return []
+                secuencia, detecciones, segundos = desempaquetar_detecciones(self._conexion.recv_bytes())
+                if secuencia == self._secuencia:
+                    break
+        except (EOFError, OSError):
+            self._reiniciar("el proceso trabajador terminó", forzar=True)
+            return []
+
+        metricas.observar("inferencia", segundos)
+        metricas.observar("ipc_detector", time.perf_counter() - inicio - segundos)
+        return detecciones
+
+    def cerrar(self):
+        self._detener_trabajador()
+        if self._memoria is not None:
+            self._memoria.close()
+            self._memoria.unlink()
+            self._memoria = None
+
+    # --- Interno ---
+
+    def _iniciar(self):
+        if self._memoria is None or self._memoria.size < self.tamano_memoria:
+            if self._memoria is not None:
+                self._memoria.close()
+                self._memoria.unlink()
+            self._memoria = shared_memory.SharedMemory(create=True, size=self.tamano_memoria)
+        self._conexion, conexion_trabajador = self._contexto.Pipe()
+        self._proceso = self._contexto.Process(
+            target=_trabajador, name="detector",
+            args=(conexion_trabajador, self._memoria.name, self.ajustes, self.umbral, self.categorias),
+            daemon=True
+        )
+        self._proceso.start()
+        conexion_trabajador.close()
+        self._listo = False
+
+    def _recibir_listo(self):
+        try:
+            mensaje = self._conexion.recv_bytes()
+        except (EOFError, OSError):
+            print("ERROR: El proceso detector terminó durante la carga del modelo.")
+            return False
+        if mensaje != _LISTO:
+            print(f"ERROR: Proceso detector: {mensaje.decode('utf-8', 'replace')}")
+            return False
+        self._listo = True
+        return True
+
+    def _reiniciar(self, motivo, forzar=False):
+        # Sin `forzar`, a lo sumo un reinicio por segundo (p. ej. si el modelo falla al cargar)
+        ahora = time.monotonic()
+        if not forzar and ahora < self._proximo_reinicio:
+            return
+        self._proximo_reinicio = ahora + 1.0
+        print(f"Reiniciando el proceso detector: {motivo}.")
+        self.reinicios += 1
+        metricas.contar("reinicios_detector")
+        self._detener_trabajador()
+        self._iniciar()
+
+    def _detener_trabajador(self):
+        if self._proceso is None:
+            return
+        try:
+            self._conexion.send_bytes(b"")
+        except OSError:
+            pass
+        self._proceso.join(timeout=1.0)
+        if self._proceso.is_alive():
+            self._proceso.kill()
+            self._proceso.join()
+        self._conexion.close()
+        self._proceso = None
+
+
+def crear_detector_en_proceso(umbral=None, categorias=None, ajustes=None):
+    """Como crear_detector_objetos, pero con el detector en un proceso trabajador.
+
+    Retorna None si el trabajador no logra cargar el modelo.
+    """
+    from scripts.detector import ajustes_desde_config
+
+    ajustes = ajustes or ajustes_desde_config()
+    umbral = config.UMBRAL_CONFIANZA_OBJETO if umbral is None else umbral
+    detector = DetectorEnProceso(ajustes, umbral, categorias)
+    if not detector.esperar_listo(timeout=None):
+        detector.cerrar()
+        return None
+    print("Detector corriendo en un proceso aparte.")
+    return detector
@@ -0,0 +1,279 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import cv2
+
+from scripts import config
+from scripts import metricas
+from scripts.pipeline import hora_de_captura
+
+# Segmento cerrado: seg_<inicio ms>_<fin ms>_<fotogramas>.<ext>; el abierto lleva el sufijo _abierto
+_PATRON_SEGMENTO = re.compile(r"^seg_(\d+)_(\d+)_(\d+)(\.\w+)$")
+
+
+class Segmento:
+    def __init__(self, ruta, inicio, fin, fotogramas):
+        self.ruta = ruta
+        self.inicio = inicio          # Hora de captura (epoch) del primer fotograma
+        self.fin = fin                # Hora de captura (epoch) del último fotograma
+        self.fotogramas = fotogramas
+        self.bytes = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+
+    def duracion_video(self, fps):
+        """Duración en la línea de tiempo del archivo (fotogramas / fps del writer)."""
+        return self.fotogramas / fps
+
+    def posicion_video(self, hora, fps):
+        """Segundo del archivo que corresponde a una hora de captura (interpolación lineal)."""
+        if self.fin <= self.inicio:
+            return 0.0
+        fraccion = min(1.0, max(0.0, (hora - self.inicio) / (self.fin - self.inicio)))
+        return fraccion * self.duracion_video(fps)
+
+
+class GrabadorSegmentos(threading.Thread):
+    """Grabación continua (DVR) en segmentos de duración fija.
+
+    Consume todos los fotogramas de su cola y los escribe sin anotaciones en
+    segmentos de SEGUNDOS_SEGMENTO. Al cerrar cada segmento aplica la cuota
+    MAX_MB_SEGMENTOS borrando primero los más viejos. Los clips de evento se
+    arman concatenando y recortando segmentos ya escritos con ffmpeg en modo
+    copia, sin volver a codificar; sin ffmpeg se recurre a OpenCV.
+    """
+
+    def __init__(self, cola, codec, dimensiones, fps=None, directorio=None):
+        super().__init__(name="dvr", daemon=True)
+        self.cola = cola
+        self.codec_str, self.extension = codec
+        self.dimensiones = dimensiones
+        self.fps = fps or config.FPS_ESPERADO
+        self.directorio = directorio or config.DIRECTORIO_SEGMENTOS
+        os.makedirs(self.directorio, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segmentos = []        # Segmentos cerrados, del más viejo al más nuevo
+        self._en_uso = {}           # ruta -> cantidad de clips que la están leyendo
+        self._pedidos = []          # Clips que esperan a que se cierre el segmento con su final
+        self._video_out = None
+        self._actual = None         # [ruta, inicio, ultimo, fotogramas] del segmento abierto
+        self.clips_armados = 0
+
+        self._recuperar()
+
+    # --- API ---
+
+    def armar_clip(self, desde, hasta, ruta_sin_extension, al_cerrar, miniatura=None):
+        """Pide un clip con lo capturado entre `desde` y `hasta` (epoch).
+
+        Se arma en segundo plano cuando el segmento que contiene `hasta` ya
+        está cerrado, y después se llama a al_cerrar(ruta, exito). `miniatura`
+        es un par opcional (ruta, imagen) que se escribe antes del callback.
+        """
+        pedido = (desde, hasta, ruta_sin_extension + self.extension, al_cerrar, miniatura)
+        with self._lock:
+            self._pedidos.append(pedido)
+        self._atender_pedidos(forzar=False)
+
+    def detener(self):
+        """Cierra el segmento en curso y arma los clips pendientes con lo que haya."""
+        self.cola.cerrar()
+        self.join()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "segmentos": len(self._segmentos),
+                "mb_usados": sum(s.bytes for s in self._segmentos) / (1024 * 1024),
+                "segundos_cubiertos": sum(s.fin - s.inicio for s in self._segmentos),
+                "clips_armados": self.clips_armados,
+            }
+
+    # --- Hilo de escritura ---
+
+    def run(self):
+        try:
+            while True:
+                fotograma = self.cola.obtener()
+                if fotograma is None:
+                    break
+                hora = hora_de_captura(fotograma.timestamp)
+                if self._actual is None or hora - self._actual[1] >= config.SEGUNDOS_SEGMENTO:
+                    self._rotar(hora)
+                if self._video_out is not None:
+                    inicio = time.perf_counter()
+                    self._video_out.write(fotograma.imagen)
+                    metricas.observar("codificacion_segmentos", time.perf_counter() - inicio)
+                    self._actual[2] = hora
+                    self._actual[3] += 1
+        except Exception as e:
+            print(f"Error inesperado en la grabación continua: {e}")
+        finally:
+            self.cola.cerrar()
+            self._cerrar_segmento()
+            self._atender_pedidos(forzar=True)
+
+    def _rotar(self, hora):
+        self._cerrar_segmento()
+        ruta = os.path.join(self.directorio, f"seg_{int(hora * 1000)}_abierto{self.extension}")
+        self._video_out = cv2.VideoWriter(ruta, cv2.VideoWriter.fourcc(*self.codec_str), self.fps, self.dimensiones)
+        if not self._video_out.isOpened():
+            print(f"ERROR: No se pudo abrir el segmento '{ruta}'.")
+            self._video_out = None
+        self._actual = [ruta, hora, hora, 0]
+
+    def _cerrar_segmento(self):
+        if self._actual is None:
+            return
+        ruta, inicio, fin, fotogramas = self._actual
+        self._actual = None
+        if self._video_out is not None:
+            self._video_out.release()
+            self._video_out = None
+        if not fotogramas:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            return
+
+        ruta_final = os.path.join(
+            self.directorio, f"seg_{int(inicio * 1000)}_{int(fin * 1000)}_{fotogramas}{self.extension}"
+        )
+        os.replace(ruta, ruta_final)
+        with self._lock:
+            self._segmentos.append(Segmento(ruta_final, inicio, fin, fotogramas))
+        self._aplicar_cuota()
+        self._atender_pedidos(forzar=False)
+
+    def _recuperar(self):
+        """Retoma los segmentos de ejecuciones anteriores; los que quedaron abiertos se descartan."""
+        for nombre in sorted(os.listdir(self.directorio)):
+            ruta = os.path.join(self.directorio, nombre)
+            coincidencia = _PATRON_SEGMENTO.match(nombre)
+            if coincidencia:
+                inicio_ms, fin_ms, fotogramas, _ = coincidencia.groups()
+                self._segmentos.append(Segmento(ruta, int(inicio_ms) / 1000, int(fin_ms) / 1000, int(fotogramas)))
+            elif nombre.startswith("seg_"):
+                os.remove(ruta)
+        self._segmentos.sort(key=lambda s: s.inicio)
+        self._aplicar_cuota()
+
+    def _aplicar_cuota(self):
+        """Borra los segmentos más viejos hasta entrar en la cuota, salvo los que
+        están siendo leídos o los que necesita un clip pedido y aún no armado."""
+        limite = config.MAX_MB_SEGMENTOS * 1024 * 1024
+        with self._lock:
+            usados = sum(s.bytes for s in self._segmentos)
+            reservado_desde = min((p[0] for p in self._pedidos), default=None)
+            for segmento in list(self._segmentos):
+                if usados <= limite:
+                    break
+                if self._en_uso.get(segmento.ruta) or (reservado_desde is not None and segmento.fin >= reservado_desde):
+                    continue
+                os.remove(segmento.ruta)
+                self._segmentos.remove(segmento)
+                usados -= segmento.bytes
+
+    # --- Armado de clips ---
+
+    def _atender_pedidos(self, forzar):
+        """Lanza los pedidos cuyo final ya está en un segmento cerrado (o todos si `forzar`)."""
+        with self._lock:
+            cerrado_hasta = self._segmentos[-1].fin if self._segmentos else None
+            listos = [p for p in self._pedidos
+                      if forzar or (cerrado_hasta is not None and p[1] <= cerrado_hasta)]
+            for pedido in listos:
+                self._pedidos.remove(pedido)
+            lanzados = []
+            for desde, hasta, ruta, al_cerrar, miniatura in listos:
+                segmentos = [s for s in self._segmentos if s.fin >= desde and s.inicio <= hasta]
+                for s in segmentos:
+                    self._en_uso[s.ruta] = self._en_uso.get(s.ruta, 0) + 1
+                lanzados.append((segmentos, desde, hasta, ruta, al_cerrar, miniatura))
+
+        for argumentos in lanzados:
+            hilo = threading.Thread(target=self._armar, args=argumentos, name="dvr_clip", daemon=not forzar)
+            hilo.start()
+            if forzar:
+                hilo.join()  # Al detener, los clips pendientes se terminan antes de salir
+
+    def _armar(self, segmentos, desde, hasta, ruta, al_cerrar, miniatura):
+        inicio = time.perf_counter()
+        try:
+            if miniatura is not None:
+                cv2.imwrite(*miniatura)
+            if not segmentos:
+                print(f"ERROR: No hay segmentos grabados para '{ruta}'.")
+                exito = False
+            elif shutil.which("ffmpeg"):
+                exito = self._armar_ffmpeg(segmentos, desde, hasta, ruta)
+            else:
+                exito = self._armar_opencv(segmentos, desde, hasta, ruta)
+        except Exception as e:
+            print(f"Error al armar el clip '{ruta}': {e}")
+            exito = False
+        finally:
+            with self._lock:
+                for s in segmentos:
+                    self._en_uso[s.ruta] -= 1
+                    if not self._en_uso[s.ruta]:
+                        del self._en_uso[s.ruta]
+
+        if exito:
+            with self._lock:
+                self.clips_armados += 1
+            print(
+                f"Clip '{ruta}' armado desde {len(segmentos)} segmento(s) en "
+                f"{(time.perf_counter() - inicio) * 1000:.0f} ms."
+            )
+        al_cerrar(ruta, exito)
+
+    def _armar_ffmpeg(self, segmentos, desde, hasta, ruta):
+        """Concatena en modo copia y recorta; el corte cae en el keyframe anterior a `desde`."""
+        desplazamiento = segmentos[0].posicion_video(desde, self.fps)
+        duracion = sum(s.duracion_video(self.fps) for s in segmentos[:-1]) \
+            + segmentos[-1].posicion_video(hasta, self.fps) - desplazamiento
+
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as lista:
+            for s in segmentos:
+                lista.write(f"file '{os.path.abspath(s.ruta)}'\n")
+        try:
+            comando = [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-ss", f"{desplazamiento:.3f}", "-f", "concat", "-safe", "0", "-i", lista.name,
+                "-t", f"{max(duracion, 1.0 / self.fps):.3f}", "-c", "copy", "-an",
+            ]
+            if self.extension == ".mp4":
+                comando += ["-movflags", "+faststart"]
+            resultado = subprocess.run(comando + [ruta], capture_output=True, text=True)
+        finally:
+            os.remove(lista.name)
+        if resultado.returncode != 0:
+            print(f"ffmpeg: {resultado.stderr.strip()}")
+            return False
+        return os.path.exists(ruta)
+
+    def _armar_opencv(self, segmentos, desde, hasta, ruta):
+        """Sin ffmpeg no se puede copiar el flujo: se re-escriben los fotogramas del rango."""
+        video_out = cv2.VideoWriter(ruta, cv2.VideoWriter.fourcc(*self.codec_str), self.fps, self.dimensiones)
+        if not video_out.isOpened():
+            return False
+        try:
+            for s in segmentos:
+                cap = cv2.VideoCapture(s.ruta)
+                try:
+                    for i in range(s.fotogramas):
+                        ret, imagen = cap.read()
+                        if not ret:
+                            break
+                        hora = s.inicio + (s.fin - s.inicio) * i / max(1, s.fotogramas - 1)
+                        if desde <= hora <= hasta:
+                            video_out.write(imagen)
+                finally:
+                    cap.release()
+        finally:
+            video_out.release()
+        return True
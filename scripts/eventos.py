@@ -0,0 +1,349 @@
+"""Registro de eventos de detección en SQLite y consultas para revisar incidentes.
+
+Uso desde la línea de comandos:
+
+    python -m scripts.eventos consultar --desde 2026-10-01 --hasta "2026-10-02 08:00" --categoria person --score-min 0.8
+    python -m scripts.eventos detalle alerta_1792282742
+    python -m scripts.eventos resumen --desde 2026-09-01
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+from scripts import config
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT NOT NULL UNIQUE,
+    inicio REAL NOT NULL,
+    fin REAL,
+    clip TEXT,
+    detecciones INTEGER NOT NULL DEFAULT 0,
+    score_max REAL
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_inicio ON eventos(inicio);
+
+-- Resumen por evento y categoría: responde las consultas por categoría sin recorrer todas las detecciones
+CREATE TABLE IF NOT EXISTS evento_categorias (
+    evento_id INTEGER NOT NULL REFERENCES eventos(id) ON DELETE CASCADE,
+    categoria TEXT NOT NULL,
+    inicio REAL NOT NULL,
+    score_max REAL NOT NULL,
+    detecciones INTEGER NOT NULL,
+    PRIMARY KEY (evento_id, categoria)
+);
+CREATE INDEX IF NOT EXISTS idx_categorias_busqueda ON evento_categorias(categoria, inicio, score_max);
+
+-- Una fila por detección de cada fotograma inferido durante la grabación
+CREATE TABLE IF NOT EXISTS detecciones (
+    evento_id INTEGER NOT NULL REFERENCES eventos(id) ON DELETE CASCADE,
+    frame INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    categoria TEXT NOT NULL,
+    score REAL NOT NULL,
+    x INTEGER, y INTEGER, ancho INTEGER, alto INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_detecciones_evento ON detecciones(evento_id, frame);
+CREATE INDEX IF NOT EXISTS idx_detecciones_categoria ON detecciones(categoria, timestamp, score);
+
+CREATE TABLE IF NOT EXISTS entregas_evento (
+    evento_id INTEGER NOT NULL REFERENCES eventos(id) ON DELETE CASCADE,
+    servicio TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (evento_id, servicio)
+);
+"""
+
+
+def _conectar(ruta):
+    db = sqlite3.connect(ruta, check_same_thread=False)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(_ESQUEMA)
+    return db
+
+
+def _conectar_lectura(ruta):
+    """Conexión de solo lectura para las consultas: no crea el esquema ni cambia
+    el modo del journal, así que no compite por el lock con el registro en curso."""
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(ruta))}?mode=ro", uri=True)
+
+
+def clave_de_clip(ruta_video):
+    """Clave del evento a partir del nombre del clip ('alerta_<ts>')."""
+    return os.path.splitext(os.path.basename(ruta_video))[0]
+
+
+class RegistroEventos:
+    """Escribe los eventos en SQLite desde un hilo propio.
+
+    Las otras etapas solo encolan operaciones; el hilo las agrupa en lotes
+    (hasta LOTE_EVENTOS operaciones o INTERVALO_LOTE_EVENTOS segundos) y las
+    confirma en una sola transacción, así que el bucle principal nunca
+    espera al disco.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or config.RUTA_EVENTOS_DB
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name="registro_eventos", daemon=True)
+        self.escritas = 0
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        """Escribe lo pendiente y termina el hilo."""
+        self._cola.put(None)
+        self._hilo.join()
+
+    # --- API (no bloquea) ---
+
+    def evento_iniciado(self, clave, inicio):
+        self._cola.put(("iniciado", clave, inicio))
+
+    def evento_cerrado(self, clave, fin, clip, entradas):
+        """Registra el cierre del clip con sus detecciones (EntradaIndice)."""
+        self._cola.put(("cerrado", clave, fin, clip, list(entradas)))
+
+    def clip_movido(self, clave, ruta):
+        """Actualiza la ruta del clip (p. ej. al pasar a la bandeja de salida)."""
+        self._cola.put(("clip", clave, ruta))
+
+    def entrega_actualizada(self, clave, servicio, estado, intentos=0):
+        """Estado de entrega por servicio: 'pendiente', 'entregado', 'reintentando' o 'descartado'."""
+        self._cola.put(("entrega", clave, servicio, estado, intentos, time.time()))
+
+    # --- Hilo escritor ---
+
+    def _bucle(self):
+        db = _conectar(self.ruta)
+        try:
+            terminar = False
+            while not terminar:
+                lote = [self._cola.get()]
+                limite = time.monotonic() + config.INTERVALO_LOTE_EVENTOS
+                while len(lote) < config.LOTE_EVENTOS:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        lote.append(self._cola.get(timeout=restante))
+                    except queue.Empty:
+                        break
+
+                if None in lote:
+                    terminar = True
+                    lote = [op for op in lote if op is not None]
+                    # Lo que haya quedado detrás de la marca de fin también se escribe
+                    while not self._cola.empty():
+                        op = self._cola.get_nowait()
+                        if op is not None:
+                            lote.append(op)
+                try:
+                    with db:
+                        for op in lote:
+                            self._aplicar(db, op)
+                    self.escritas += len(lote)
+                except sqlite3.Error as e:
+                    print(f"Error al escribir {len(lote)} operación(es) en el registro de eventos: {e}")
+        finally:
+            db.close()
+
+    def _aplicar(self, db, op):
+        tipo = op[0]
+        if tipo == "iniciado":
+            _, clave, inicio = op
+            db.execute("INSERT OR IGNORE INTO eventos (clave, inicio) VALUES (?, ?)", (clave, inicio))
+            return
+
+        evento_id = self._id_evento(db, op[1])
+        if evento_id is None:
+            print(f"Registro de eventos: evento desconocido '{op[1]}'.")
+            return
+
+        if tipo == "cerrado":
+            _, clave, fin, clip, entradas = op
+            score_max = max((e.score for e in entradas), default=None)
+            db.execute(
+                "UPDATE eventos SET fin = ?, clip = ?, detecciones = ?, score_max = ? WHERE id = ?",
+                (fin, clip, len(entradas), score_max, evento_id)
+            )
+            db.executemany(
+                "INSERT INTO detecciones (evento_id, frame, timestamp, categoria, score, x, y, ancho, alto) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(evento_id, e.frame, e.timestamp, e.categoria, e.score, *e.caja) for e in entradas]
+            )
+            inicio = db.execute("SELECT inicio FROM eventos WHERE id = ?", (evento_id,)).fetchone()[0]
+            resumen = {}
+            for e in entradas:
+                score, cantidad = resumen.get(e.categoria, (0.0, 0))
+                resumen[e.categoria] = (max(score, e.score), cantidad + 1)
+            db.executemany(
+                "INSERT OR REPLACE INTO evento_categorias (evento_id, categoria, inicio, score_max, detecciones) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(evento_id, categoria, inicio, score, cantidad) for categoria, (score, cantidad) in resumen.items()]
+            )
+        elif tipo == "clip":
+            db.execute("UPDATE eventos SET clip = ? WHERE id = ?", (op[2], evento_id))
+        elif tipo == "entrega":
+            _, clave, servicio, estado, intentos, actualizado = op
+            db.execute(
+                "INSERT OR REPLACE INTO entregas_evento (evento_id, servicio, estado, intentos, actualizado) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (evento_id, servicio, estado, intentos, actualizado)
+            )
+
+    @staticmethod
+    def _id_evento(db, clave):
+        fila = db.execute("SELECT id FROM eventos WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+
+# --- Consultas ---
+
+def consultar_eventos(desde=None, hasta=None, categoria=None, score_min=None, limite=100, ruta=None):
+    """Eventos que empezaron entre `desde` y `hasta` (epoch), opcionalmente con
+    al menos una detección de `categoria` con score mayor a `score_min`.
+
+    Retorna una lista de dicts ordenada del más reciente al más antiguo.
+    """
+    db = _conectar_lectura(ruta or config.RUTA_EVENTOS_DB)
+    try:
+        desde = desde if desde is not None else 0
+        hasta = hasta if hasta is not None else time.time()
+        if categoria is not None:
+            # Usa idx_categorias_busqueda: (categoria, inicio, score_max)
+            sql = (
+                "SELECT e.id, e.clave, e.inicio, e.fin, e.clip, e.detecciones, c.score_max "
+                "FROM evento_categorias c JOIN eventos e ON e.id = c.evento_id "
+                "WHERE c.categoria = ? AND c.inicio BETWEEN ? AND ? AND c.score_max > ? "
+                "ORDER BY c.inicio DESC LIMIT ?"
+            )
+            parametros = (categoria, desde, hasta, score_min if score_min is not None else -1.0, limite)
+        else:
+            sql = (
+                "SELECT id, clave, inicio, fin, clip, detecciones, score_max FROM eventos "
+                "WHERE inicio BETWEEN ? AND ? AND COALESCE(score_max, 0) > ? "
+                "ORDER BY inicio DESC LIMIT ?"
+            )
+            parametros = (desde, hasta, score_min if score_min is not None else -1.0, limite)
+
+        eventos = []
+        for evento_id, clave, inicio, fin, clip, detecciones, score_max in db.execute(sql, parametros).fetchall():
+            categorias = [fila[0] for fila in db.execute(
+                "SELECT categoria FROM evento_categorias WHERE evento_id = ? ORDER BY detecciones DESC", (evento_id,)
+            )]
+            entregas = dict(db.execute(
+                "SELECT servicio, estado FROM entregas_evento WHERE evento_id = ?", (evento_id,)
+            ).fetchall())
+            eventos.append({
+                "clave": clave, "inicio": inicio, "fin": fin, "clip": clip,
+                "detecciones": detecciones, "score_max": score_max,
+                "categorias": categorias, "entregas": entregas,
+            })
+        return eventos
+    finally:
+        db.close()
+
+
+def detalle_evento(clave, ruta=None):
+    """Detecciones fotograma a fotograma de un evento."""
+    db = _conectar_lectura(ruta or config.RUTA_EVENTOS_DB)
+    try:
+        return [
+            {"frame": frame, "timestamp": ts, "categoria": categoria, "score": score, "caja": (x, y, ancho, alto)}
+            for frame, ts, categoria, score, x, y, ancho, alto in db.execute(
+                "SELECT d.frame, d.timestamp, d.categoria, d.score, d.x, d.y, d.ancho, d.alto "
+                "FROM detecciones d JOIN eventos e ON e.id = d.evento_id WHERE e.clave = ? ORDER BY d.frame",
+                (clave,)
+            )
+        ]
+    finally:
+        db.close()
+
+
+def resumen_categorias(desde=None, hasta=None, ruta=None):
+    """Cantidad de eventos y score máximo por categoría en el rango."""
+    db = _conectar_lectura(ruta or config.RUTA_EVENTOS_DB)
+    try:
+        return db.execute(
+            "SELECT categoria, COUNT(*), MAX(score_max) FROM evento_categorias "
+            "WHERE inicio BETWEEN ? AND ? GROUP BY categoria ORDER BY COUNT(*) DESC",
+            (desde if desde is not None else 0, hasta if hasta is not None else time.time())
+        ).fetchall()
+    finally:
+        db.close()
+
+
+# --- Línea de comandos ---
+
+def _fecha(texto):
+    """Acepta epoch o fechas ISO ('2026-10-01', '2026-10-01 08:30')."""
+    try:
+        return float(texto)
+    except ValueError:
+        return datetime.fromisoformat(texto).timestamp()
+
+
+def _formatear(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%d-%m-%y %H:%M:%S') if timestamp else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sobre el registro de eventos de detección.")
+    parser.add_argument("--db", help=f"Base de eventos (por defecto {config.RUTA_EVENTOS_DB})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_consultar = sub.add_parser("consultar", help="Listar eventos")
+    p_consultar.add_argument("--desde", type=_fecha)
+    p_consultar.add_argument("--hasta", type=_fecha)
+    p_consultar.add_argument("--categoria")
+    p_consultar.add_argument("--score-min", type=float)
+    p_consultar.add_argument("--limite", type=int, default=100)
+
+    p_detalle = sub.add_parser("detalle", help="Detecciones de un evento")
+    p_detalle.add_argument("clave")
+
+    p_resumen = sub.add_parser("resumen", help="Eventos por categoría")
+    p_resumen.add_argument("--desde", type=_fecha)
+    p_resumen.add_argument("--hasta", type=_fecha)
+
+    args = parser.parse_args()
+
+    ruta = args.db or config.RUTA_EVENTOS_DB
+    if not os.path.exists(ruta):
+        print(f"No existe la base de eventos '{ruta}'.")
+        return 1
+    if args.comando == "consultar":
+        eventos = consultar_eventos(args.desde, args.hasta, args.categoria, args.score_min, args.limite, ruta=args.db)
+        for e in eventos:
+            entregas = ", ".join(f"{s}: {estado}" for s, estado in e["entregas"].items()) or "sin envíos"
+            print(
+                f"{e['clave']}  {_formatear(e['inicio'])} -> {_formatear(e['fin'])}  "
+                f"score {e['score_max'] or 0:.2f}  {e['detecciones']} det.  "
+                f"[{', '.join(e['categorias'])}]  ({entregas})"
+            )
+        print(f"{len(eventos)} evento(s).")
+    elif args.comando == "detalle":
+        for d in detalle_evento(args.clave, ruta=args.db):
+            print(f"frame {d['frame']:>5}  {_formatear(d['timestamp'])}  {d['categoria']:<15} {d['score']:.2f}  {d['caja']}")
+    elif args.comando == "resumen":
+        for categoria, cantidad, score_max in resumen_categorias(args.desde, args.hasta, ruta=args.db):
+            print(f"{categoria:<20} {cantidad:>8} evento(s)  score máx. {score_max:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
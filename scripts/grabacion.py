@@ -0,0 +1,306 @@
+import os
+import threading
+import time
+
+from scripts import config
+from scripts import metricas
+from scripts.buffer_preroll import BufferPreroll
+from scripts.indice_frames import IndiceFrames
+from scripts.pipeline import dibujar_detecciones, hora_de_captura
+from scripts.resumen_clip import ResumenClip, rutas_artefactos
+
+
+class EtapaGrabacion(threading.Thread):
+    """Etapa de grabación: mantiene el pre-roll y la máquina de estados
+    IDLE/POSTROLL del clip en curso.
+
+    Consume todos los fotogramas de su cola, así que la grabación no depende
+    de la velocidad de la inferencia. La etapa de detección le avisa de cada
+    resultado mediante registrar_deteccion(). La escritura a disco la hace
+    el CodificadorClips en su propio hilo. Si se pasa un RegistroEventos,
+    cada clip queda registrado con sus detecciones.
+
+    Con un GrabadorSegmentos (`dvr`) no se mantiene pre-roll ni se codifica
+    nada aquí: al terminar el post-roll se le pide el clip del intervalo
+    del evento, que se arma recortando los segmentos continuos.
+
+    Con ZonasInteres el cooldown es por zona en lugar de global.
+
+    Con RESUMEN_CLIPS cada fotograma del clip alimenta además un ResumenClip
+    (hoja de contacto y animación corta), listo junto con el clip.
+
+    Con EXTENDER_EVENTOS el post-roll es un mínimo: el clip sigue mientras
+    haya detecciones y termina SEGUNDOS_COLA_EVENTO después de la última, o
+    al llegar a SEGUNDOS_MAX_CLIP. En ese caso, si el objeto sigue ahí, el
+    evento continúa en un clip nuevo sin esperar el cooldown.
+    """
+
+    def __init__(self, cola, dimensiones, codificador, al_terminar_clip, registro_eventos=None, dvr=None, zonas=None,
+                 prefijo=""):
+        # `prefijo` distingue los archivos de cada cámara (thumb_<prefijo><ts>.jpg, alerta_<prefijo><ts>...)
+        super().__init__(name=f"{prefijo}grabacion", daemon=True)
+        self.cola = cola
+        self.dimensiones = dimensiones
+        self.codificador = codificador
+        self.al_terminar_clip = al_terminar_clip
+        self.registro_eventos = registro_eventos
+        self.dvr = dvr
+        self.zonas = zonas
+        self.prefijo = prefijo
+        self._etiqueta = f"[{prefijo.rstrip('_')}] " if prefijo else ""
+
+        self.buffer_preroll = BufferPreroll(
+            config.TAMAÑO_BUFFER, dimensiones,
+            comprimido=config.PREROLL_COMPRIMIDO, calidad_jpeg=config.CALIDAD_JPEG_PREROLL
+        )
+        self.estado_grabacion = "IDLE"
+        self.frames_grabados_post = 0
+        self.frames_sin_deteccion = 0
+        self.frames_clip = 0
+        self.frames_perdidos_clip = 0  # Fotogramas que la cola de grabación descartó mientras se grababa
+        self._ultimo_numero = None
+        self.ultima_alerta_tiempo = None
+        self._ultimo_segundo = 0
+        # En una reproducción los nombres y los instantes de los eventos salen del reloj del video:
+        # dos corridas producen los mismos archivos y las filas coinciden con sus clips
+        self.nombres_por_timestamp = False
+        self._detenida = False
+        self.indice = None
+        self._nombre_thumb = None
+        self._thumb_respaldo = None
+        self._clave_evento = None
+        self._al_cerrar = None
+        self._cierre = None
+        self._inicio_evento = None
+        self._resumen = None
+
+        # Resultados publicados por la etapa de detección
+        self._lock = threading.Lock()
+        self._ultimas_detecciones = []
+        self._resultados_pendientes = []
+
+    def registrar_deteccion(self, fotograma, detecciones, disparadoras=None):
+        """Publica las detecciones (lista de Deteccion) de un fotograma inferido.
+
+        `disparadoras` son las que pueden iniciar una alerta (con seguimiento,
+        las pistas recién nacidas); por defecto, todas.
+        """
+        disparadoras = detecciones if disparadoras is None else disparadoras
+        with self._lock:
+            self._ultimas_detecciones = list(detecciones)
+            if detecciones:
+                self._resultados_pendientes.append((fotograma, self._ultimas_detecciones, list(disparadoras)))
+
+    def actualizar_cajas(self, detecciones):
+        """Reemplaza las cajas que se dibujan en el clip (p. ej. pistas propagadas sin inferencia)."""
+        with self._lock:
+            self._ultimas_detecciones = list(detecciones)
+
+    def _tomar_deteccion(self):
+        with self._lock:
+            resultados = self._resultados_pendientes
+            self._resultados_pendientes = []
+            return resultados, self._ultimas_detecciones
+
+    def run(self):
+        try:
+            while True:
+                fotograma = self.cola.obtener()
+                if fotograma is None:
+                    break
+                self.procesar(fotograma)
+        except Exception as e:
+            print(f"\nError inesperado en la etapa de grabación: {e}")
+        finally:
+            # Si esta etapa termina antes que la captura, no debe quedar bloqueada esperándonos
+            self.cola.cerrar()
+            if self.estado_grabacion == "POSTROLL":
+                # El clip interrumpido se cierra pero no se envía
+                self._detenida = True
+                if self._resumen is not None:
+                    self._resumen.descartar()
+                if self.dvr is None:
+                    self.codificador.cerrar()
+
+    def procesar(self, fotograma):
+        """Avanza la etapa un fotograma. Lo llama el hilo de la etapa (o, en una
+        reproducción, el bucle que la maneja de forma sincrónica)."""
+        fotograma_proc_bgr = fotograma.imagen
+        if self.estado_grabacion == "POSTROLL" and self._ultimo_numero is not None:
+            # Con una política de descarte en la cola de grabación, un salto de numeración es un hueco en el clip
+            perdidos = fotograma.numero - self._ultimo_numero - 1
+            if perdidos > 0:
+                self.frames_perdidos_clip += perdidos
+                metricas.contar("fotogramas_perdidos_clip", perdidos)
+        self._ultimo_numero = fotograma.numero
+        resultados, detecciones = self._tomar_deteccion()
+        disparadoras = [d for _, _, disparadoras_fotograma in resultados for d in disparadoras_fotograma]
+        objeto_detectado = bool(disparadoras)
+
+        # Llenamos búfer si estamos inactivos (en modo continuo el pre-roll ya está en los segmentos)
+        if self.estado_grabacion == "IDLE" and self.dvr is None:
+            self.buffer_preroll.agregar(fotograma_proc_bgr)
+
+        # --- INICIAR GRABACIÓN ---
+        if objeto_detectado and \
+           self.estado_grabacion == "IDLE" and \
+           self._fuera_de_cooldown(disparadoras, fotograma.timestamp):
+            self._iniciar_grabacion(fotograma)
+
+        # --- CONTINUAR GRABACIÓN (POST-ROLL) ---
+        if self.estado_grabacion == "POSTROLL":
+            # Las detecciones se indexan mientras se graba: el mejor frame sale de aquí sin re-decodificar
+            for fotograma_inferido, detecciones_inferidas, _ in resultados:
+                self.indice.registrar(fotograma_inferido, detecciones_inferidas)
+            # Cualquier detección (no solo las que disparan) mantiene vivo el evento
+            self.frames_sin_deteccion = 0 if resultados else self.frames_sin_deteccion + 1
+
+            if self.dvr is None:
+                if detecciones:
+                    # El fotograma es compartido con la etapa de detección: dibujamos sobre una copia
+                    fotograma_proc_bgr = fotograma_proc_bgr.copy()
+                    dibujar_detecciones(fotograma_proc_bgr, detecciones)
+                self.codificador.escribir(fotograma_proc_bgr)
+            if self._resumen is not None:
+                self._resumen.agregar(fotograma_proc_bgr)
+            self.frames_grabados_post += 1
+            self.frames_clip += 1
+
+            if self.frames_grabados_post >= config.FRAMES_A_GRABAR_POST:
+                if not config.EXTENDER_EVENTOS:
+                    self._terminar_grabacion(fotograma)
+                elif self.frames_clip >= config.FPS_ESPERADO * config.SEGUNDOS_MAX_CLIP:
+                    self._terminar_grabacion(fotograma)
+                    if self.frames_sin_deteccion < config.FPS_ESPERADO * config.SEGUNDOS_COLA_EVENTO:
+                        self._iniciar_grabacion(fotograma, continuacion=True)
+                elif self.frames_sin_deteccion >= config.FPS_ESPERADO * config.SEGUNDOS_COLA_EVENTO:
+                    self._terminar_grabacion(fotograma)
+
+    def finalizar(self, fotograma):
+        """Cierra (y entrega) el clip en curso en `fotograma`, sin esperar al post-roll.
+
+        Para el final de una reproducción: al detener la etapa en vivo el clip
+        interrumpido se descarta.
+        """
+        if self.estado_grabacion == "POSTROLL":
+            self._terminar_grabacion(fotograma)
+
+    def _fuera_de_cooldown(self, disparadoras, timestamp):
+        if self.zonas is not None:
+            return self.zonas.disparar(disparadoras, timestamp)
+        return self.ultima_alerta_tiempo is None or timestamp - self.ultima_alerta_tiempo > config.COOLDOWN_SEGUNDOS
+
+    def _iniciar_grabacion(self, fotograma, continuacion=False):
+        """Abre un clip nuevo. Con `continuacion` sigue un evento que llegó a
+        SEGUNDOS_MAX_CLIP: sin pre-roll (ya está en el clip anterior)."""
+        if continuacion:
+            print(f"[{time.ctime()}] {self._etiqueta}El objeto sigue presente: el evento continúa en un clip nuevo...")
+            metricas.contar("clips_continuacion")
+        else:
+            print(f"[{time.ctime()}] {self._etiqueta}¡OBJETO DETECTADO! Iniciando grabación...")
+            metricas.contar("alertas_disparadas")
+        self.estado_grabacion = "POSTROLL"
+        self.frames_grabados_post = 0
+        self.frames_sin_deteccion = 0
+        self.ultima_alerta_tiempo = fotograma.timestamp
+
+        # Los nombres van por segundo: una continuación puede empezar en el mismo segundo que su clip anterior
+        segundo = int(self._reloj(fotograma))
+        self._ultimo_segundo = max(segundo, self._ultimo_segundo + 1)
+        timestamp_str = f"{self.prefijo}{self._ultimo_segundo}"
+        nombre_thumb = f"thumb_{timestamp_str}.jpg"
+        self._nombre_thumb = nombre_thumb
+
+        # La miniatura se escribe al cerrar el clip con el mejor frame del índice;
+        # el primer fotograma del pre-roll queda como respaldo si no hubo detecciones indexadas
+        primer_fotograma = self.buffer_preroll.primero()
+        self._thumb_respaldo = primer_fotograma if primer_fotograma is not None else fotograma.imagen
+        if continuacion:
+            fotogramas_preroll = 0
+            self.indice = IndiceFrames(fotograma.numero)
+        else:
+            fotogramas_preroll = len(self.buffer_preroll) if self.dvr is None else config.TAMAÑO_BUFFER
+            self.indice = IndiceFrames(fotograma.numero - fotogramas_preroll + 1)
+        self.frames_clip = fotogramas_preroll
+        self.frames_perdidos_clip = 0
+        indice = self.indice
+        clave_evento = f"alerta_{timestamp_str}"
+        if self.registro_eventos is not None:
+            self.registro_eventos.evento_iniciado(clave_evento, self._reloj(fotograma))
+        cierre = {}  # _terminar_grabacion anota aquí el instante del último fotograma
+
+        def al_cerrar(nombre_video, exito):
+            """Se ejecuta en el hilo del codificador cuando el clip quedó escrito."""
+            if self._detenida:
+                return
+            if not exito:
+                print(f"ERROR: No se pudo grabar '{nombre_video}'. Alerta descartada.")
+                for ruta in [nombre_thumb] + rutas_artefactos(nombre_thumb):
+                    if os.path.exists(ruta):
+                        os.remove(ruta)
+                return
+            print(f"Video '{nombre_video}' guardado.")
+            if self.registro_eventos is not None:
+                self.registro_eventos.evento_cerrado(
+                    clave_evento, cierre["fin"], os.path.abspath(nombre_video), indice.entradas
+                )
+            self.al_terminar_clip((nombre_video, nombre_thumb))
+
+        self._clave_evento = clave_evento
+        self._al_cerrar = al_cerrar
+        self._cierre = cierre
+        self._resumen = ResumenClip(timestamp_str, self.dimensiones) if config.RESUMEN_CLIPS else None
+        if self.dvr is not None:
+            self._inicio_evento = hora_de_captura(fotograma.timestamp) - (0 if continuacion else config.SEGUNDOS_PRE_ROLL)
+            return
+
+        # La extensión depende del códec elegido al arrancar (MP4 compatible con Telegram y Discord)
+        self.codificador.abrir(clave_evento, al_cerrar)
+
+        if not continuacion:
+            print(f"Volcando {len(self.buffer_preroll)} fotogramas de pre-roll...")
+        for frame in self.buffer_preroll.iterar():
+            # Las ranuras del búfer se reutilizan: el codificador necesita su propia copia
+            self.codificador.escribir(frame if self.buffer_preroll.comprimido else frame.copy())
+            if self._resumen is not None:
+                self._resumen.agregar(frame)
+
+        self.buffer_preroll.limpiar()
+
+    def _reloj(self, fotograma):
+        """Instante (epoch) de un fotograma para nombrar clips y registrar eventos."""
+        return fotograma.timestamp if self.nombres_por_timestamp else time.time()
+
+    def _terminar_grabacion(self, fotograma):
+        self._cierre["fin"] = self._reloj(fotograma)
+        print(
+            f"Grabación terminada: {self.frames_clip} fotogramas en el clip "
+            f"({self.frames_grabados_post} después de la detección)."
+            + (f" La cola de grabación descartó {self.frames_perdidos_clip}." if self.frames_perdidos_clip else "")
+        )
+
+        mejor = self.indice.mejor()
+        if mejor is not None:
+            print(
+                f"Mejor frame: posición {mejor.frame} del clip (score {mejor.score:.2f}, "
+                f"{len(self.indice)} detecciones indexadas)"
+            )
+            miniatura = self.indice.mejor_imagen()
+        else:
+            miniatura = self._thumb_respaldo
+        self._thumb_respaldo = None
+        if self._resumen is not None:
+            # La hoja y la animación quedan escritas antes de que el clip llegue a la bandeja
+            self._resumen.cerrar()
+            self._resumen = None
+
+        if self.dvr is not None:
+            self.dvr.armar_clip(
+                self._inicio_evento, hora_de_captura(fotograma.timestamp), self._clave_evento,
+                self._al_cerrar, miniatura=(self._nombre_thumb, miniatura)
+            )
+        else:
+            self.codificador.guardar_imagen(self._nombre_thumb, miniatura)
+            self.codificador.cerrar()
+        self._al_cerrar = None
+        self.estado_grabacion = "IDLE"
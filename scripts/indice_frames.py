@@ -0,0 +1,66 @@
+from collections import namedtuple
+
+from scripts.pipeline import hora_de_captura
+
+# Una entrada por detección registrada durante la grabación de un clip.
+# `frame` es la posición dentro del clip (0 = primer fotograma del pre-roll) y
+# `timestamp` la hora de captura en segundos epoch.
+EntradaIndice = namedtuple(
+    "EntradaIndice",
+    ["frame", "timestamp", "caja", "categoria", "score", "area", "centralidad", "puntaje"]
+)
+
+
+class IndiceFrames:
+    """Índice por clip de las detecciones vistas mientras se grababa.
+
+    Guarda, para cada detección, su posición en el clip, la caja, la
+    confianza, el área y qué tan centrada está, y retiene el fotograma con
+    mejor puntaje (área * confianza * centralidad, el mismo criterio que
+    antes se calculaba re-decodificando el video). Así elegir el mejor
+    frame es una búsqueda y un único JPEG compartido por todos los servicios.
+    """
+
+    def __init__(self, primer_numero):
+        self.primer_numero = primer_numero  # Número de captura del primer fotograma del clip
+        self.entradas = []
+        self._mejor = None
+        self._mejor_imagen = None
+
+    def registrar(self, fotograma, detecciones):
+        """Agrega las detecciones de un fotograma inferido.
+
+        Los fotogramas de la captura no se modifican después de creados, así
+        que se retiene la referencia sin copiar.
+        """
+        altura_frame, ancho_frame = fotograma.imagen.shape[:2]
+        # El timestamp de captura es monotónico: se lo lleva a hora de reloj para poder consultarlo después
+        timestamp = hora_de_captura(fotograma.timestamp)
+        for deteccion in detecciones:
+            area = deteccion.ancho * deteccion.alto
+            centro_x = deteccion.x + deteccion.ancho / 2
+            centro_y = deteccion.y + deteccion.alto / 2
+            distancia_centro = abs(centro_x - ancho_frame / 2) + abs(centro_y - altura_frame / 2)
+            centralidad = 1.0 / (1.0 + distancia_centro / 100.0)  # Penalizar si está lejos del centro
+
+            entrada = EntradaIndice(
+                fotograma.numero - self.primer_numero, timestamp,
+                (deteccion.x, deteccion.y, deteccion.ancho, deteccion.alto),
+                deteccion.categoria, deteccion.score, area, centralidad,
+                area * deteccion.score * centralidad
+            )
+            self.entradas.append(entrada)
+            if self._mejor is None or entrada.puntaje > self._mejor.puntaje:
+                self._mejor = entrada
+                self._mejor_imagen = fotograma.imagen
+
+    def mejor(self):
+        """Entrada con mejor puntaje, o None si no hubo detecciones."""
+        return self._mejor
+
+    def mejor_imagen(self):
+        """Fotograma (BGR) de la mejor entrada, o None si no hubo detecciones."""
+        return self._mejor_imagen
+
+    def __len__(self):
+        return len(self.entradas)
@@ -0,0 +1,512 @@
+"""Inferencia en un servidor central para nodos de captura livianos.
+
+Un nodo (main.py con SERVIDOR_INFERENCIA configurado) captura, filtra por
+movimiento, mantiene el pre-roll y graba como siempre, pero su detector es
+un DetectorRemoto: cada fotograma candidato viaja como JPEG al servidor, que
+corre el detector real para todos los nodos y devuelve las detecciones.
+
+Protocolo (TCP, little-endian): cada mensaje es un encabezado de 5 bytes
+(largo del cuerpo, tipo) seguido del cuerpo.
+
+    HOLA       nodo -> servidor   umbral mínimo del nodo y su nombre (UTF-8)
+    LISTO      servidor -> nodo   umbral con que infiere el servidor
+    PEDIDO     nodo -> servidor   secuencia, timestamp_ms y el JPEG
+    RESPUESTA  servidor -> nodo   detecciones, como en detector_proceso
+    OCUPADO    servidor -> nodo   secuencia y milisegundos sugeridos antes de volver a pedir
+
+El servidor descarta antes de responder lo que esté por debajo de su
+umbral, así que un nodo con zonas más permisivas nunca vería esas
+detecciones: en el saludo cada lado informa su umbral y ambos advierten si
+el del nodo es menor. Las categorías no hace falta cotejarlas: el servidor
+infiere todas y cada nodo filtra las suyas.
+
+Ejecutado como script levanta el servidor:
+
+    python -m scripts.inferencia_remota --puerto 9100 --detectores 2
+"""
+import argparse
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from scripts import config
+from scripts import metricas
+from scripts.detector_proceso import desempaquetar_detecciones, empaquetar_detecciones
+from scripts.pipeline import ColaFotogramas, POLITICA_DESCARTAR_NUEVO
+
+TIPO_HOLA = 1
+TIPO_LISTO = 2
+TIPO_PEDIDO = 3
+TIPO_RESPUESTA = 4
+TIPO_OCUPADO = 5
+
+_ENCABEZADO = struct.Struct("<IB")  # largo del cuerpo, tipo
+_HOLA = struct.Struct("<f")         # umbral mínimo del nodo (le sigue el nombre)
+_LISTO = struct.Struct("<f")        # umbral del servidor
+_PEDIDO = struct.Struct("<Iq")      # secuencia, timestamp_ms (le sigue el JPEG)
+_OCUPADO = struct.Struct("<IH")     # secuencia, milisegundos antes de reintentar
+_LARGO_MAXIMO = 16 * 1024 * 1024    # Un cuerpo más largo indica un flujo corrupto
+
+
+def enviar_mensaje(sock, tipo, cuerpo=b""):
+    sock.sendall(_ENCABEZADO.pack(len(cuerpo), tipo) + cuerpo)
+
+
+def _recibir_exacto(sock, largo):
+    datos = bytearray(largo)
+    vista = memoryview(datos)
+    recibidos = 0
+    while recibidos < largo:
+        n = sock.recv_into(vista[recibidos:])
+        if not n:
+            raise ConnectionError("conexión cerrada por el otro extremo")
+        recibidos += n
+    return bytes(datos)
+
+
+def recibir_mensaje(sock):
+    """Lee un mensaje completo. Retorna (tipo, cuerpo); ConnectionError si se corta."""
+    largo, tipo = _ENCABEZADO.unpack(_recibir_exacto(sock, _ENCABEZADO.size))
+    if largo > _LARGO_MAXIMO:
+        raise ConnectionError(f"mensaje de {largo} bytes, mayor que el máximo")
+    return tipo, _recibir_exacto(sock, largo) if largo else b""
+
+
+def separar_direccion(direccion):
+    """'host:puerto' -> (host, puerto); sin puerto usa PUERTO_SERVIDOR_INFERENCIA."""
+    host, _, puerto = direccion.rpartition(":")
+    if not host:
+        return puerto, config.PUERTO_SERVIDOR_INFERENCIA
+    return host, int(puerto)
+
+
+class DetectorRemoto:
+    """Misma interfaz que DetectorObjetos, con la inferencia en el servidor central.
+
+    detectar() es sincrónico: manda el JPEG y espera la respuesta hasta
+    TIMEOUT_INFERENCIA_REMOTA. Si la conexión se corta o no hay respuesta,
+    retorna [] y reconecta en el próximo pedido con backoff exponencial
+    (hasta RECONEXION_MAX_SEGUNDOS); mientras tanto no se intenta nada.
+    Si el servidor responde OCUPADO, el nodo deja de pedir durante el
+    tiempo que sugiere: así la contrapresión llega hasta el nodo en lugar
+    de acumular fotogramas viejos en la red.
+    """
+
+    def __init__(self, direccion, nombre=None, umbral=None, categorias=None):
+        self.direccion = separar_direccion(direccion)
+        self.nombre = nombre or config.NOMBRE_NODO or socket.gethostname()
+        self.umbral = umbral
+        self.categorias = set(categorias) if categorias else None
+        self.timeout = config.TIMEOUT_INFERENCIA_REMOTA
+
+        self._socket = None
+        self._secuencia = 0
+        self._pausa_hasta = 0.0
+        self._proximo_intento = 0.0
+        self._espera_reconexion = 1.0
+        self._conectado_antes = False
+
+        self.pedidos = 0
+        self.respondidos = 0
+        self.rechazados = 0  # OCUPADO
+        self.perdidos = 0    # Sin respuesta o conexión cortada
+        self.omitidos = 0    # No se pidieron: desconectado o en pausa
+        self.reconexiones = 0
+
+    def conectar(self):
+        """Intenta conectar ahora (respetando el backoff). Retorna True si quedó conectado."""
+        if self._socket is not None:
+            return True
+        ahora = time.monotonic()
+        if ahora < self._proximo_intento:
+            return False
+        sock = None
+        try:
+            sock = socket.create_connection(self.direccion, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            enviar_mensaje(sock, TIPO_HOLA, _HOLA.pack(self._umbral_minimo()) + self.nombre.encode("utf-8"))
+            tipo, cuerpo = recibir_mensaje(sock)
+            if tipo != TIPO_LISTO or len(cuerpo) < _LISTO.size:
+                raise ConnectionError(f"respuesta inesperada ({tipo}) al saludo")
+            umbral_servidor, = _LISTO.unpack(cuerpo)
+        except OSError as e:
+            if sock is not None:
+                sock.close()
+            print(
+                f"No se pudo conectar al servidor de inferencia {self.direccion[0]}:{self.direccion[1]} ({e}); "
+                f"reintento en {self._espera_reconexion:.0f} s."
+            )
+            self._proximo_intento = ahora + self._espera_reconexion
+            self._espera_reconexion = min(self._espera_reconexion * 2, config.RECONEXION_MAX_SEGUNDOS)
+            return False
+
+        if self._conectado_antes:
+            self.reconexiones += 1
+            metricas.contar("reconexiones_servidor_inferencia")
+            print(f"Reconectado al servidor de inferencia {self.direccion[0]}:{self.direccion[1]}.")
+        else:
+            print(f"Conectado al servidor de inferencia {self.direccion[0]}:{self.direccion[1]} como '{self.nombre}'.")
+        if self._umbral_minimo() < umbral_servidor - 1e-6:
+            print(
+                f"ADVERTENCIA: El servidor de inferencia filtra con umbral {umbral_servidor:.2f} y este nodo acepta "
+                f"desde {self._umbral_minimo():.2f}: las detecciones entre ambos valores no van a llegar. "
+                f"Conviene levantar el servidor con --umbral {self._umbral_minimo():.2f} o menos."
+            )
+        self._socket = sock
+        self._conectado_antes = True
+        self._espera_reconexion = 1.0
+        return True
+
+    def detectar(self, imagen_bgr, timestamp_ms):
+        if time.monotonic() < self._pausa_hasta or not self.conectar():
+            self.omitidos += 1
+            return []
+
+        inicio = time.perf_counter()
+        ok, jpeg = cv2.imencode(".jpg", imagen_bgr, [cv2.IMWRITE_JPEG_QUALITY, config.CALIDAD_JPEG_REMOTO])
+        enviado = time.perf_counter()
+        metricas.observar("jpeg_remoto", enviado - inicio)
+        if not ok:
+            return []
+        self._secuencia = (self._secuencia + 1) & 0xFFFFFFFF
+        self.pedidos += 1
+
+        try:
+            enviar_mensaje(self._socket, TIPO_PEDIDO, _PEDIDO.pack(self._secuencia, timestamp_ms) + jpeg.tobytes())
+            while True:
+                tipo, cuerpo = recibir_mensaje(self._socket)
+                if tipo == TIPO_RESPUESTA:
+                    secuencia, detecciones, segundos = desempaquetar_detecciones(cuerpo)
+                    if secuencia == self._secuencia:
+                        break
+                elif tipo == TIPO_OCUPADO:
+                    secuencia, espera_ms = _OCUPADO.unpack(cuerpo)
+                    if secuencia == self._secuencia:
+                        self.rechazados += 1
+                        metricas.contar("rechazos_servidor_inferencia")
+                        self._pausa_hasta = time.monotonic() + espera_ms / 1000
+                        return []
+        except OSError as e:  # Incluye el timeout del socket y ConnectionError
+            self.perdidos += 1
+            self._desconectar(f"{e or 'sin respuesta'}")
+            return []
+
+        self.respondidos += 1
+        metricas.observar("inferencia", segundos)
+        metricas.observar("red_inferencia_remota", time.perf_counter() - enviado - segundos)
+        if self.umbral is not None or self.categorias is not None:
+            detecciones = [
+                d for d in detecciones
+                if (self.umbral is None or d.score >= self.umbral)
+                and (self.categorias is None or d.categoria in self.categorias)
+            ]
+        return detecciones
+
+    def cerrar(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _umbral_minimo(self):
+        """Confianza más baja que este nodo acepta (la de sus zonas, o la de la configuración)."""
+        return config.UMBRAL_CONFIANZA_OBJETO if self.umbral is None else self.umbral
+
+    def _desconectar(self, motivo):
+        print(f"Conexión con el servidor de inferencia perdida: {motivo}.")
+        self.cerrar()
+        # El primer reintento es inmediato: suele ser un corte momentáneo
+        self._proximo_intento = 0.0
+
+
+def crear_detector_remoto(umbral=None, categorias=None):
+    """DetectorRemoto hacia SERVIDOR_INFERENCIA. Si el servidor aún no responde,
+    el detector se crea igual y sigue intentando conectar en cada pedido."""
+    detector = DetectorRemoto(config.SERVIDOR_INFERENCIA, umbral=umbral, categorias=categorias)
+    detector.conectar()
+    return detector
+
+
+class _Nodo:
+    """Conexión de un nodo en el servidor; las respuestas salen de varios hilos."""
+
+    def __init__(self, nombre, sock, umbral):
+        self.nombre = nombre
+        self.sock = sock
+        self.umbral = umbral
+        self._lock = threading.Lock()
+        self.pedidos = 0
+        self.respondidos = 0
+        self.rechazados = 0
+
+    def enviar(self, tipo, cuerpo=b""):
+        try:
+            with self._lock:
+                enviar_mensaje(self.sock, tipo, cuerpo)
+        except OSError:
+            pass  # El nodo se desconectó: su hilo lector lo da de baja
+
+
+class _ManejadorNodo(socketserver.BaseRequestHandler):
+    def handle(self):
+        servidor = self.server.inferencia
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            tipo, cuerpo = recibir_mensaje(sock)
+            if tipo != TIPO_HOLA or len(cuerpo) < _HOLA.size:
+                return
+            umbral_nodo, = _HOLA.unpack_from(cuerpo)
+            nombre = cuerpo[_HOLA.size:].decode("utf-8", "replace")
+            nodo = _Nodo(nombre or f"{self.client_address[0]}", sock, umbral_nodo)
+        except OSError:
+            return
+
+        servidor.nodo_conectado(nodo)
+        nodo.enviar(TIPO_LISTO, _LISTO.pack(servidor.umbral))
+        try:
+            while True:
+                tipo, cuerpo = recibir_mensaje(sock)
+                if tipo == TIPO_PEDIDO:
+                    servidor.recibir_pedido(nodo, cuerpo)
+        except OSError:
+            pass
+        finally:
+            servidor.nodo_desconectado(nodo)
+
+
+class _ServidorTCP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ServidorInferencia:
+    """Atiende a los nodos con un hilo lector por conexión y un hilo por detector.
+
+    Los pedidos de todos los nodos van a una cola acotada
+    (CAPACIDAD_COLA_SERVIDOR); si está llena, el pedido se rechaza en el
+    acto con OCUPADO. Cada detector libre toma un lote de hasta
+    LOTE_MAXIMO_SERVIDOR pedidos (esperando a lo sumo ESPERA_LOTE_MS a que
+    se complete), descarta los que esperaron más de MAX_ESPERA_SERVIDOR_MS,
+    decodifica el lote y lo infiere de corrido. Los detectores son del
+    llamador: detener() no los cierra; `umbral` es con el que se crearon
+    (por defecto UMBRAL_CONFIANZA_OBJETO), y se coteja con el de cada nodo.
+    """
+
+    def __init__(self, detectores, puerto=None, host="0.0.0.0", umbral=None):
+        self.detectores = list(detectores)
+        self.umbral = config.UMBRAL_CONFIANZA_OBJETO if umbral is None else umbral
+        self._servidor = _ServidorTCP((host, config.PUERTO_SERVIDOR_INFERENCIA if puerto is None else puerto),
+                                      _ManejadorNodo)
+        self._servidor.inferencia = self
+        self.puerto = self._servidor.server_address[1]
+        self.cola = ColaFotogramas("servidor_inferencia", config.CAPACIDAD_COLA_SERVIDOR, POLITICA_DESCARTAR_NUEVO)
+
+        self._lock = threading.Lock()
+        self._nodos = set()  # _Nodo conectados (un nodo puede abrir varias conexiones)
+        self._latencia_media = 0.05
+        self._hilos = []
+        self.lotes = 0
+        self.pedidos_en_lotes = 0
+        self.vencidos = 0
+
+    def iniciar(self):
+        self._hilos = [threading.Thread(target=self._servidor.serve_forever, name="servidor_inferencia", daemon=True)]
+        self._hilos += [
+            threading.Thread(target=self._atender, args=(detector,), name=f"inferencia_remota_{i}", daemon=True)
+            for i, detector in enumerate(self.detectores)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+        print(f"Servidor de inferencia escuchando en el puerto {self.puerto} con {len(self.detectores)} detector(es).")
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        with self._lock:
+            for nodo in self._nodos:
+                try:
+                    nodo.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self.cola.cerrar()
+        for hilo in self._hilos[1:]:
+            hilo.join()
+
+    # --- Usado por los manejadores ---
+
+    def nodo_conectado(self, nodo):
+        with self._lock:
+            self._nodos.add(nodo)
+        print(f"Nodo '{nodo.nombre}' conectado.")
+        if nodo.umbral < self.umbral - 1e-6:
+            print(
+                f"ADVERTENCIA: El nodo '{nodo.nombre}' acepta detecciones desde {nodo.umbral:.2f}, pero el servidor "
+                f"filtra con {self.umbral:.2f}: lo que quede entre ambos no le va a llegar (conviene bajar --umbral)."
+            )
+
+    def nodo_desconectado(self, nodo):
+        with self._lock:
+            self._nodos.discard(nodo)
+        print(f"Nodo '{nodo.nombre}' desconectado.")
+
+    def recibir_pedido(self, nodo, cuerpo):
+        secuencia, timestamp_ms = _PEDIDO.unpack_from(cuerpo)
+        nodo.pedidos += 1
+        if not self.cola.poner((nodo, secuencia, timestamp_ms, cuerpo[_PEDIDO.size:], time.monotonic())):
+            self._rechazar(nodo, secuencia)
+
+    # --- Estadísticas ---
+
+    def estadisticas(self):
+        nodos = {}
+        with self._lock:
+            for n in self._nodos:
+                total = nodos.setdefault(n.nombre, {"conexiones": 0, "pedidos": 0, "respondidos": 0, "rechazados": 0})
+                total["conexiones"] += 1
+                total["pedidos"] += n.pedidos
+                total["respondidos"] += n.respondidos
+                total["rechazados"] += n.rechazados
+        return {
+            "nodos": nodos,
+            "lotes": self.lotes,
+            "lote_medio": self.pedidos_en_lotes / self.lotes if self.lotes else 0.0,
+            "vencidos": self.vencidos,
+            "cola": self.cola.estadisticas(),
+        }
+
+    def imprimir_estadisticas(self):
+        e = self.estadisticas()
+        detalle = ", ".join(
+            f"{nombre} {n['respondidos']}/{n['pedidos']} ({n['rechazados']} rechazados)" for nombre, n in e["nodos"].items()
+        )
+        print(
+            f"Servidor de inferencia: {len(e['nodos'])} nodo(s) [{detalle or '-'}]; {e['lotes']} lotes "
+            f"(media {e['lote_medio']:.1f}), {e['vencidos']} vencidos, cola {e['cola']['profundidad']}/{e['cola']['capacidad']}"
+        )
+
+    def colector(self):
+        nodos = self.estadisticas()["nodos"]
+        valores = [("nodos_conectados", (), len(nodos)), ("cola_profundidad", (("cola", self.cola.nombre),), self.cola.profundidad())]
+        for nombre, n in nodos.items():
+            etiquetas = (("nodo", nombre),)
+            valores.append(("pedidos_nodo", etiquetas, n["pedidos"]))
+            valores.append(("rechazos_nodo", etiquetas, n["rechazados"]))
+        return valores
+
+    # --- Interno ---
+
+    def _rechazar(self, nodo, secuencia):
+        nodo.rechazados += 1
+        metricas.contar("rechazos_servidor_inferencia")
+        # Lo que tardaría en vaciarse la cola actual
+        espera_ms = self.cola.profundidad() * self._latencia_media * 1000 / len(self.detectores)
+        nodo.enviar(TIPO_OCUPADO, _OCUPADO.pack(secuencia, int(min(65535, max(10, espera_ms)))))
+
+    def _tomar_lote(self):
+        primero = self.cola.obtener()
+        if primero is None:
+            return []
+        lote = [primero]
+        fin = time.monotonic() + config.ESPERA_LOTE_MS / 1000
+        while len(lote) < config.LOTE_MAXIMO_SERVIDOR:
+            restante = fin - time.monotonic()
+            item = self.cola.obtener(timeout=restante) if restante > 0 else None
+            if item is None:
+                break
+            lote.append(item)
+        return lote
+
+    def _atender(self, detector):
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                return
+            self.lotes += 1
+            self.pedidos_en_lotes += len(lote)
+
+            ahora = time.monotonic()
+            vigentes = []
+            for item in lote:
+                if (ahora - item[4]) * 1000 > config.MAX_ESPERA_SERVIDOR_MS:
+                    self.vencidos += 1
+                    self._rechazar(item[0], item[1])
+                else:
+                    vigentes.append(item)
+
+            inicio = time.perf_counter()
+            imagenes = [cv2.imdecode(np.frombuffer(item[3], np.uint8), cv2.IMREAD_COLOR) for item in vigentes]
+            metricas.observar("decodificacion_remota", time.perf_counter() - inicio)
+
+            for (nodo, secuencia, timestamp_ms, _, _), imagen in zip(vigentes, imagenes):
+                inicio = time.perf_counter()
+                detecciones = []
+                if imagen is not None:
+                    try:
+                        detecciones = detector.detectar(imagen, timestamp_ms)
+                    except Exception as e:
+                        print(f"Error en la detección (nodo '{nodo.nombre}'): {e}")
+                segundos = time.perf_counter() - inicio
+                self._latencia_media = 0.9 * self._latencia_media + 0.1 * segundos
+                nodo.respondidos += 1
+                nodo.enviar(TIPO_RESPUESTA, empaquetar_detecciones(secuencia, detecciones, segundos))
+
+
+def crear_detectores(cantidad, umbral=None):
+    """Carga `cantidad` detectores locales (en proceso aparte con DETECTOR_EN_PROCESO)."""
+    from scripts.detector import crear_detector_objetos, descargar_modelo_si_no_existe
+    from scripts.detector_proceso import crear_detector_en_proceso
+
+    descargar_modelo_si_no_existe()
+    crear = crear_detector_en_proceso if config.DETECTOR_EN_PROCESO else crear_detector_objetos
+    detectores = []
+    for _ in range(cantidad):
+        detector = crear(umbral=umbral)
+        if detector is None:
+            break
+        detectores.append(detector)
+    return detectores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor central de inferencia para nodos de captura.")
+    parser.add_argument("--puerto", type=int, default=config.PUERTO_SERVIDOR_INFERENCIA)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--detectores", type=int, default=config.DETECTORES_POOL, help="Inferencias simultáneas")
+    parser.add_argument("--umbral", type=float, default=None,
+                        help="Confianza mínima (por defecto UMBRAL_CONFIANZA_OBJETO; cada nodo filtra después con sus zonas)")
+    args = parser.parse_args()
+
+    detectores = crear_detectores(max(1, args.detectores), args.umbral)
+    if not detectores:
+        print("No se pudo crear el detector. Saliendo.")
+        return 1
+    servidor = ServidorInferencia(detectores, args.puerto, args.host, umbral=args.umbral).iniciar()
+    metricas.registrar_colector(servidor.colector)
+    exportador_metricas = metricas.ExportadorMetricas().iniciar() if config.METRICAS_HABILITADAS else None
+
+    salida = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: salida.set())
+    signal.signal(signal.SIGTERM, lambda *_: salida.set())
+    while not salida.wait(config.INTERVALO_ESTADISTICAS_SEGUNDOS):
+        servidor.imprimir_estadisticas()
+
+    print("Deteniendo el servidor de inferencia...")
+    servidor.detener()
+    servidor.imprimir_estadisticas()
+    if exportador_metricas is not None:
+        exportador_metricas.detener()
+    for detector in detectores:
+        detector.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
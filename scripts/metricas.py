@@ -0,0 +1,243 @@
+"""Métricas del pipeline: tiempos por etapa y contadores.
+
+Las etapas registran cada medición con observar() y los eventos con
+contar(); ambas son un par de operaciones en memoria (sin I/O ni
+formateo), así que instrumentar el bucle cuesta microsegundos por
+fotograma. La exportación se hace aparte: un endpoint HTTP local en
+formato de texto de Prometheus y, opcionalmente, un volcado periódico a
+JSON.
+
+    curl http://127.0.0.1:9108/metrics
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts import config
+
+# Límites superiores (segundos) de los buckets de los histogramas de etapas:
+# desde operaciones de fracción de ms (resize) hasta subidas de un minuto
+BUCKETS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_PREFIJO = "cctv_"
+
+_lock = threading.Lock()
+_histogramas = {}   # etapa -> Histograma
+_contadores = {}    # (nombre, etiquetas) -> valor
+_colectores = []    # funciones que retornan [(nombre, etiquetas, valor)] al exportar
+
+
+class Histograma:
+    """Histograma de buckets fijos con cantidad y suma, como los de Prometheus."""
+
+    def __init__(self):
+        self.cuentas = [0] * (len(BUCKETS_SEGUNDOS) + 1)  # El último es +Inf
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        self.cuentas[bisect.bisect_left(BUCKETS_SEGUNDOS, segundos)] += 1
+        self.cantidad += 1
+        self.suma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, p):
+        """Estimación del percentil `p` (0-1): límite superior del bucket que lo contiene."""
+        if not self.cantidad:
+            return 0.0
+        objetivo = p * self.cantidad
+        acumulado = 0
+        for limite, cuenta in zip(BUCKETS_SEGUNDOS + (self.maximo,), self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+
+# --- Registro (llamado desde las etapas) ---
+
+def observar(etapa, segundos):
+    """Agrega la duración de una ejecución de `etapa` a su histograma."""
+    if not config.METRICAS_HABILITADAS:
+        return
+    histograma = _histogramas.get(etapa)
+    if histograma is None:
+        with _lock:
+            histograma = _histogramas.setdefault(etapa, Histograma())
+    with _lock:
+        histograma.observar(segundos)
+
+
+def contar(nombre, cantidad=1, etiquetas=()):
+    """Incrementa un contador. `etiquetas` es una tupla de pares (clave, valor)."""
+    if not config.METRICAS_HABILITADAS:
+        return
+    clave = (nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + cantidad
+
+
+def registrar_colector(funcion):
+    """Agrega una función que, al exportar, retorna valores actuales como
+    [(nombre, etiquetas, valor)] (p. ej. profundidad y descartes de las colas)."""
+    with _lock:
+        _colectores.append(funcion)
+
+
+def reiniciar():
+    """Borra todas las métricas registradas (útil en benchmarks)."""
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
+        _colectores.clear()
+
+
+# --- Exportación ---
+
+def instantanea():
+    """Copia de todas las métricas como dict serializable a JSON."""
+    with _lock:
+        histogramas = {
+            etapa: {
+                "cantidad": h.cantidad,
+                "suma_s": h.suma,
+                "media_ms": h.suma / h.cantidad * 1000 if h.cantidad else 0.0,
+                "p50_ms": h.percentil(0.5) * 1000,
+                "p95_ms": h.percentil(0.95) * 1000,
+                "max_ms": h.maximo * 1000,
+            }
+            for etapa, h in _histogramas.items()
+        }
+        contadores = {_nombre_con_etiquetas(n, e): v for (n, e), v in _contadores.items()}
+        colectores = list(_colectores)
+
+    valores = {}
+    for colector in colectores:
+        for nombre, etiquetas, valor in colector():
+            valores[_nombre_con_etiquetas(nombre, etiquetas)] = valor
+    return {"timestamp": time.time(), "etapas": histogramas, "contadores": contadores, "valores": valores}
+
+
+def texto_prometheus():
+    """Todas las métricas en el formato de texto de exposición de Prometheus."""
+    lineas = []
+    with _lock:
+        histogramas = [(etapa, list(h.cuentas), h.cantidad, h.suma) for etapa, h in sorted(_histogramas.items())]
+        contadores = sorted(_contadores.items())
+        colectores = list(_colectores)
+
+    if histogramas:
+        nombre = f"{_PREFIJO}etapa_segundos"
+        lineas.append(f"# HELP {nombre} Duración de cada etapa del pipeline.")
+        lineas.append(f"# TYPE {nombre} histogram")
+        for etapa, cuentas, cantidad, suma in histogramas:
+            acumulado = 0
+            for limite, cuenta in zip(BUCKETS_SEGUNDOS, cuentas):
+                acumulado += cuenta
+                lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="+Inf"}} {cantidad}')
+            lineas.append(f'{nombre}_sum{{etapa="{etapa}"}} {suma:.6f}')
+            lineas.append(f'{nombre}_count{{etapa="{etapa}"}} {cantidad}')
+
+    tipos_declarados = set()
+    for (nombre, etiquetas), valor in contadores:
+        nombre = f"{_PREFIJO}{nombre}_total"
+        if nombre not in tipos_declarados:
+            lineas.append(f"# TYPE {nombre} counter")
+            tipos_declarados.add(nombre)
+        lineas.append(f"{_nombre_con_etiquetas(nombre, etiquetas)} {valor}")
+
+    # Cada cámara registra sus propios colectores con los mismos nombres: las muestras se agrupan
+    # por familia, porque el formato exige que cada una quede contigua bajo su # TYPE
+    familias = {}
+    for colector in colectores:
+        for nombre, etiquetas, valor in colector():
+            familias.setdefault(f"{_PREFIJO}{nombre}", []).append((etiquetas, valor))
+    for nombre, muestras in familias.items():
+        if nombre not in tipos_declarados:
+            lineas.append(f"# TYPE {nombre} gauge")
+        for etiquetas, valor in muestras:
+            lineas.append(f"{_nombre_con_etiquetas(nombre, etiquetas)} {valor}")
+    return "\n".join(lineas) + "\n"
+
+
+def _nombre_con_etiquetas(nombre, etiquetas):
+    if not etiquetas:
+        return nombre
+    return nombre + "{" + ",".join(f'{clave}="{valor}"' for clave, valor in etiquetas) + "}"
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            cuerpo, tipo = texto_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            cuerpo, tipo = json.dumps(instantanea(), indent=2).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ExportadorMetricas:
+    """Sirve /metrics (Prometheus) y /metrics.json en localhost y, si hay
+    RUTA_VOLCADO_METRICAS, vuelca la instantánea a JSON periódicamente."""
+
+    def __init__(self, puerto=None, ruta_volcado=None):
+        self.puerto = config.PUERTO_METRICAS if puerto is None else puerto
+        self.ruta_volcado = ruta_volcado or config.RUTA_VOLCADO_METRICAS
+        self._servidor = None
+        self._detener = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        if self.puerto:
+            try:
+                self._servidor = ThreadingHTTPServer(("127.0.0.1", self.puerto), _ManejadorMetricas)
+            except OSError as e:
+                print(f"No se pudo abrir el endpoint de métricas en el puerto {self.puerto}: {e}")
+            else:
+                self._servidor.daemon_threads = True
+                self._hilos.append(threading.Thread(target=self._servidor.serve_forever, name="metricas_http", daemon=True))
+                print(f"Métricas en http://127.0.0.1:{self._servidor.server_address[1]}/metrics")
+        if self.ruta_volcado:
+            self._hilos.append(threading.Thread(target=self._volcar_periodicamente, name="metricas_json", daemon=True))
+        for hilo in self._hilos:
+            hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+        for hilo in self._hilos:
+            hilo.join()
+        if self.ruta_volcado:
+            self._volcar()
+
+    def _volcar_periodicamente(self):
+        while not self._detener.wait(config.INTERVALO_VOLCADO_METRICAS):
+            self._volcar()
+
+    def _volcar(self):
+        # Escritura atómica: quien lea el archivo nunca ve un JSON a medio escribir
+        temporal = self.ruta_volcado + ".tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(instantanea(), f, indent=2)
+            os.replace(temporal, self.ruta_volcado)
+        except OSError as e:
+            print(f"No se pudo volcar las métricas a '{self.ruta_volcado}': {e}")
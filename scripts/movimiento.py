@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+from scripts import config
+from scripts import metricas
+
+
+class FiltroMovimiento:
+    """Pre-filtro barato delante del detector.
+
+    Compara una versión reducida en escala de grises del fotograma contra un
+    fondo de media móvil y mide la "energía de movimiento" como la fracción
+    de píxeles que cambiaron más que UMBRAL_DIFERENCIA_PIXEL. Solo deja pasar
+    a la inferencia los fotogramas que superan UMBRAL_ENERGIA_MOVIMIENTO, más
+    una inferencia forzada cada SEGUNDOS_INFERENCIA_FORZADA para no perder
+    objetos quietos.
+
+    Las aperturas (por motivo) y las inferencias ahorradas también se
+    cuentan en metricas, con `etiquetas` (p. ej. la cámara).
+    """
+
+    def __init__(self, etiquetas=()):
+        self.ancho = config.ANCHO_MOVIMIENTO
+        self.umbral_pixel = config.UMBRAL_DIFERENCIA_PIXEL
+        self.umbral_energia = config.UMBRAL_ENERGIA_MOVIMIENTO
+        self.segundos_forzada = config.SEGUNDOS_INFERENCIA_FORZADA
+        self.alfa_fondo = config.ALFA_FONDO_MOVIMIENTO
+        self.etiquetas = tuple(etiquetas)
+
+        self._fondo = None  # float32, se actualiza con accumulateWeighted
+        self._dimensiones = None
+        self._ultima_apertura = None
+        self.ultima_energia = 0.0
+
+        self.evaluados = 0
+        self.aperturas_movimiento = 0
+        self.aperturas_forzadas = 0
+        self.inferencias_ahorradas = 0
+
+    def energia(self, imagen_bgr):
+        """Fracción (0..1) de píxeles que difieren del fondo, y actualiza el fondo."""
+        if self._dimensiones is None:
+            altura, ancho = imagen_bgr.shape[:2]
+            self._dimensiones = (self.ancho, max(1, int(self.ancho * altura / ancho)))
+
+        reducido = cv2.resize(imagen_bgr, self._dimensiones, interpolation=cv2.INTER_AREA)
+        gris = cv2.cvtColor(reducido, cv2.COLOR_BGR2GRAY)
+        gris = cv2.GaussianBlur(gris, (5, 5), 0)
+
+        if self._fondo is None:
+            self._fondo = gris.astype(np.float32)
+            return 1.0  # Sin referencia todavía: tratamos el primer fotograma como movimiento
+
+        diferencia = cv2.absdiff(gris, cv2.convertScaleAbs(self._fondo))
+        _, mascara = cv2.threshold(diferencia, self.umbral_pixel, 255, cv2.THRESH_BINARY)
+        cv2.accumulateWeighted(gris, self._fondo, self.alfa_fondo)
+        return cv2.countNonZero(mascara) / mascara.size
+
+    def debe_inferir(self, imagen_bgr, timestamp, forzar=False):
+        """Indica si vale la pena correr el detector sobre este fotograma.
+
+        `forzar` deja pasar el fotograma igualmente (por ejemplo, durante un
+        evento activo), aunque el fondo se sigue actualizando.
+        """
+        self.evaluados += 1
+        self.ultima_energia = self.energia(imagen_bgr)
+
+        if forzar or self.ultima_energia >= self.umbral_energia:
+            self.aperturas_movimiento += 1
+            metricas.contar("aperturas_filtro_movimiento", etiquetas=self.etiquetas + (("motivo", "movimiento"),))
+        elif self._ultima_apertura is None or timestamp - self._ultima_apertura >= self.segundos_forzada:
+            self.aperturas_forzadas += 1
+            metricas.contar("aperturas_filtro_movimiento", etiquetas=self.etiquetas + (("motivo", "forzada"),))
+        else:
+            self.inferencias_ahorradas += 1
+            metricas.contar("inferencias_ahorradas_movimiento", etiquetas=self.etiquetas)
+            return False
+
+        self._ultima_apertura = timestamp
+        return True
+
+    def estadisticas(self):
+        aperturas = self.aperturas_movimiento + self.aperturas_forzadas
+        return {
+            "evaluados": self.evaluados,
+            "aperturas_movimiento": self.aperturas_movimiento,
+            "aperturas_forzadas": self.aperturas_forzadas,
+            "inferencias_ahorradas": self.inferencias_ahorradas,
+            "tasa_apertura": aperturas / self.evaluados if self.evaluados else 0.0,
+            "ultima_energia": self.ultima_energia,
+        }
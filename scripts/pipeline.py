@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+from scripts import metricas
+
+# Políticas de descarte para las colas de fotogramas
+POLITICA_DESCARTAR_ANTIGUO = "descartar_antiguo"  # Se pierde el fotograma más viejo de la cola
+POLITICA_DESCARTAR_NUEVO = "descartar_nuevo"      # Se pierde el fotograma que intenta entrar
+POLITICA_BLOQUEAR = "bloquear"                    # El productor espera hasta que haya lugar
+POLITICAS_VALIDAS = (POLITICA_DESCARTAR_ANTIGUO, POLITICA_DESCARTAR_NUEVO, POLITICA_BLOQUEAR)
+
+# Fotograma ya redimensionado junto con su número de secuencia y el instante de captura
+# (segundos de time.monotonic()). Con zonas de interés, `recorte` es la región de las
+# zonas tomada de la captura original, que es lo que se pasa al detector.
+Fotograma = namedtuple("Fotograma", ["numero", "timestamp", "imagen", "recorte"], defaults=(None,))
+
+# Detección de un fotograma inferido: caja en píxeles del fotograma procesado,
+# confianza, nombre de la categoría, zona donde cayó (None sin zonas configuradas)
+# e id de la pista del seguidor (None sin seguimiento).
+Deteccion = namedtuple(
+    "Deteccion", ["x", "y", "ancho", "alto", "score", "categoria", "zona", "pista"], defaults=(None, None)
+)
+
+
+def dibujar_detecciones(imagen_bgr, detecciones):
+    """Dibuja las cajas (y el id de pista, si lo hay) sobre una imagen que ya sea una copia."""
+    for d in detecciones:
+        cv2.rectangle(imagen_bgr, (d.x, d.y), (d.x + d.ancho, d.y + d.alto), (0, 255, 0), 2)
+        if d.pista is not None:
+            cv2.putText(imagen_bgr, f"#{d.pista} {d.categoria}", (d.x, max(10, d.y - 4)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1, cv2.LINE_AA)
+
+
+def hora_de_captura(timestamp):
+    """Lleva el timestamp monotónico de un Fotograma a hora de reloj (segundos epoch)."""
+    return time.time() - (time.monotonic() - timestamp)
+
+
+class ColaFotogramas:
+    """Cola acotada de fotogramas entre dos etapas del pipeline.
+
+    Cuando la cola está llena se aplica la política configurada. Lleva
+    contadores de encolados, descartados y profundidad máxima alcanzada.
+    """
+
+    def __init__(self, nombre, capacidad, politica=POLITICA_DESCARTAR_ANTIGUO):
+        if politica not in POLITICAS_VALIDAS:
+            raise ValueError(f"Política de cola desconocida: {politica}")
+        self.nombre = nombre
+        self.capacidad = max(1, int(capacidad))
+        self.politica = politica
+        self._items = deque()
+        self._condicion = threading.Condition()
+        self._cerrada = False
+
+        self.encolados = 0
+        self.descartados = 0
+        self.profundidad_max = 0
+
+    def poner(self, item):
+        """Agrega un item. Retorna False si fue descartado o la cola está cerrada."""
+        with self._condicion:
+            if self._cerrada:
+                return False
+
+            if len(self._items) >= self.capacidad:
+                if self.politica == POLITICA_DESCARTAR_NUEVO:
+                    self.descartados += 1
+                    return False
+                elif self.politica == POLITICA_DESCARTAR_ANTIGUO:
+                    self._items.popleft()
+                    self.descartados += 1
+                else:
+                    while len(self._items) >= self.capacidad and not self._cerrada:
+                        self._condicion.wait()
+                    if self._cerrada:
+                        return False
+
+            self._items.append(item)
+            self.encolados += 1
+            self.profundidad_max = max(self.profundidad_max, len(self._items))
+            self._condicion.notify_all()
+            return True
+
+    def obtener(self, timeout=None):
+        """Saca el item más antiguo. Retorna None si se cierra la cola o vence el timeout."""
+        with self._condicion:
+            fin = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._cerrada:
+                    return None
+                restante = None if fin is None else fin - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return None
+                self._condicion.wait(restante)
+
+            item = self._items.popleft()
+            self._condicion.notify_all()
+            return item
+
+    def cerrar(self):
+        """Despierta a productores y consumidores; los items pendientes aún pueden leerse."""
+        with self._condicion:
+            self._cerrada = True
+            self._condicion.notify_all()
+
+    def profundidad(self):
+        with self._condicion:
+            return len(self._items)
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                "cola": self.nombre,
+                "politica": self.politica,
+                "capacidad": self.capacidad,
+                "profundidad": len(self._items),
+                "profundidad_max": self.profundidad_max,
+                "encolados": self.encolados,
+                "descartados": self.descartados,
+            }
+
+
+class HiloCaptura(threading.Thread):
+    """Etapa de captura: lee la cámara a la tasa del sensor, redimensiona y
+    reparte cada fotograma a las colas de las etapas siguientes. Con
+    ZonasInteres también recorta la región de las zonas de la imagen original.
+
+    Con `fps_maximo`, los fotogramas que la cámara entrega antes de tiempo
+    (por encima de esa tasa) se sacan del driver con grab() y se descartan
+    sin retrieve(): no irían al pre-roll ni al detector. En las cámaras
+    locales retrieve() es la decodificación (MJPG o YUYV a BGR), así que no
+    se decodifican; con el backend FFmpeg (RTSP/HTTP y archivos) grab() ya
+    decodificó el fotograma y solo se evita la conversión de retrieve()."""
+
+    def __init__(self, cap, dimensiones, colas, zonas=None, nombre="captura", fps_maximo=None):
+        super().__init__(name=nombre, daemon=True)
+        self.cap = cap
+        self.dimensiones = dimensiones
+        self.colas = list(colas)
+        self.zonas = zonas
+        self.intervalo = 1.0 / fps_maximo if fps_maximo else 0.0
+        self.detener = threading.Event()
+        self.capturados = 0
+        self.omitidos = 0  # Fotogramas descartados tras grab(), sin retrieve()
+        self.segundos_decodificacion = 0.0  # Tiempo en retrieve() de los fotogramas entregados
+
+    def preparar(self, fotograma_bgr, timestamp):
+        """Redimensiona (y recorta las zonas de) una captura y la numera como Fotograma."""
+        inicio = time.perf_counter()
+        fotograma_proc_bgr = cv2.resize(fotograma_bgr, self.dimensiones, interpolation=cv2.INTER_AREA)
+        recorte = self.zonas.recortar(fotograma_bgr) if self.zonas is not None else None
+        fotograma = Fotograma(self.capturados, timestamp, fotograma_proc_bgr, recorte)
+        self.capturados += 1
+        metricas.observar("redimension", time.perf_counter() - inicio)
+        metricas.contar("fotogramas_capturados")
+        return fotograma
+
+    def run(self):
+        proximo = 0.0
+        try:
+            while not self.detener.is_set():
+                inicio = time.perf_counter()
+                ret = self.cap.grab()
+                ahora = time.monotonic()
+                # Margen de un cuarto de intervalo: la cámara no entrega justo en la grilla
+                if ret and ahora < proximo - self.intervalo / 4:
+                    self.omitidos += 1
+                    metricas.contar("fotogramas_omitidos_captura")
+                    continue
+                # Grilla fija a fps_maximo; si la cámara se atrasa más de un intervalo, vuelve a partir de ahora
+                proximo = (proximo if ahora < proximo + self.intervalo else ahora) + self.intervalo
+                inicio_decodificacion = time.perf_counter()
+                if ret:
+                    ret, fotograma_bgr = self.cap.retrieve()
+                if not ret:
+                    print("Fin del stream o error de cámara.")
+                    break
+                fin = time.perf_counter()
+                self.segundos_decodificacion += fin - inicio_decodificacion
+                metricas.observar("decodificacion_captura", fin - inicio_decodificacion)
+                metricas.observar("captura", fin - inicio)
+                fotograma = self.preparar(fotograma_bgr, ahora)
+
+                for cola in self.colas:
+                    cola.poner(fotograma)
+        except Exception as e:
+            print(f"Error inesperado en el hilo de captura: {e}")
+        finally:
+            # Cerrar las colas avisa a las etapas siguientes que no vendrán más fotogramas
+            for cola in self.colas:
+                cola.cerrar()
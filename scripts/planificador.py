@@ -0,0 +1,88 @@
+from scripts import config
+
+
+class PlanificadorInferencia:
+    """Decide en qué fotogramas se corre el detector.
+
+    La tasa de inferencia se calcula a partir de la latencia medida del
+    detector (media móvil exponencial) y de un presupuesto de CPU expresado
+    como fracción de un núcleo: con latencia L y presupuesto B, el detector
+    puede correr como máximo B / L veces por segundo. Mientras hay un evento
+    activo (detecciones recientes) se usa el presupuesto y la tasa máxima
+    de evento; en reposo, los de inactividad.
+    """
+
+    def __init__(self, fps_activo=None, fps_inactivo=None, escala_presupuesto=1.0):
+        # Con varias cámaras el presupuesto se reparte entre ellas (escala_presupuesto = 1 / cámaras)
+        self.presupuesto_inactivo = config.PRESUPUESTO_CPU_INACTIVO * escala_presupuesto
+        self.presupuesto_activo = config.PRESUPUESTO_CPU_ACTIVO * escala_presupuesto
+        self.fps_inactivo = fps_inactivo or config.FPS_INFERENCIA_INACTIVO
+        self.fps_activo = fps_activo or config.FPS_INFERENCIA_ACTIVO
+        self.fps_minimo = config.FPS_INFERENCIA_MIN
+        self.segundos_evento_activo = config.SEGUNDOS_EVENTO_ACTIVO
+
+        self.latencia_media = None  # segundos, media móvil exponencial
+        self._alfa = 0.2
+        self._ultima_inferencia = None
+        self._ultima_deteccion = None
+        self._origen = None
+        self._ultimo_timestamp_ms = -1
+
+        self.inferencias = 0
+        self.omitidos = 0
+
+    def evento_activo(self, timestamp):
+        return self._ultima_deteccion is not None and \
+            timestamp - self._ultima_deteccion <= self.segundos_evento_activo
+
+    def fps_objetivo(self, timestamp):
+        """Tasa de inferencia (inferencias/s) que corresponde en este instante."""
+        if self.evento_activo(timestamp):
+            presupuesto, fps_tope = self.presupuesto_activo, self.fps_activo
+        else:
+            presupuesto, fps_tope = self.presupuesto_inactivo, self.fps_inactivo
+
+        fps = fps_tope
+        if self.latencia_media:
+            fps = min(fps_tope, presupuesto / self.latencia_media)
+        return max(self.fps_minimo, fps)
+
+    def debe_inferir(self, timestamp):
+        """Indica si el fotograma capturado en `timestamp` (segundos monotónicos) debe inferirse."""
+        if self._ultima_inferencia is None or \
+           timestamp - self._ultima_inferencia >= 1.0 / self.fps_objetivo(timestamp):
+            return True
+        self.omitidos += 1
+        return False
+
+    def timestamp_ms(self, timestamp):
+        """Convierte el instante de captura al timestamp en ms que espera detect_for_video.
+
+        MediaPipe exige timestamps estrictamente crecientes en modo VIDEO.
+        """
+        if self._origen is None:
+            self._origen = timestamp
+        timestamp_ms = int((timestamp - self._origen) * 1000)
+        timestamp_ms = max(timestamp_ms, self._ultimo_timestamp_ms + 1)
+        self._ultimo_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+    def registrar_inferencia(self, timestamp, latencia, hubo_deteccion):
+        """Actualiza la latencia medida y el estado de evento tras correr el detector."""
+        self._ultima_inferencia = timestamp
+        self.inferencias += 1
+        if self.latencia_media is None:
+            self.latencia_media = latencia
+        else:
+            self.latencia_media += self._alfa * (latencia - self.latencia_media)
+        if hubo_deteccion:
+            self._ultima_deteccion = timestamp
+
+    def estadisticas(self, timestamp):
+        return {
+            "inferencias": self.inferencias,
+            "omitidos": self.omitidos,
+            "latencia_media_ms": (self.latencia_media or 0.0) * 1000,
+            "fps_objetivo": self.fps_objetivo(timestamp),
+            "evento_activo": self.evento_activo(timestamp),
+        }
@@ -0,0 +1,155 @@
+"""Prueba local de la inferencia remota con varios nodos simulados.
+
+Levanta un ServidorInferencia en 127.0.0.1 y N nodos, cada uno alimentado
+por un video (se repiten en orden si hay menos videos que nodos). Cada nodo
+hace lo mismo que un nodo real antes de inferir: redimensiona a
+ANCHO_PROCESAMIENTO, pasa por el filtro de movimiento y pide la inferencia
+con un DetectorRemoto. Con --corte el servidor se detiene a mitad de la
+prueba y vuelve a levantarse, para verificar la reconexión:
+
+    python -m scripts.prueba_inferencia_remota --videos a.mp4 b.mp4 --nodos 4 --segundos 30 --corte 10
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from scripts import config
+from scripts.camaras import CapturaArchivo
+from scripts.inferencia_remota import DetectorRemoto, ServidorInferencia, crear_detectores
+from scripts.movimiento import FiltroMovimiento
+
+
+class NodoSimulado(threading.Thread):
+    def __init__(self, nombre, video, puerto, tiempo_real, fin):
+        super().__init__(name=nombre, daemon=True)
+        self.nombre = nombre
+        self.video = video
+        self.tiempo_real = tiempo_real
+        self.fin = fin
+        self.detector = DetectorRemoto(f"127.0.0.1:{puerto}", nombre=nombre)
+        self.filtro = FiltroMovimiento()
+        self.fotogramas = 0
+        self.latencias = []
+        self.con_detecciones = 0
+
+    def run(self):
+        cap = None
+        while time.monotonic() < self.fin:
+            if cap is None:
+                cap = cv2.VideoCapture(self.video)
+                if self.tiempo_real:
+                    cap = CapturaArchivo(cap)
+            ret, imagen = cap.read()
+            if not ret:
+                cap.release()
+                cap = None  # Al terminar el video vuelve a empezar
+                continue
+            self.fotogramas += 1
+            alto = int(config.ANCHO_PROCESAMIENTO * imagen.shape[0] / imagen.shape[1])
+            imagen = cv2.resize(imagen, (config.ANCHO_PROCESAMIENTO, alto), interpolation=cv2.INTER_AREA)
+            ahora = time.monotonic()
+            if not self.filtro.debe_inferir(imagen, ahora):
+                continue
+            inicio = time.perf_counter()
+            respondidos = self.detector.respondidos
+            detecciones = self.detector.detectar(imagen, int(ahora * 1000))
+            if self.detector.respondidos > respondidos:
+                self.latencias.append(time.perf_counter() - inicio)
+                self.con_detecciones += bool(detecciones)
+        if cap is not None:
+            cap.release()
+        self.detector.cerrar()
+
+    def resultado(self, segundos):
+        d = self.detector
+        latencias_ms = np.array(self.latencias or [0.0]) * 1000
+        return {
+            "nodo": self.nombre,
+            "video": self.video,
+            "fotogramas": self.fotogramas,
+            "pedidos": d.pedidos,
+            "respondidos": d.respondidos,
+            "rechazados": d.rechazados,
+            "perdidos": d.perdidos,
+            "omitidos": d.omitidos,
+            "reconexiones": d.reconexiones,
+            "con_detecciones": self.con_detecciones,
+            "inferencias_por_segundo": d.respondidos / segundos,
+            "latencia_p50_ms": float(np.percentile(latencias_ms, 50)),
+            "latencia_p90_ms": float(np.percentile(latencias_ms, 90)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba la inferencia remota con nodos simulados desde videos.")
+    parser.add_argument("--videos", nargs="+", required=True, help="Videos que alimentan a los nodos")
+    parser.add_argument("--nodos", type=int, default=3)
+    parser.add_argument("--segundos", type=float, default=20.0, help="Duración de la prueba")
+    parser.add_argument("--detectores", type=int, default=1, help="Detectores del servidor")
+    parser.add_argument("--tiempo-real", action="store_true", help="Leer los videos a su fps en lugar de lo más rápido posible")
+    parser.add_argument("--corte", type=float, default=None, help="Detener el servidor a los N segundos y relevantarlo")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    detectores = crear_detectores(max(1, args.detectores))
+    if not detectores:
+        print("No se pudo crear el detector.")
+        return 1
+    servidor = ServidorInferencia(detectores, puerto=0, host="127.0.0.1").iniciar()
+    puerto = servidor.puerto
+
+    inicio = time.monotonic()
+    fin = inicio + args.segundos
+    nodos = [
+        NodoSimulado(f"nodo{i}", args.videos[i % len(args.videos)], puerto, args.tiempo_real, fin)
+        for i in range(args.nodos)
+    ]
+    for nodo in nodos:
+        nodo.start()
+
+    estadisticas_servidor = []
+    if args.corte is not None and args.corte < args.segundos:
+        time.sleep(args.corte)
+        print(f"\nDeteniendo el servidor a los {args.corte:.0f} s para probar la reconexión...")
+        servidor.detener()
+        estadisticas_servidor.append(servidor.estadisticas())
+        time.sleep(2.0)
+        servidor = ServidorInferencia(detectores, puerto=puerto, host="127.0.0.1").iniciar()
+
+    for nodo in nodos:
+        nodo.join()
+    segundos = time.monotonic() - inicio
+    servidor.detener()
+    estadisticas_servidor.append(servidor.estadisticas())
+    for detector in detectores:
+        detector.cerrar()
+
+    resultados = [nodo.resultado(segundos) for nodo in nodos]
+    print(f"\n{'Nodo':<8} {'fotog.':>7} {'pedidos':>8} {'resp.':>6} {'rech.':>6} {'perd.':>6} {'reconex.':>8} "
+          f"{'inf/s':>6} {'p50 ms':>7} {'p90 ms':>7}")
+    for r in resultados:
+        print(
+            f"{r['nodo']:<8} {r['fotogramas']:>7} {r['pedidos']:>8} {r['respondidos']:>6} {r['rechazados']:>6} "
+            f"{r['perdidos']:>6} {r['reconexiones']:>8} {r['inferencias_por_segundo']:>6.1f} "
+            f"{r['latencia_p50_ms']:>7.1f} {r['latencia_p90_ms']:>7.1f}"
+        )
+    lotes = sum(e["lotes"] for e in estadisticas_servidor)
+    print(
+        f"Servidor: {lotes} lotes, lote medio {sum(e['lote_medio'] * e['lotes'] for e in estadisticas_servidor) / max(1, lotes):.2f}, "
+        f"{sum(e['vencidos'] for e in estadisticas_servidor)} pedidos vencidos"
+    )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"segundos": segundos, "nodos": resultados, "servidor": estadisticas_servidor}, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
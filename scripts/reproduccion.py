@@ -0,0 +1,262 @@
+"""Reproducción de videos grabados a través del pipeline, con reloj determinista.
+
+Cada video pasa por las mismas etapas que una cámara (PipelineCamara:
+redimensión y zonas, planificador, filtro de movimiento, pool de
+detectores, seguimiento, etapa de grabación y codificador), pero en un
+bucle sincrónico: el instante de cada fotograma es su posición en el video
+(n / fps), no el reloj del equipo, y la etapa de grabación avanza con cada
+fotograma ya inferido. Así dos corridas sobre el mismo video disparan en
+los mismos fotogramas (con --latencia-fija, también el planificador decide
+igual). Sin --tiempo-real se procesa tan rápido como se pueda.
+
+    python -m scripts.reproduccion --videos incidente.mp4 patio.mp4 --json reporte.json \\
+        [--tiempo-real] [--verdad eventos.json --tolerancia 2]
+
+El archivo de verdad asocia cada video (por nombre de archivo) a sus
+eventos, como instantes o como intervalos [inicio, fin] en segundos:
+
+    {"incidente.mp4": [12.5, [40, 55]], "patio.mp4": []}
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+from scripts import config
+from scripts import metricas
+from scripts.arranque import CargaDetector
+from scripts.camaras import PipelineCamara, PoolDetectores, filtros_detector_camaras, normalizar_camaras
+
+VERSION_REPORTE = 1
+
+
+def cargar_verdad(ruta):
+    """{nombre de video: [(inicio, fin), ...]} a partir del archivo de verdad."""
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    verdad = {}
+    for video, eventos in datos.items():
+        verdad[os.path.basename(video)] = [
+            (float(e[0]), float(e[1])) if isinstance(e, (list, tuple)) else (float(e), float(e)) for e in eventos
+        ]
+    return verdad
+
+
+def comparar(disparos, eventos, tolerancia):
+    """Empareja los disparos (instantes) con los eventos de verdad.
+
+    Un disparo acierta si cae dentro de un evento, con `tolerancia` segundos
+    de margen a cada lado; cada evento cuenta una sola vez (las
+    continuaciones y los disparos repetidos sobre un evento ya acertado no
+    son falsos positivos). La demora es desde el inicio del evento hasta su
+    primer disparo.
+    """
+    acertados = {}
+    falsos = 0
+    for t in disparos:
+        evento = next(
+            (i for i, (inicio, fin) in enumerate(eventos) if inicio - tolerancia <= t <= fin + tolerancia), None
+        )
+        if evento is None:
+            falsos += 1
+        elif evento not in acertados:
+            acertados[evento] = t - eventos[evento][0]
+    aciertos = len(acertados)
+    precision = aciertos / (aciertos + falsos) if aciertos + falsos else 1.0
+    recall = aciertos / len(eventos) if eventos else 1.0
+    return {
+        "eventos": len(eventos),
+        "aciertos": aciertos,
+        "falsos_positivos": falsos,
+        "perdidos": len(eventos) - aciertos,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "demora_media_s": sum(acertados.values()) / aciertos if aciertos else None,
+    }
+
+
+def reproducir(camara, pool, tiempo_real=False, latencia_fija=None):
+    """Pasa un video por el pipeline. Retorna el resultado (dict serializable)."""
+    metricas.reiniciar()
+    ruta = camara["fuente"]
+    # Con prefijo: los clips de cada video se distinguen en el directorio de salida
+    pipeline = PipelineCamara(camara, varias=True, abrir_fuente=cv2.VideoCapture)
+    if not pipeline.abrir():
+        return None
+    clips = []
+    if not pipeline.preparar(pool, clips.append):
+        pipeline.detener()
+        return None
+    pipeline.latencia_fija = latencia_fija
+    pipeline.etapa_grabacion.nombres_por_timestamp = True
+    cap = pipeline.cap
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # abrir() ya leyó el primer fotograma
+    fps = cap.get(cv2.CAP_PROP_FPS) or config.FPS_ESPERADO
+    etapa = pipeline.etapa_grabacion
+    pipeline.codificador.start()  # La captura, la detección y la grabación corren en este hilo
+
+    disparos, grabado = [], []
+    inferencias = 0
+    fotograma = None
+    inicio_grabacion = None
+    inicio = time.perf_counter()
+    while True:
+        ret, imagen = cap.read()
+        if not ret:
+            break
+        timestamp = pipeline.hilo_captura.capturados / fps
+        if tiempo_real:
+            espera = inicio + timestamp - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+        fotograma = pipeline.hilo_captura.preparar(imagen, timestamp)
+        inferencias += pipeline.procesar(fotograma)
+
+        estado, ultima_alerta = etapa.estado_grabacion, etapa.ultima_alerta_tiempo
+        etapa.procesar(fotograma)
+        if etapa.ultima_alerta_tiempo != ultima_alerta:
+            continuacion = estado == "POSTROLL"
+            disparos.append({"t": round(timestamp, 3), "fotograma": fotograma.numero, "continuacion": continuacion})
+            if continuacion:
+                grabado.append([inicio_grabacion, round(timestamp, 3)])
+            inicio_grabacion = round(timestamp, 3)
+        elif estado == "POSTROLL" and etapa.estado_grabacion == "IDLE":
+            grabado.append([inicio_grabacion, round(timestamp, 3)])
+
+    if fotograma is not None and etapa.estado_grabacion == "POSTROLL":
+        # El video terminó con un evento abierto: se entrega el clip hasta el último fotograma
+        etapa.finalizar(fotograma)
+        grabado.append([inicio_grabacion, round(fotograma.timestamp, 3)])
+    segundos = time.perf_counter() - inicio
+    pipeline.detener()  # Espera al codificador: todos los clips quedan escritos
+
+    fotogramas = pipeline.hilo_captura.capturados
+    instantanea = metricas.instantanea()
+    return {
+        "video": ruta,
+        "fps_video": fps,
+        "fotogramas": fotogramas,
+        "segundos_video": fotogramas / fps,
+        "segundos_reales": segundos,
+        "fps": fotogramas / segundos if segundos else 0.0,
+        "inferencias": inferencias,
+        "disparos": disparos,
+        "eventos_grabados": grabado,
+        "clips": [
+            {"video": video, "miniatura": miniatura, "bytes": os.path.getsize(video) if os.path.exists(video) else 0}
+            for video, miniatura in clips
+        ],
+        "etapas": instantanea["etapas"],
+        "contadores": instantanea["contadores"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce videos grabados por el pipeline y genera un reporte.")
+    parser.add_argument("--videos", nargs="+", required=True)
+    parser.add_argument("--tiempo-real", action="store_true", help="Respetar los fps del video en lugar de ir lo más rápido posible")
+    parser.add_argument("--latencia-fija", type=float, default=None,
+                        help="Latencia (ms) que ve el planificador en lugar de la medida: decisiones reproducibles")
+    parser.add_argument("--verdad", help="JSON con los eventos reales de cada video")
+    parser.add_argument("--tolerancia", type=float, default=2.0, help="Margen (s) para emparejar disparos con eventos")
+    parser.add_argument("--salida", default="reproduccion", help="Directorio donde quedan los clips")
+    parser.add_argument("--json", help="Archivo donde guardar el reporte")
+    args = parser.parse_args()
+
+    rutas = [os.path.abspath(r) for r in args.videos]
+    verdad = cargar_verdad(args.verdad) if args.verdad else None
+    ruta_json = os.path.abspath(args.json) if args.json else None
+
+    # Sin ventana, sin DVR ni vista previa; las métricas se toman siempre, sin exportarlas
+    config.MODO_SIN_PANTALLA = True
+    config.MODO_CONTINUO = False
+    config.METRICAS_HABILITADAS = True
+    camaras = normalizar_camaras([{"nombre": os.path.splitext(os.path.basename(r))[0], "fuente": r} for r in rutas])
+    detectores = CargaDetector(config.DETECTORES_POOL, filtros_detector_camaras(camaras))
+    detectores.start()
+    detectores = detectores.esperar()
+    if not detectores:
+        print("No se pudo crear el detector.")
+        return 1
+    pool = PoolDetectores(detectores)
+    os.makedirs(args.salida, exist_ok=True)
+    os.chdir(args.salida)  # Los clips se escriben en el directorio actual, como en vivo
+
+    resultados = []
+    try:
+        for camara in camaras:
+            print(f"\nReproduciendo {camara['fuente']}...")
+            resultado = reproducir(
+                camara, pool, args.tiempo_real,
+                args.latencia_fija / 1000 if args.latencia_fija is not None else None
+            )
+            if resultado is None:
+                print(f"ADVERTENCIA: no se pudo reproducir '{camara['fuente']}'.")
+                continue
+            if verdad is not None:
+                eventos = verdad.get(os.path.basename(camara["fuente"]), [])
+                resultado["verdad"] = comparar([d["t"] for d in resultado["disparos"]], eventos, args.tolerancia)
+            resultados.append(resultado)
+    finally:
+        pool.cerrar()
+
+    total_fotogramas = sum(r["fotogramas"] for r in resultados)
+    total_segundos = sum(r["segundos_reales"] for r in resultados)
+    reporte = {
+        "version": VERSION_REPORTE,
+        "modo": "tiempo_real" if args.tiempo_real else "rapido",
+        "latencia_fija_ms": args.latencia_fija,
+        "videos": resultados,
+        "total": {
+            "fotogramas": total_fotogramas,
+            "segundos_reales": total_segundos,
+            "fps": total_fotogramas / total_segundos if total_segundos else 0.0,
+            "inferencias": sum(r["inferencias"] for r in resultados),
+            "disparos": sum(len(r["disparos"]) for r in resultados),
+            "clips": sum(len(r["clips"]) for r in resultados),
+        },
+    }
+    if verdad is not None:
+        global_ = [r["verdad"] for r in resultados]
+        reporte["total"]["verdad"] = comparar_totales(global_)
+
+    print(f"\n{'Video':<30} {'fotog.':>7} {'fps':>7} {'infer.':>7} {'disparos':>9} {'clips':>6} {'F1':>5}")
+    for r in resultados:
+        f1 = f"{r['verdad']['f1']:.2f}" if "verdad" in r else "-"
+        print(
+            f"{os.path.basename(r['video']):<30} {r['fotogramas']:>7} {r['fps']:>7.1f} {r['inferencias']:>7} "
+            f"{len(r['disparos']):>9} {len(r['clips']):>6} {f1:>5}"
+        )
+    if ruta_json:
+        with open(ruta_json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, indent=2)
+        print(f"\nReporte guardado en {ruta_json}")
+    return 0
+
+
+def comparar_totales(comparaciones):
+    """Suma las comparaciones de cada video en una sola."""
+    aciertos = sum(c["aciertos"] for c in comparaciones)
+    falsos = sum(c["falsos_positivos"] for c in comparaciones)
+    eventos = sum(c["eventos"] for c in comparaciones)
+    precision = aciertos / (aciertos + falsos) if aciertos + falsos else 1.0
+    recall = aciertos / eventos if eventos else 1.0
+    demoras = [(c["demora_media_s"], c["aciertos"]) for c in comparaciones if c["demora_media_s"] is not None]
+    return {
+        "eventos": eventos,
+        "aciertos": aciertos,
+        "falsos_positivos": falsos,
+        "perdidos": eventos - aciertos,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "demora_media_s": sum(d * n for d, n in demoras) / aciertos if aciertos else None,
+    }
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+
+import cv2
+import numpy as np
+
+from scripts import config
+from scripts.codificador import detectar_codec
+
+# Prefijos de los artefactos que acompañan a thumb_<ts>.jpg
+_PREFIJO_HOJA = "hoja_"
+_PREFIJO_ANIMACION = "previa_"
+_codecs = {}  # dimensiones -> códec, para no probar el VideoWriter en cada clip
+
+
+def rutas_artefactos(ruta_thumb):
+    """Hoja de contacto y animación que acompañan a una miniatura, las que existan."""
+    directorio, nombre = os.path.split(ruta_thumb)
+    sufijo = nombre[len("thumb_"):] if nombre.startswith("thumb_") else nombre
+    base = os.path.splitext(sufijo)[0]
+    candidatos = [os.path.join(directorio, _PREFIJO_HOJA + base + ".jpg")]
+    candidatos += [os.path.join(directorio, f"{_PREFIJO_ANIMACION}{base}{ext}") for ext in (".mp4", ".avi")]
+    return [ruta for ruta in candidatos if os.path.exists(ruta)]
+
+
+def ruta_hoja(ruta_thumb):
+    """Hoja de contacto de una miniatura, o None si no se generó."""
+    return next((r for r in rutas_artefactos(ruta_thumb) if os.path.basename(r).startswith(_PREFIJO_HOJA)), None)
+
+
+def ruta_animacion(ruta_thumb):
+    """Animación de vista previa de una miniatura, o None si no se generó."""
+    return next((r for r in rutas_artefactos(ruta_thumb) if os.path.basename(r).startswith(_PREFIJO_ANIMACION)), None)
+
+
+class ResumenClip:
+    """Hoja de contacto y animación corta de un clip, armadas mientras se graba.
+
+    La etapa de grabación pasa cada fotograma que entra al clip a agregar().
+    Como el largo del clip no se conoce de antemano (los eventos se
+    extienden), la hoja guarda miniaturas cada `paso` fotogramas y, cuando
+    junta el doble de las que necesita, descarta una de cada dos y duplica
+    el paso: siempre quedan muestras repartidas a lo largo de todo el clip.
+    La animación se escribe a baja resolución y pocos fps desde el primer
+    fotograma, hasta SEGUNDOS_ANIMACION. Al cerrar solo queda componer la
+    grilla y cerrar el archivo: nada se vuelve a leer del disco.
+    """
+
+    def __init__(self, timestamp_str, dimensiones):
+        self.columnas, self.filas = config.GRILLA_HOJA_CONTACTO
+        self.ruta_hoja = f"{_PREFIJO_HOJA}{timestamp_str}.jpg"
+        self._base_animacion = f"{_PREFIJO_ANIMACION}{timestamp_str}"
+        self._posicion = 0
+
+        ancho, alto = dimensiones
+        self._dims_miniatura = (config.ANCHO_MINIATURA_HOJA, max(2, int(config.ANCHO_MINIATURA_HOJA * alto / ancho)))
+        self._paso = 1
+        self._miniaturas = []  # (posición en el clip, imagen reducida)
+
+        ancho_animacion = config.ANCHO_ANIMACION - config.ANCHO_ANIMACION % 2
+        self._dims_animacion = (ancho_animacion, max(2, int(ancho_animacion * alto / ancho)) // 2 * 2)
+        self._paso_animacion = max(1, round(config.FPS_ESPERADO / config.FPS_ANIMACION))
+        self._max_cuadros_animacion = int(config.FPS_ANIMACION * config.SEGUNDOS_ANIMACION)
+        self._cuadros_animacion = 0
+        self._animacion = None
+        self.ruta_animacion = None
+
+    def agregar(self, imagen_bgr):
+        posicion = self._posicion
+        self._posicion += 1
+
+        if posicion % self._paso == 0:
+            self._miniaturas.append(
+                (posicion, cv2.resize(imagen_bgr, self._dims_miniatura, interpolation=cv2.INTER_AREA))
+            )
+            if len(self._miniaturas) >= 2 * self.columnas * self.filas:
+                self._miniaturas = self._miniaturas[::2]
+                self._paso *= 2
+
+        if self._cuadros_animacion < self._max_cuadros_animacion and posicion % self._paso_animacion == 0:
+            if self._animacion is None and not self._abrir_animacion():
+                self._max_cuadros_animacion = 0
+                return
+            self._animacion.write(cv2.resize(imagen_bgr, self._dims_animacion, interpolation=cv2.INTER_AREA))
+            self._cuadros_animacion += 1
+
+    def cerrar(self):
+        """Escribe la hoja de contacto y cierra la animación. Retorna las rutas generadas."""
+        rutas = []
+        if self._animacion is not None:
+            self._animacion.release()
+            self._animacion = None
+            rutas.append(self.ruta_animacion)
+        if self._miniaturas:
+            cv2.imwrite(self.ruta_hoja, self._componer_hoja())
+            rutas.append(self.ruta_hoja)
+        self._miniaturas = []
+        return rutas
+
+    def descartar(self):
+        for ruta in self.cerrar():
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _abrir_animacion(self):
+        codec = _codecs.get(self._dims_animacion)
+        if codec is None:
+            codec = _codecs[self._dims_animacion] = detectar_codec(self._dims_animacion, config.FPS_ANIMACION)
+        if codec is None:
+            return False
+        self.ruta_animacion = self._base_animacion + codec[1]
+        self._animacion = cv2.VideoWriter(
+            self.ruta_animacion, cv2.VideoWriter.fourcc(*codec[0]), config.FPS_ANIMACION, self._dims_animacion
+        )
+        return self._animacion.isOpened()
+
+    def _componer_hoja(self):
+        cantidad = min(len(self._miniaturas), self.columnas * self.filas)
+        elegidas = [self._miniaturas[i] for i in np.linspace(0, len(self._miniaturas) - 1, cantidad).round().astype(int)]
+        ancho, alto = self._dims_miniatura
+        filas = -(-cantidad // self.columnas)
+        hoja = np.zeros((filas * alto, self.columnas * ancho, 3), np.uint8)
+        for i, (posicion, miniatura) in enumerate(elegidas):
+            y, x = (i // self.columnas) * alto, (i % self.columnas) * ancho
+            hoja[y:y + alto, x:x + ancho] = miniatura
+            cv2.putText(hoja, f"{posicion / config.FPS_ESPERADO:.1f}s", (x + 4, y + alto - 6),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
+        return hoja
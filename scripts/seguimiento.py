@@ -0,0 +1,169 @@
+import itertools
+
+import cv2
+import numpy as np
+
+from scripts import config
+
+
+def iou(a, b):
+    """Intersección sobre unión de dos cajas (x, y, ancho, alto)."""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    interseccion = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - interseccion
+    return interseccion / union if union > 0 else 0.0
+
+
+class Pista:
+    """Objeto seguido entre fotogramas."""
+
+    def __init__(self, id_pista, deteccion, timestamp):
+        self.id = id_pista
+        self.caja = [float(deteccion.x), float(deteccion.y), float(deteccion.ancho), float(deteccion.alto)]
+        self.deteccion = deteccion
+        self.velocidad = (0.0, 0.0)      # píxeles/segundo del centro de la caja
+        self.ultima_deteccion = timestamp
+        self.ultimo_timestamp = timestamp
+        self.golpes = 1
+        self.confirmada = False
+
+    def centro(self):
+        return self.caja[0] + self.caja[2] / 2, self.caja[1] + self.caja[3] / 2
+
+    def como_deteccion(self):
+        x, y, ancho, alto = (int(round(v)) for v in self.caja)
+        return self.deteccion._replace(x=x, y=y, ancho=ancho, alto=alto, pista=self.id)
+
+
+class SeguidorObjetos:
+    """Seguidor liviano por IoU/centroide, opcionalmente con flujo óptico disperso.
+
+    En cada inferencia asocia las detecciones con las pistas existentes
+    (misma categoría, mayor IoU primero y, si no se superponen, centroide
+    cercano) y crea pistas nuevas con las que quedan sueltas. Entre
+    inferencias las cajas se propagan con la velocidad estimada o, con
+    FLUJO_OPTICO_SEGUIMIENTO, con el desplazamiento mediano de puntos
+    seguidos por Lucas-Kanade. Una pista "nace" cuando acumula
+    GOLPES_CONFIRMAR_PISTA detecciones; las alertas se disparan con los
+    nacimientos, no con cada detección suelta.
+    """
+
+    def __init__(self):
+        self.umbral_iou = config.UMBRAL_IOU_SEGUIMIENTO
+        self.distancia_centroide = config.DISTANCIA_CENTROIDE_SEGUIMIENTO
+        self.segundos_vida = config.SEGUNDOS_VIDA_PISTA
+        self.golpes_confirmar = config.GOLPES_CONFIRMAR_PISTA
+        self.flujo_optico = config.FLUJO_OPTICO_SEGUIMIENTO
+
+        self._pistas = []
+        self._ids = itertools.count(1)
+        self._gris_anterior = None
+        self.nacimientos = 0
+
+    def actualizar(self, detecciones, timestamp, imagen_bgr=None):
+        """Incorpora las detecciones de un fotograma inferido.
+
+        Retorna (detecciones, nacidas): las detecciones con su `pista`
+        asignada y las que corresponden a pistas que se confirmaron ahora.
+        """
+        self.predecir(timestamp, imagen_bgr)
+
+        candidatos = []
+        for i, pista in enumerate(self._pistas):
+            cx, cy = pista.centro()
+            limite = self.distancia_centroide * max(pista.caja[2], pista.caja[3])
+            for j, d in enumerate(detecciones):
+                if d.categoria != pista.deteccion.categoria:
+                    continue
+                solapamiento = iou(pista.caja, (d.x, d.y, d.ancho, d.alto))
+                distancia = np.hypot(d.x + d.ancho / 2 - cx, d.y + d.alto / 2 - cy)
+                if solapamiento >= self.umbral_iou or distancia <= limite:
+                    candidatos.append((solapamiento, -distancia, i, j))
+
+        asignadas, usadas = {}, set()
+        for _, _, i, j in sorted(candidatos, reverse=True):
+            if i in usadas or j in asignadas:
+                continue
+            asignadas[j] = self._pistas[i]
+            usadas.add(i)
+
+        resultado, nacidas = [], []
+        for j, d in enumerate(detecciones):
+            pista = asignadas.get(j)
+            if pista is None:
+                pista = Pista(next(self._ids), d, timestamp)
+                self._pistas.append(pista)
+            else:
+                self._corregir(pista, d, timestamp)
+            if not pista.confirmada and pista.golpes >= self.golpes_confirmar:
+                pista.confirmada = True
+                self.nacimientos += 1
+                nacidas.append(pista.como_deteccion())
+            resultado.append(d._replace(pista=pista.id))
+
+        self._pistas = [p for p in self._pistas if timestamp - p.ultima_deteccion <= self.segundos_vida]
+        return resultado, nacidas
+
+    def predecir(self, timestamp, imagen_bgr=None):
+        """Propaga las pistas hasta `timestamp` en un fotograma sin inferencia."""
+        gris = None
+        if self.flujo_optico and imagen_bgr is not None:
+            gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
+
+        for pista in self._pistas:
+            dt = timestamp - pista.ultimo_timestamp
+            if dt <= 0:
+                continue
+            desplazamiento = None
+            if gris is not None and self._gris_anterior is not None:
+                desplazamiento = self._flujo(pista, self._gris_anterior, gris)
+            if desplazamiento is None:
+                desplazamiento = (pista.velocidad[0] * dt, pista.velocidad[1] * dt)
+            pista.caja[0] += desplazamiento[0]
+            pista.caja[1] += desplazamiento[1]
+            pista.ultimo_timestamp = timestamp
+
+        if gris is not None:
+            self._gris_anterior = gris
+
+    def pistas(self):
+        """Pistas confirmadas como Deteccion (con `pista`), para dibujar y anotar."""
+        return [p.como_deteccion() for p in self._pistas if p.confirmada]
+
+    def _corregir(self, pista, deteccion, timestamp):
+        """Reemplaza la caja predicha por la detectada y actualiza la velocidad."""
+        cx_anterior, cy_anterior = pista.centro()
+        dt = timestamp - pista.ultima_deteccion
+        pista.caja = [float(deteccion.x), float(deteccion.y), float(deteccion.ancho), float(deteccion.alto)]
+        if dt > 0:
+            cx, cy = pista.centro()
+            # La posición anterior ya incluía la predicción: se corrige la velocidad con el residuo
+            vx = pista.velocidad[0] + (cx - cx_anterior) / dt
+            vy = pista.velocidad[1] + (cy - cy_anterior) / dt
+            pista.velocidad = (0.5 * pista.velocidad[0] + 0.5 * vx, 0.5 * pista.velocidad[1] + 0.5 * vy)
+        pista.deteccion = deteccion
+        pista.ultima_deteccion = timestamp
+        pista.ultimo_timestamp = timestamp
+        pista.golpes += 1
+
+    @staticmethod
+    def _flujo(pista, gris_anterior, gris):
+        """Desplazamiento mediano de puntos característicos dentro de la caja, o None."""
+        alto_img, ancho_img = gris.shape
+        x, y, ancho, alto = (int(v) for v in pista.caja)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(ancho_img, x + ancho), min(alto_img, y + alto)
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        mascara = np.zeros_like(gris_anterior)
+        mascara[y0:y1, x0:x1] = 255
+        puntos = cv2.goodFeaturesToTrack(gris_anterior, maxCorners=20, qualityLevel=0.01, minDistance=3, mask=mascara)
+        if puntos is None:
+            return None
+        nuevos, estado, _ = cv2.calcOpticalFlowPyrLK(gris_anterior, gris, puntos, None, winSize=(15, 15), maxLevel=2)
+        validos = estado.reshape(-1) == 1
+        if not validos.any():
+            return None
+        delta = (nuevos.reshape(-1, 2) - puntos.reshape(-1, 2))[validos]
+        return float(np.median(delta[:, 0])), float(np.median(delta[:, 1]))
@@ -0,0 +1,189 @@
+"""Servidor HTTP local que imita los endpoints de Discord y Telegram.
+
+Permite probar el envío de alertas sin conexión a Internet. Ejecutado como
+script lanza una ráfaga de alertas a través del DespachadorNotificaciones y
+verifica que las conexiones se reutilicen y que no se supere el límite de
+subidas simultáneas:
+
+    python -m scripts.servidor_prueba --alertas 10 --demora 0.2
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ManejadorPrueba(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive: permite observar la reutilización de conexiones
+
+    def setup(self):
+        super().setup()
+        self.server.registrar_conexion()
+
+    def do_POST(self):
+        servidor = self.server
+        largo = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(largo)
+
+        servidor.entrar()
+        try:
+            if servidor.demora:
+                time.sleep(servidor.demora)
+            codigo = servidor.siguiente_codigo()
+        finally:
+            servidor.salir()
+
+        servidor.registrar_pedido(self.path, largo, codigo)
+        if self.path.startswith("/bot"):
+            cuerpo = json.dumps({"ok": 200 <= codigo < 300}).encode("utf-8")
+        else:
+            cuerpo = b"" if codigo == 204 else json.dumps({"message": "error simulado"}).encode("utf-8")
+
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass  # Silencioso: las estadísticas se consultan con estadisticas()
+
+
+class ServidorPrueba(ThreadingHTTPServer):
+    """Imita el webhook de Discord (/webhook) y la API de bots de Telegram (/bot<token>/...).
+
+    Args:
+        demora: Segundos que tarda cada respuesta (simula una subida lenta)
+        fallos: Cantidad de pedidos iniciales que responden con error 503
+    """
+
+    daemon_threads = True
+
+    def __init__(self, demora=0.0, fallos=0):
+        super().__init__(("127.0.0.1", 0), _ManejadorPrueba)
+        self.demora = demora
+        self._fallos_pendientes = fallos
+        self._lock = threading.Lock()
+        self._en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.conexiones = 0
+        self.pedidos = []
+        self._hilo = None
+
+    @property
+    def url_base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.serve_forever, name="servidor_prueba", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+    def registrar_conexion(self):
+        with self._lock:
+            self.conexiones += 1
+
+    def registrar_pedido(self, ruta, largo, codigo):
+        with self._lock:
+            self.pedidos.append((ruta, largo, codigo))
+
+    def entrar(self):
+        with self._lock:
+            self._en_vuelo += 1
+            self.max_en_vuelo = max(self.max_en_vuelo, self._en_vuelo)
+
+    def salir(self):
+        with self._lock:
+            self._en_vuelo -= 1
+
+    def siguiente_codigo(self):
+        with self._lock:
+            if self._fallos_pendientes > 0:
+                self._fallos_pendientes -= 1
+                return 503
+        return 200
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "pedidos": len(self.pedidos),
+                "conexiones": self.conexiones,
+                "max_en_vuelo": self.max_en_vuelo,
+                "errores": sum(1 for _, _, codigo in self.pedidos if codigo >= 300),
+            }
+
+
+def escribir_credenciales(servidor, directorio):
+    """Genera un credentials.json que apunta ambos servicios al servidor local."""
+    ruta = os.path.join(directorio, "credentials.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({
+            "discord": {"webhook_url": f"{servidor.url_base}/webhook"},
+            "telegram": {"bot_token": "123:prueba", "chat_id": "1", "api_url": servidor.url_base},
+        }, f)
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba offline del despachador de notificaciones.")
+    parser.add_argument("--alertas", type=int, default=8, help="Cantidad de alertas a enviar en ráfaga")
+    parser.add_argument("--demora", type=float, default=0.2, help="Segundos de demora por respuesta")
+    parser.add_argument("--tamano-kb", type=int, default=256, help="Tamaño del video simulado")
+    args = parser.parse_args()
+
+    servidor = ServidorPrueba(demora=args.demora).iniciar()
+    directorio = tempfile.mkdtemp(prefix="cctv_prueba_")
+    # La configuración se lee al importar: hay que apuntarla al servidor antes de importar los notificadores
+    os.environ["CCTV_CREDENTIALS"] = escribir_credenciales(servidor, directorio)
+
+    from scripts import config
+    from scripts.despachador import DespachadorNotificaciones
+    from scripts.discord_notifier import enviar_alerta_discord_con_video
+    from scripts.telegram_notifier import enviar_alerta_telegram_con_video
+
+    despachador = DespachadorNotificaciones()
+    futuros = []
+    inicio = time.perf_counter()
+    for i in range(args.alertas):
+        ruta_video = os.path.join(directorio, f"alerta_{i}.mp4")
+        ruta_thumb = os.path.join(directorio, f"thumb_{i}.jpg")
+        with open(ruta_video, "wb") as f:
+            f.write(os.urandom(args.tamano_kb * 1024))
+        with open(ruta_thumb, "wb") as f:
+            f.write(os.urandom(1024))
+        futuros.append(despachador.enviar("discord", enviar_alerta_discord_con_video, ruta_video, ruta_thumb))
+        futuros.append(despachador.enviar("telegram", enviar_alerta_telegram_con_video, ruta_video, ruta_thumb))
+
+    for futuro in futuros:
+        futuro.result()
+    duracion = time.perf_counter() - inicio
+    despachador.cerrar()
+    servidor.detener()
+    shutil.rmtree(directorio, ignore_errors=True)
+
+    e = servidor.estadisticas()
+    print(
+        f"\n{e['pedidos']} pedidos en {duracion:.2f} s, {e['conexiones']} conexiones TCP, "
+        f"máximo {e['max_en_vuelo']} en vuelo (límite {config.MAX_ENVIOS_SIMULTANEOS}), {e['errores']} errores."
+    )
+
+    correcto = (
+        e["pedidos"] == len(futuros)
+        and e["max_en_vuelo"] <= config.MAX_ENVIOS_SIMULTANEOS
+        and e["conexiones"] < e["pedidos"]
+    )
+    print("OK" if correcto else "FALLÓ")
+    return 0 if correcto else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
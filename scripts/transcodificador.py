@@ -0,0 +1,343 @@
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+from scripts import config
+from scripts.codificador import detectar_codec
+
+# Versiones reducidas ya generadas: (ruta_video, limite_bytes) -> ruta o None si no se pudo,
+# y (ruta_video, limite_bytes, "partes") -> lista de rutas o None
+_cache = {}
+_locks = {}
+_lock_global = threading.Lock()
+
+
+def limite_mas_estricto():
+    """Límite de tamaño (bytes) más chico entre los servicios configurados, o None."""
+    limites = []
+    if config.WEBHOOK_URL:
+        limites.append(config.LIMITE_MB_DISCORD)
+    if config.TELEGRAM_BOT_TOKEN and config.TELEGRAM_CHAT_ID:
+        limites.append(config.LIMITE_MB_TELEGRAM)
+    return min(limites) if limites else None
+
+
+def partes_para_limite(ruta_video, limite_bytes=None):
+    """Retorna el clip dividido en partes que entran en `limite_bytes` (por
+    defecto, el límite más estricto de los servicios configurados).
+
+    Un clip que ya entra se retorna como [ruta_video]. Uno más grande se
+    corta en hasta MAX_PARTES_CLIP partes de duración parecida (con ffmpeg,
+    sin re-codificar y en fotogramas clave) y las partes que aún no entran
+    se re-codifican con transcodificar(): un evento largo se envía en varias
+    partes a buena calidad en lugar de un único video muy comprimido. Se hace una sola vez
+    por clip: si dos servicios lo piden a la vez, el segundo espera y recibe
+    las mismas partes. Retorna None si alguna parte no se pudo reducir lo
+    suficiente.
+    """
+    limite_bytes = limite_bytes or limite_mas_estricto()
+    if limite_bytes is None or os.path.getsize(ruta_video) <= limite_bytes:
+        return [ruta_video]
+
+    clave = (ruta_video, limite_bytes, "partes")
+    with _lock_global:
+        lock = _locks.setdefault(clave, threading.Lock())
+    with lock:
+        if clave not in _cache:
+            _cache[clave] = _partir(ruta_video, limite_bytes)
+        return _cache[clave]
+
+
+def limpiar(ruta_video):
+    """Borra las versiones reducidas y las partes de un clip y las olvida del cache."""
+    with _lock_global:
+        claves = [clave for clave in _cache if clave[0] == ruta_video]
+        for clave in claves:
+            rutas = _cache.pop(clave)
+            _locks.pop(clave, None)
+            for ruta in rutas or []:
+                if ruta and ruta != ruta_video and os.path.exists(ruta):
+                    os.remove(ruta)
+
+
+def _partir(ruta_video, limite_bytes):
+    cantidad = min(
+        config.MAX_PARTES_CLIP,
+        math.ceil(os.path.getsize(ruta_video) / (limite_bytes * config.MARGEN_TRANSCODIFICACION))
+    )
+    if cantidad <= 1:
+        ruta = transcodificar(ruta_video, limite_bytes)
+        return [ruta] if ruta is not None else None
+
+    partes = _cortar(ruta_video, cantidad)
+    if partes is None:
+        return None
+    resultado = []
+    for parte in partes:
+        if os.path.getsize(parte) > limite_bytes:
+            reducida = transcodificar(parte, limite_bytes)
+            os.remove(parte)
+            parte = reducida
+        if parte is None:
+            for ruta in resultado + partes:
+                if ruta and os.path.exists(ruta):
+                    os.remove(ruta)
+            return None
+        resultado.append(parte)
+    print(f"'{os.path.basename(ruta_video)}' dividido en {len(resultado)} partes para el límite de "
+          f"{limite_bytes / (1024 * 1024):.0f}MB.")
+    return resultado
+
+
+def _cortar(ruta_video, cantidad):
+    """Corta el clip en hasta `cantidad` partes de duración parecida. Retorna sus rutas o None."""
+    ancho, alto, fps, fotogramas = leer_propiedades(ruta_video)
+    if not ancho or not fotogramas:
+        print(f"División: no se pudo leer '{ruta_video}'.")
+        return None
+    base, extension = os.path.splitext(ruta_video)
+    por_parte = math.ceil(fotogramas / cantidad)
+
+    if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+        return _cortar_ffmpeg(ruta_video, cantidad, fotogramas / fps)
+
+    # Sin ffmpeg: se re-escriben los fotogramas con OpenCV, cambiando de archivo cada `por_parte`
+    codec = detectar_codec((ancho, alto), fps)
+    if codec is None:
+        return None
+    partes = []
+    cap = cv2.VideoCapture(ruta_video)
+    video_out = None
+    try:
+        indice = 0
+        while True:
+            ret, fotograma = cap.read()
+            if not ret:
+                break
+            if indice % por_parte == 0:
+                if video_out is not None:
+                    video_out.release()
+                partes.append(f"{base}_parte{len(partes) + 1}{codec[1]}")
+                video_out = cv2.VideoWriter(partes[-1], cv2.VideoWriter.fourcc(*codec[0]), fps, (ancho, alto))
+            video_out.write(fotograma)
+            indice += 1
+    finally:
+        cap.release()
+        if video_out is not None:
+            video_out.release()
+    return partes or None
+
+
+def _cortar_ffmpeg(ruta_video, cantidad, duracion):
+    """Corta sin re-codificar, solo en fotogramas clave: con -c copy una parte
+    no puede empezar en otro fotograma (quedaría indecodificable hasta el
+    siguiente clave). Cada corte es el fotograma clave más cercano a su
+    posición ideal y el muxer de segmentos escribe todas las partes de una
+    pasada, así que se suceden sin huecos ni fotogramas repetidos. Con pocos
+    fotogramas clave salen menos partes que `cantidad`."""
+    claves = _instantes_clave(ruta_video)
+    if not claves:
+        print(f"División: no se pudieron leer los fotogramas clave de '{ruta_video}'.")
+        return None
+    cortes = []
+    for i in range(1, cantidad):
+        clave = min(claves, key=lambda t: abs(t - i * duracion / cantidad))
+        if clave > (cortes[-1] if cortes else claves[0]):
+            cortes.append(clave)
+
+    base, extension = os.path.splitext(ruta_video)
+    partes = [f"{base}_parte{i + 1}{extension}" for i in range(len(cortes) + 1)]
+    comando = [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", ruta_video, "-map", "0", "-c", "copy",
+        "-f", "segment", "-segment_start_number", "1", "-reset_timestamps", "1"
+    ]
+    if cortes:
+        # El muxer corta en el primer fotograma clave desde cada instante: un milisegundo
+        # antes evita que el redondeo del instante lo mande al clave siguiente
+        comando += ["-segment_times", ",".join(f"{max(0.0, t - 0.001):.6f}" for t in cortes)]
+    comando.append(f"{base}_parte%d{extension}")
+    resultado = subprocess.run(comando, capture_output=True, text=True)
+    if resultado.returncode != 0 or not all(os.path.exists(ruta) for ruta in partes):
+        print(f"ffmpeg: {resultado.stderr.strip()}")
+        for ruta in partes:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        return None
+    return partes
+
+
+def _instantes_clave(ruta_video):
+    """Instantes (s) de los fotogramas clave del video según ffprobe, en orden, o None."""
+    comando = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", ruta_video
+    ]
+    resultado = subprocess.run(comando, capture_output=True, text=True)
+    if resultado.returncode != 0:
+        print(f"ffprobe: {resultado.stderr.strip()}")
+        return None
+    instantes = []
+    for linea in resultado.stdout.splitlines():
+        instante, _, banderas = linea.partition(",")
+        if banderas.startswith("K") and instante not in ("", "N/A"):
+            instantes.append(float(instante))
+    return sorted(instantes)
+
+
+def leer_propiedades(ruta_video):
+    """Retorna (ancho, alto, fps, fotogramas) del clip."""
+    cap = cv2.VideoCapture(ruta_video)
+    try:
+        ancho = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        alto = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or config.FPS_ESPERADO
+        fotogramas = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return ancho, alto, fps, fotogramas
+    finally:
+        cap.release()
+
+
+def elegir_parametros(ancho, alto, fps, duracion, limite_bytes):
+    """Elige (bitrate, ancho, alto, fps) para que el clip entre en el límite.
+
+    El bitrate sale del límite y la duración (con un margen para el
+    contenedor). Si con ese bitrate quedarían muy pocos bits por píxel, se
+    baja primero la tasa de cuadros y después la resolución, hasta los mínimos
+    configurados.
+    """
+    bitrate = int(limite_bytes * 8 * config.MARGEN_TRANSCODIFICACION / max(duracion, 0.1))
+    fps_salida = fps
+    ancho_salida, alto_salida = ancho, alto
+
+    def bits_por_pixel():
+        return bitrate / (ancho_salida * alto_salida * fps_salida)
+
+    while bits_por_pixel() < config.BITS_POR_PIXEL_MINIMO:
+        if fps_salida > config.FPS_MINIMO_TRANSCODIFICACION:
+            fps_salida = max(config.FPS_MINIMO_TRANSCODIFICACION, fps_salida * 0.75)
+        elif ancho_salida > config.ANCHO_MINIMO_TRANSCODIFICACION:
+            ancho_salida = max(config.ANCHO_MINIMO_TRANSCODIFICACION, int(ancho_salida * 0.75))
+            alto_salida = int(alto * ancho_salida / ancho)
+        else:
+            break
+
+    # Los códecs de video suelen exigir dimensiones pares
+    return bitrate, ancho_salida - ancho_salida % 2, alto_salida - alto_salida % 2, fps_salida
+
+
+def transcodificar(ruta_video, limite_bytes):
+    """Re-codifica el clip para que entre en `limite_bytes`. Retorna la ruta nueva o None."""
+    ancho, alto, fps, fotogramas = leer_propiedades(ruta_video)
+    if not ancho or not fotogramas:
+        print(f"Transcodificación: no se pudo leer '{ruta_video}'.")
+        return None
+
+    duracion = fotogramas / fps
+    bitrate, ancho_salida, alto_salida, fps_salida = elegir_parametros(ancho, alto, fps, duracion, limite_bytes)
+    base = f"{os.path.splitext(ruta_video)[0]}_{limite_bytes // (1024 * 1024)}mb"
+
+    inicio = time.perf_counter()
+    if shutil.which("ffmpeg"):
+        ruta_salida = _transcodificar_ffmpeg(ruta_video, base, bitrate, ancho_salida, fps_salida)
+    else:
+        ruta_salida, ancho_salida, alto_salida = _buscar_escala_opencv(
+            ruta_video, base, ancho_salida, alto_salida, fps, fps_salida, limite_bytes
+        )
+
+    if ruta_salida is None or not os.path.exists(ruta_salida):
+        print(f"Transcodificación de '{ruta_video}' fallida.")
+        return None
+
+    tamano = os.path.getsize(ruta_salida)
+    print(
+        f"Transcodificado '{os.path.basename(ruta_video)}' a {ancho_salida}x{alto_salida} @ {fps_salida:.1f} fps, "
+        f"{tamano / (1024 * 1024):.2f}MB en {time.perf_counter() - inicio:.1f} s "
+        f"(límite {limite_bytes / (1024 * 1024):.0f}MB)."
+    )
+    if tamano > limite_bytes:
+        os.remove(ruta_salida)
+        return None
+    return ruta_salida
+
+
+def _buscar_escala_opencv(ruta_video, base, ancho, alto, fps_entrada, fps_salida, limite_bytes):
+    """Sin control de bitrate, busca la escala más grande cuyo resultado entre en el límite.
+
+    El primer salto se estima con la raíz del sobrante (el tamaño crece más o
+    menos con la cantidad de píxeles); después se bisecta entre la mayor
+    escala que entró y la menor que no. Retorna (ruta, ancho, alto) del mejor
+    intento que entró, o (None, ancho, alto).
+    """
+    escala, escala_entra, escala_no_entra = 1.0, 0.0, None
+    mejor = (None, ancho, alto)
+    for intento in range(config.INTENTOS_TRANSCODIFICACION):
+        ancho_intento = max(2, int(ancho * escala) // 2 * 2)
+        alto_intento = max(2, int(alto * escala) // 2 * 2)
+        ruta = _transcodificar_opencv(ruta_video, f"{base}_{intento}", ancho_intento, alto_intento, fps_entrada, fps_salida)
+        if ruta is None:
+            break
+        tamano = os.path.getsize(ruta)
+
+        if tamano <= limite_bytes:
+            if mejor[0] is not None:
+                os.remove(mejor[0])
+            mejor = (ruta, ancho_intento, alto_intento)
+            escala_entra = escala
+            if escala_no_entra is None or tamano >= limite_bytes * config.MARGEN_TRANSCODIFICACION * 0.75:
+                break  # Entra a resolución completa, o ya está suficientemente cerca del límite
+            escala = (escala_entra + escala_no_entra) / 2
+        else:
+            os.remove(ruta)
+            escala_no_entra = escala
+            if mejor[0] is None:
+                escala = escala * (limite_bytes * config.MARGEN_TRANSCODIFICACION / tamano) ** 0.5
+            else:
+                escala = (escala_entra + escala_no_entra) / 2
+    return mejor
+
+
+def _transcodificar_ffmpeg(entrada, base_salida, bitrate, ancho, fps):
+    salida = base_salida + ".mp4"
+    comando = [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", entrada,
+        "-vf", f"scale={ancho}:-2,fps={fps:.3f}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-b:v", str(bitrate), "-maxrate", str(bitrate), "-bufsize", str(bitrate * 2),
+        "-movflags", "+faststart", "-an", salida
+    ]
+    resultado = subprocess.run(comando, capture_output=True, text=True)
+    if resultado.returncode != 0:
+        print(f"ffmpeg: {resultado.stderr.strip()}")
+        return None
+    return salida
+
+
+def _transcodificar_opencv(entrada, base_salida, ancho, alto, fps_entrada, fps_salida):
+    """Sin ffmpeg no se puede fijar el bitrate: solo se bajan resolución y tasa de cuadros."""
+    codec = detectar_codec((ancho, alto), fps_salida)
+    if codec is None:
+        return None
+    salida = base_salida + codec[1]
+    cap = cv2.VideoCapture(entrada)
+    video_out = cv2.VideoWriter(salida, cv2.VideoWriter.fourcc(*codec[0]), fps_salida, (ancho, alto))
+    try:
+        paso = fps_entrada / fps_salida
+        siguiente = 0.0
+        indice = 0
+        while True:
+            ret, fotograma = cap.read()
+            if not ret:
+                break
+            if indice >= siguiente:
+                video_out.write(cv2.resize(fotograma, (ancho, alto), interpolation=cv2.INTER_AREA))
+                siguiente += paso
+            indice += 1
+        return salida if video_out.isOpened() else None
+    finally:
+        cap.release()
+        video_out.release()
@@ -0,0 +1,131 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from scripts import config
+from scripts import metricas
+
+_LIMITE = b"fotograma"
+
+
+class _ManejadorVistaPrevia(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/stream.mjpg"):
+            self.send_error(404)
+            return
+        vista = self.server.vista_previa
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={_LIMITE.decode()}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        vista.cliente_conectado()
+        try:
+            ultimo = -1
+            intervalo = 1.0 / config.FPS_MAX_VISTA_PREVIA
+            while True:
+                inicio = time.monotonic()
+                numero, jpeg = vista.siguiente_jpeg(ultimo)
+                if jpeg is None:
+                    break
+                ultimo = numero
+                # write() bloquea mientras el cliente no lee: un cliente lento recibe menos cuadros
+                self.wfile.write(
+                    b"--" + _LIMITE + b"\r\nContent-Type: image/jpeg\r\n"
+                    + f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n"
+                )
+                espera = intervalo - (time.monotonic() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            vista.cliente_desconectado()
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorVistaPrevia:
+    """Vista previa MJPEG por HTTP (http://<equipo>:<puerto>/stream.mjpg).
+
+    El bucle principal publica cada fotograma con publicar(), que sin
+    clientes conectados no hace nada. Los JPEG se codifican en los hilos de
+    los clientes, a lo sumo uno por fotograma publicado (compartido entre
+    clientes) y a no más de FPS_MAX_VISTA_PREVIA; cada cliente toma siempre
+    el fotograma más reciente, así que el ritmo lo marca el más lento de
+    leer sin frenar al pipeline.
+    """
+
+    def __init__(self, puerto=None, host="0.0.0.0"):
+        self.puerto = puerto or config.PUERTO_VISTA_PREVIA
+        self._servidor = ThreadingHTTPServer((host, self.puerto), _ManejadorVistaPrevia)
+        self._servidor.daemon_threads = True
+        self._servidor.vista_previa = self
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="vista_previa", daemon=True)
+
+        self._condicion = threading.Condition()
+        self._clientes = 0
+        self._imagen = None
+        self._numero = 0
+        self._jpeg = None           # (numero, bytes) del último fotograma codificado
+        self._detenido = False
+        self.codificados = 0
+
+    def iniciar(self):
+        self._hilo.start()
+        print(f"Vista previa en http://{self._servidor.server_address[0]}:{self.puerto}/stream.mjpg")
+        return self
+
+    def detener(self):
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def hay_clientes(self):
+        return self._clientes > 0
+
+    def publicar(self, imagen_bgr):
+        """Ofrece el fotograma a los clientes. La imagen no debe modificarse después."""
+        if not self._clientes:
+            return
+        with self._condicion:
+            self._imagen = imagen_bgr
+            self._numero += 1
+            self._condicion.notify_all()
+
+    # --- Usado por los manejadores ---
+
+    def cliente_conectado(self):
+        with self._condicion:
+            self._clientes += 1
+
+    def cliente_desconectado(self):
+        with self._condicion:
+            self._clientes -= 1
+            if not self._clientes:
+                self._imagen = None  # No retener el último fotograma sin nadie mirando
+
+    def siguiente_jpeg(self, ultimo):
+        """Espera un fotograma posterior a `ultimo` y retorna (numero, jpeg), o (None, None) al detener."""
+        with self._condicion:
+            while not self._detenido and (self._imagen is None or self._numero == ultimo):
+                self._condicion.wait()
+            if self._detenido:
+                return None, None
+            if self._jpeg is not None and self._jpeg[0] == self._numero:
+                return self._jpeg
+            numero, imagen = self._numero, self._imagen
+
+        inicio = time.perf_counter()
+        ok, jpeg = cv2.imencode(".jpg", imagen, [cv2.IMWRITE_JPEG_QUALITY, config.CALIDAD_JPEG_VISTA_PREVIA])
+        metricas.observar("vista_previa_jpeg", time.perf_counter() - inicio)
+        jpeg = jpeg.tobytes() if ok else b""
+        with self._condicion:
+            self.codificados += 1
+            self._jpeg = (numero, jpeg)
+        return numero, jpeg
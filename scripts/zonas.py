@@ -0,0 +1,189 @@
+import cv2
+import numpy as np
+
+from scripts import config
+
+
+class Zona:
+    """Zona de interés: polígono en coordenadas normalizadas (0..1) con sus propias reglas.
+
+    Args:
+        nombre: identificador de la zona (aparece en los logs y en las detecciones)
+        poligono: lista de vértices (x, y) relativos al ancho y alto de la imagen
+        categorias: categorías que pueden disparar en esta zona, o None para todas
+        umbral: confianza mínima (por defecto UMBRAL_CONFIANZA_OBJETO)
+        cooldown: segundos entre alertas de esta zona (por defecto COOLDOWN_SEGUNDOS)
+        activa: las zonas inactivas no se recortan ni disparan
+    """
+
+    def __init__(self, nombre, poligono, categorias=None, umbral=None, cooldown=None, activa=True):
+        if len(poligono) < 3:
+            raise ValueError(f"La zona '{nombre}' necesita al menos 3 vértices.")
+        self.nombre = nombre
+        self.poligono = [(float(x), float(y)) for x, y in poligono]
+        self.categorias = set(categorias) if categorias else None
+        self.umbral = config.UMBRAL_CONFIANZA_OBJETO if umbral is None else umbral
+        self.cooldown = config.COOLDOWN_SEGUNDOS if cooldown is None else cooldown
+        self.activa = activa
+
+    def acepta(self, deteccion):
+        if self.categorias is not None and deteccion.categoria not in self.categorias:
+            return False
+        return deteccion.score >= self.umbral
+
+
+def filtros_detector(definiciones=None):
+    """(umbral, categorias) con que crear el detector según `definiciones`
+    (por defecto config.ZONAS).
+
+    No depende de la cámara, así que el modelo puede cargarse antes de
+    abrirla. Sin zonas activas retorna (None, None): los valores por defecto.
+    """
+    definiciones = config.ZONAS if definiciones is None else definiciones
+    zonas = [z for z in (Zona(**definicion) for definicion in definiciones) if z.activa]
+    if not zonas:
+        return None, None
+    return _umbral_minimo(zonas), _categorias(zonas)
+
+
+def ancho_relativo_zonas(definiciones=None):
+    """Fracción (0..1] del ancho de la imagen que ocupa el recorte de las zonas
+    activas de `definiciones`, o None si no hay ninguna."""
+    definiciones = config.ZONAS if definiciones is None else definiciones
+    zonas = [z for z in (Zona(**definicion) for definicion in definiciones) if z.activa]
+    if not zonas:
+        return None
+    xs = [min(max(x, 0.0), 1.0) for z in zonas for x, _ in z.poligono]
+    return max(max(xs) - min(xs), 1e-3)
+
+
+def _umbral_minimo(zonas):
+    return min(z.umbral for z in zonas)
+
+
+def _categorias(zonas):
+    """Unión de las categorías permitidas, o None si alguna zona acepta todas."""
+    if any(z.categorias is None for z in zonas):
+        return None
+    return sorted(set().union(*(z.categorias for z in zonas)))
+
+
+class ZonasInteres:
+    """Zonas configuradas y el recorte de inferencia que las cubre.
+
+    El detector corre solo sobre el rectángulo que encierra las zonas
+    activas, recortado del fotograma original de la cámara y escalado a
+    ANCHO_INFERENCIA_ZONAS: como el recorte es más chico que la imagen
+    completa, el detector ve esa región con más resolución que la que tiene
+    en el fotograma de ANCHO_PROCESAMIENTO. Las detecciones se llevan de
+    vuelta a coordenadas del fotograma procesado y se filtran por el
+    polígono (centro de la caja), las categorías y el umbral de cada zona.
+    """
+
+    def __init__(self, zonas, dimensiones_captura, dimensiones_proc):
+        self.zonas = [z for z in zonas if z.activa]
+        if not self.zonas:
+            raise ValueError("No hay zonas activas.")
+        self.dimensiones_proc = dimensiones_proc
+        ancho_cap, alto_cap = dimensiones_captura
+        ancho_proc, alto_proc = dimensiones_proc
+
+        # Polígonos en píxeles del fotograma procesado, para pointPolygonTest
+        self._poligonos = [
+            np.array([(x * ancho_proc, y * alto_proc) for x, y in z.poligono], dtype=np.float32)
+            for z in self.zonas
+        ]
+
+        # Rectángulo que encierra todas las zonas, en píxeles de la captura
+        xs = [x for z in self.zonas for x, _ in z.poligono]
+        ys = [y for z in self.zonas for _, y in z.poligono]
+        x0 = max(0, int(min(xs) * ancho_cap))
+        y0 = max(0, int(min(ys) * alto_cap))
+        x1 = min(ancho_cap, int(np.ceil(max(xs) * ancho_cap)))
+        y1 = min(alto_cap, int(np.ceil(max(ys) * alto_cap)))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            raise ValueError("Las zonas no cubren ningún área de la imagen.")
+        self.recorte = (x0, y0, x1, y1)
+
+        # El recorte se escala como mucho a ANCHO_INFERENCIA_ZONAS (nunca se agranda)
+        escala = min(1.0, config.ANCHO_INFERENCIA_ZONAS / (x1 - x0))
+        self.dimensiones_recorte = (max(1, int((x1 - x0) * escala)), max(1, int((y1 - y0) * escala)))
+        # Conversión de píxeles del recorte escalado a píxeles del fotograma procesado
+        self._factor_x = (ancho_proc / ancho_cap) / escala
+        self._factor_y = (alto_proc / alto_cap) / escala
+        self._origen = (x0 * ancho_proc / ancho_cap, y0 * alto_proc / alto_cap)
+
+        self._ultima_alerta = {}  # nombre de zona -> timestamp (solo lo usa la etapa de grabación)
+
+    @classmethod
+    def desde_config(cls, dimensiones_captura, dimensiones_proc, definiciones=None):
+        """Crea las zonas de `definiciones` (por defecto config.ZONAS), o retorna
+        None si no hay ninguna activa."""
+        definiciones = config.ZONAS if definiciones is None else definiciones
+        zonas = [Zona(**definicion) for definicion in definiciones]
+        if not any(z.activa for z in zonas):
+            return None
+        return cls(zonas, dimensiones_captura, dimensiones_proc)
+
+    def describir(self):
+        x0, y0, x1, y1 = self.recorte
+        return (
+            f"{len(self.zonas)} zona(s) activa(s) ({', '.join(z.nombre for z in self.zonas)}); "
+            f"inferencia sobre el recorte {x1 - x0}x{y1 - y0} de la captura, "
+            f"escalado a {self.dimensiones_recorte[0]}x{self.dimensiones_recorte[1]}"
+        )
+
+    # --- Para crear el detector ---
+
+    def umbral_minimo(self):
+        return _umbral_minimo(self.zonas)
+
+    def categorias(self):
+        """Unión de las categorías permitidas, o None si alguna zona acepta todas."""
+        return _categorias(self.zonas)
+
+    # --- Hilo de captura ---
+
+    def recortar(self, fotograma_captura_bgr):
+        x0, y0, x1, y1 = self.recorte
+        return cv2.resize(fotograma_captura_bgr[y0:y1, x0:x1], self.dimensiones_recorte, interpolation=cv2.INTER_AREA)
+
+    # --- Etapa de detección ---
+
+    def filtrar(self, detecciones):
+        """Lleva las detecciones del recorte al fotograma procesado y se queda con
+        las que caen en una zona que las acepta. Retorna Deteccion con `zona`."""
+        resultado = []
+        for d in detecciones:
+            x = int(self._origen[0] + d.x * self._factor_x)
+            y = int(self._origen[1] + d.y * self._factor_y)
+            ancho = int(d.ancho * self._factor_x)
+            alto = int(d.alto * self._factor_y)
+            centro = (x + ancho / 2, y + alto / 2)
+            for zona, poligono in zip(self.zonas, self._poligonos):
+                if zona.acepta(d) and cv2.pointPolygonTest(poligono, centro, False) >= 0:
+                    resultado.append(d._replace(x=x, y=y, ancho=ancho, alto=alto, zona=zona.nombre))
+                    break
+        return resultado
+
+    def dibujar(self, imagen_bgr):
+        """Dibuja el contorno de las zonas (sobre una imagen que ya sea una copia)."""
+        for poligono in self._poligonos:
+            cv2.polylines(imagen_bgr, [poligono.astype(np.int32)], True, (255, 200, 0), 1)
+
+    # --- Etapa de grabación ---
+
+    def disparar(self, detecciones, timestamp):
+        """Indica si alguna zona con detecciones salió de su cooldown, y la marca como disparada."""
+        disparadas = []
+        for zona in self.zonas:
+            if not any(d.zona == zona.nombre for d in detecciones):
+                continue
+            ultima = self._ultima_alerta.get(zona.nombre)
+            if ultima is None or timestamp - ultima > zona.cooldown:
+                disparadas.append(zona.nombre)
+        for nombre in disparadas:
+            self._ultima_alerta[nombre] = timestamp
+        if disparadas:
+            print(f"Zona(s) disparada(s): {', '.join(disparadas)}")
+        return bool(disparadas)
@@ -0,0 +1,28 @@
+from scripts import config
+from scripts import metricas
+
+
+def _familias(texto):
+    """Nombre de familia de cada muestra, en el orden en que aparecen."""
+    return [linea.split("{")[0].split(" ")[0] for linea in texto.splitlines() if not linea.startswith("#")]
+
+
+def test_gauges_de_varios_colectores_quedan_contiguos(monkeypatch):
+    monkeypatch.setattr(config, "METRICAS_HABILITADAS", True)
+    metricas.reiniciar()
+    for camara in ("patio", "entrada"):
+        etiquetas = (("camara", camara),)
+        metricas.registrar_colector(
+            lambda etiquetas=etiquetas: [("cola_profundidad", etiquetas, 1), ("cola_descartes", etiquetas, 0)]
+        )
+    try:
+        texto = metricas.texto_prometheus()
+    finally:
+        metricas.reiniciar()
+
+    assert texto.count("# TYPE cctv_cola_profundidad gauge") == 1
+    assert texto.count("# TYPE cctv_cola_descartes gauge") == 1
+    familias = _familias(texto)
+    assert familias == ["cctv_cola_profundidad"] * 2 + ["cctv_cola_descartes"] * 2
+    assert 'cctv_cola_profundidad{camara="patio"} 1' in texto
+    assert 'cctv_cola_profundidad{camara="entrada"} 1' in texto